@@ -1,7 +1,12 @@
 from django.contrib import admin
-from .models import Booking, Payment, Guest
+from .models import Booking, Payment, Guest, RoomNight, OutboundEmail, IdempotencyKey, BookingGroup, RoomHold
 
 # Register your models here.
 admin.site.register(Booking)
 admin.site.register(Payment)
-admin.site.register(Guest)
\ No newline at end of file
+admin.site.register(Guest)
+admin.site.register(RoomNight)
+admin.site.register(OutboundEmail)
+admin.site.register(IdempotencyKey)
+admin.site.register(BookingGroup)
+admin.site.register(RoomHold)
@@ -0,0 +1,113 @@
+import string
+import threading
+from django.db import transaction
+from django.db.models import F
+from booking.models import ConfirmationSequence
+
+ALPHABET = string.digits + string.ascii_uppercase
+CODE_LENGTH = 6
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+
+# Bijective scramble of the sequence over CODE_SPACE so consecutive bookings
+# don't get consecutive codes. The multiplier must stay coprime with 36.
+SCRAMBLE_MULTIPLIER = 1_580_030_173
+SCRAMBLE_OFFSET = 714_924_289
+
+BLOCK_SIZE = 100
+
+
+def check_character(code: str) -> str:
+    """Luhn mod 36 check character, catches any single typo or adjacent swap."""
+    total = 0
+    factor = 2
+    for char in reversed(code):
+        addend = factor * ALPHABET.index(char)
+        total += addend // len(ALPHABET) + addend % len(ALPHABET)
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[(len(ALPHABET) - total % len(ALPHABET)) % len(ALPHABET)]
+
+
+def is_valid_confirmation_number(confirmation_number: str) -> bool:
+    _, _, code = confirmation_number.partition('-')
+    if len(code) != CODE_LENGTH + 1 or any(char not in ALPHABET for char in code):
+        return False
+    return check_character(code[:-1]) == code[-1]
+
+
+def encode_confirmation_number(value: int, prefix='BK') -> str:
+    """Turn a sequence value into a code like BK-7Q2M9XK (6 characters + check)."""
+    scrambled = (value * SCRAMBLE_MULTIPLIER + SCRAMBLE_OFFSET) % CODE_SPACE
+    chars = []
+    for _ in range(CODE_LENGTH):
+        scrambled, digit = divmod(scrambled, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    code = ''.join(reversed(chars))
+    return f"{prefix}-{code}{check_character(code)}"
+
+
+class ReservedConfirmationNumbers:
+    """
+    Confirmation numbers taken for one booking request. Calling it hands out
+    the next one, like the generator, without touching the database.
+    """
+
+    def __init__(self, values):
+        self._values = iter(values)
+
+    def __call__(self, prefix='BK') -> str:
+        value = next(self._values, None)
+        if value is None:
+            raise RuntimeError("Every confirmation number reserved for this request has been used.")
+        return encode_confirmation_number(value % CODE_SPACE, prefix=prefix)
+
+
+class ConfirmationNumberGenerator:
+    """
+    Hands out confirmation numbers from a block of sequence values reserved in
+    the database. Numbers are unique across processes without a lookup per
+    booking, and one character longer than the legacy random codes, so they
+    never collide with those either.
+
+    A block is reserved in a transaction of its own, never inside the caller's:
+    a rollback there would give the block back to the sequence while this
+    process kept handing it out, and another process would reserve it again.
+    Requests therefore take their numbers with reserve() before their
+    transaction opens.
+    """
+
+    def __init__(self, sequence_name='booking', block_size=BLOCK_SIZE):
+        self.sequence_name = sequence_name
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def _reserve_block(self, size):
+        # durable: raises RuntimeError when called inside another atomic block
+        with transaction.atomic(durable=True):
+            sequence = ConfirmationSequence.objects.filter(name=self.sequence_name)
+            if not sequence.update(next_value=F('next_value') + size):
+                # First block ever reserved from this sequence
+                ConfirmationSequence.objects.get_or_create(name=self.sequence_name)
+                sequence.update(next_value=F('next_value') + size)
+            end = sequence.values_list('next_value', flat=True).get()
+        self._next, self._end = end - size, end
+
+    def reserve(self, count=1) -> ReservedConfirmationNumbers:
+        """
+        Take ``count`` numbers for one request, reserving a new block first when
+        this process has fewer left. Must be called outside any transaction.
+        """
+        with self._lock:
+            if self._end - self._next < count:
+                # The rest of the current block is dropped; the sequence space is large
+                self._reserve_block(max(self.block_size, count))
+            values = range(self._next, self._next + count)
+            self._next += count
+        return ReservedConfirmationNumbers(values)
+
+    def __call__(self, prefix='BK') -> str:
+        return self.reserve()(prefix=prefix)
+
+
+generate_confirmation_number = ConfirmationNumberGenerator()
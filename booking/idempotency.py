@@ -0,0 +1,145 @@
+import hashlib
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from booking.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# An IN_PROGRESS key this old belongs to a request that died, and may be taken over
+IN_PROGRESS_TIMEOUT = timedelta(minutes=5)
+
+_side_effects = ContextVar('idempotency_side_effects', default=None)
+
+
+class IdempotencyKeyInUse(Exception):
+    """The key is held by a request that is still running."""
+
+
+class IdempotencyKeyMismatch(Exception):
+    """The key was already used with a different request body."""
+
+
+def request_fingerprint(request) -> str:
+    """Hash of the method, path and body, independent of key order in the JSON."""
+    body = json.dumps(request.data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f'{request.method}\n{request.path}\n{body}'.encode()).hexdigest()
+
+
+def _expiry_cutoff():
+    return timezone.now() - timedelta(hours=getattr(settings, 'BOOKING_IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def _expired(record) -> bool:
+    return record.created_at < _expiry_cutoff()
+
+
+def begin_idempotent_request(key, fingerprint):
+    """
+    Claim ``key`` for a new request, or find the response it already produced.
+
+    Returns (record, replay): ``replay`` is True when ``record`` holds a stored
+    response to send back as is. Raises IdempotencyKeyMismatch when the key was
+    used for a different request and IdempotencyKeyInUse while the original
+    request is still running. The claim is committed immediately so concurrent
+    retries see it.
+    """
+    for _ in range(2):
+        record = IdempotencyKey.objects.filter(key=key).first()
+
+        if record is not None and _expired(record):
+            IdempotencyKey.objects.filter(id=record.id).delete()
+            record = None
+
+        if record is None:
+            try:
+                with transaction.atomic():
+                    return IdempotencyKey.objects.create(key=key, request_fingerprint=fingerprint), False
+            except IntegrityError:
+                # Another request claimed the key between the read and the insert
+                continue
+
+        if record.request_fingerprint != fingerprint:
+            raise IdempotencyKeyMismatch(
+                f"{IDEMPOTENCY_HEADER} '{key}' was already used for a different request."
+            )
+        if record.status == 'COMPLETED':
+            return record, True
+
+        # Take over a key abandoned by a request that never finished
+        stale = IdempotencyKey.objects.filter(
+            id=record.id,
+            status='IN_PROGRESS',
+            updated_at__lt=timezone.now() - IN_PROGRESS_TIMEOUT
+        ).update(updated_at=timezone.now())
+        if stale:
+            return record, False
+        raise IdempotencyKeyInUse(
+            f"A request with {IDEMPOTENCY_HEADER} '{key}' is still being processed."
+        )
+
+    raise IdempotencyKeyInUse(
+        f"A request with {IDEMPOTENCY_HEADER} '{key}' is still being processed."
+    )
+
+
+def complete_idempotent_request(record, response, booking=None):
+    """
+    Store the response for replays. Call it inside the transaction that
+    created ``booking`` so the two commit together.
+    """
+    record.status = 'COMPLETED'
+    record.response_status = response.status_code
+    # Round-trip through the renderer so replays return the same JSON values
+    record.response_body = json.loads(JSONRenderer().render(response.data))
+    record.booking = booking
+    record.save(update_fields=['status', 'response_status', 'response_body', 'booking', 'updated_at'])
+
+
+def release_idempotent_request(record):
+    """Forget a key whose request failed without side effects, so it can be retried."""
+    IdempotencyKey.objects.filter(id=record.id, status='IN_PROGRESS').delete()
+
+
+@contextmanager
+def tracking_side_effects():
+    """
+    Collect the side effects that can't be rolled back, such as a charge,
+    reported with side_effect_happened() in the block. Yields their list.
+    """
+    side_effects = []
+    token = _side_effects.set(side_effects)
+    try:
+        yield side_effects
+    finally:
+        _side_effects.reset(token)
+
+
+def side_effect_happened(description):
+    """
+    Tell the idempotent request being processed, if any, that it did something
+    a retry must not do again, so its key is kept even if the request fails.
+    """
+    side_effects = _side_effects.get()
+    if side_effects is not None:
+        side_effects.append(description)
+
+
+def sweep_expired_idempotency_keys(batch_size=1000) -> int:
+    """
+    Delete up to ``batch_size`` keys older than BOOKING_IDEMPOTENCY_KEY_TTL_HOURS
+    in one indexed range query on created_at. Returns the number deleted.
+    """
+    ids = list(
+        IdempotencyKey.objects.filter(created_at__lt=_expiry_cutoff())
+        .order_by('created_at')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if ids:
+        IdempotencyKey.objects.filter(id__in=ids).delete()
+    return len(ids)
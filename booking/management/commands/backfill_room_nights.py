@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from booking.models import Booking, RoomNight
+
+class Command(BaseCommand):
+    help = 'Backfills the RoomNight ledger from existing active bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Delete the ledger first instead of only adding missing nights'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.stdout.write('Backfilling room nights...')
+
+        if options['rebuild']:
+            RoomNight.objects.all().delete()
+            self.stdout.write('✓ Existing ledger cleared')
+
+        # 1. Write every night of every active booking, skipping nights already present
+        bookings = Booking.objects.filter(status__in=Booking.ACTIVE_STATUSES).only(
+            'id', 'room_id', 'status', 'check_in_date', 'check_out_date'
+        )
+        pending = []
+        written = 0
+        for booking in bookings.iterator(chunk_size=batch_size):
+            pending.extend(
+                RoomNight(room_id=booking.room_id, booking_id=booking.id, night=night)
+                for night in booking.booked_nights()
+            )
+            if len(pending) >= batch_size:
+                written += self._write(pending, batch_size)
+                pending = []
+        written += self._write(pending, batch_size)
+        self.stdout.write(f'✓ {written} room nights processed')
+
+        # 2. Nights still missing belong to bookings that overlap another booking
+        ledger_counts = dict(
+            RoomNight.objects.values('booking_id').annotate(nights=Count('id')).values_list('booking_id', 'nights')
+        )
+        conflicts = [
+            booking.confirmation_number
+            for booking in bookings.only('id', 'confirmation_number', 'status', 'check_in_date', 'check_out_date').iterator(chunk_size=batch_size)
+            if ledger_counts.get(booking.id, 0) < len(booking.booked_nights())
+        ]
+        for confirmation_number in conflicts[:20]:
+            self.stdout.write(self.style.WARNING(f'  {confirmation_number} overlaps another booking on the same room'))
+        if conflicts:
+            self.stdout.write(self.style.WARNING(f'{len(conflicts)} bookings could not be fully recorded'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Room night ledger backfilled successfully!'))
+
+    def _write(self, rows, batch_size):
+        with transaction.atomic():
+            RoomNight.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+        return len(rows)
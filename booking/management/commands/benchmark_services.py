@@ -0,0 +1,235 @@
+import json
+import platform
+import random
+import time
+import uuid
+from datetime import date, timedelta
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from hotel.benchmarking import add_dataset_arguments, generated_database, percentile
+from hotel.db_metrics import count_queries
+from rooms.models import Room, RoomType
+from rooms.services import calculate_total_price, generate_booking_plans, get_available_rooms_for_type, is_room_available
+from booking.models import Booking
+from booking.services import RoomUnavailableError, create_booking_with_payment
+
+# Booking runs last so the bookings it makes don't change what the others measure
+BENCHMARKS = [
+    'get_available_rooms_for_type',
+    'is_room_available',
+    'calculate_total_price',
+    'generate_booking_plans',
+    'create_booking_with_payment',
+]
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Metrics compared with the baseline; latency may grow by --threshold percent, query counts not at all
+LATENCY_METRICS = ('p50_ms', 'p95_ms')
+
+ROOM_SAMPLE_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the availability, pricing, planning and booking services against a '
+        'generated dataset, reports latency percentiles and query counts, and fails on '
+        'regressions against a saved baseline'
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(
+            parser,
+            existing_data_help='create_booking_with_payment only runs when named in --only, since it adds bookings'
+        )
+
+        parser.add_argument('--iterations', type=int, default=200, help='Timed calls per benchmark')
+        parser.add_argument('--warmup', type=int, default=20, help='Untimed calls per benchmark before measuring')
+        parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help='Run only these benchmarks')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=25.0,
+            help='Percent a latency percentile may grow over the baseline before the run fails'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        names = options['only'] or [
+            name for name in BENCHMARKS
+            if not (options['existing_data'] and name == 'create_booking_with_payment')
+        ]
+
+        if options['existing_data']:
+            report = self.run_benchmarks(names, options)
+        else:
+            with generated_database(options, self.stdout):
+                report = self.run_benchmarks(names, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"✓ Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = self.compare(report, baseline, options['threshold'])
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(f'  {regression}'))
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
+
+    def run_benchmarks(self, names, options):
+        self.horizon_days = options['horizon_days']
+        self.room_types = list(RoomType.objects.all())
+        room_ids = list(Room.objects.values_list('id', flat=True))
+        booking_count = Booking.objects.count()
+        if not self.room_types or not room_ids:
+            raise CommandError('The database has no room types or rooms to benchmark.')
+
+        rng = random.Random(options['seed'])
+        self.rooms = list(Room.objects.filter(id__in=rng.sample(room_ids, min(len(room_ids), ROOM_SAMPLE_SIZE))))
+
+        results = {}
+        self.stdout.write(
+            f"{'benchmark':<30}" + ''.join(f'{f"p{p}":>9}' for p in PERCENTILES) + f"{'max':>9}{'queries':>9}{'errors':>8}"
+        )
+        for name in names:
+            result = self.measure(getattr(self, f'case_{name}'), rng, options['iterations'], options['warmup'])
+            results[name] = result
+            self.stdout.write(
+                f'{name:<30}'
+                + ''.join(f"{result[f'p{p}_ms']:>9.2f}" for p in PERCENTILES)
+                + f"{result['max_ms']:>9.2f}{result['queries_mean']:>9.1f}{result['errors']:>8}"
+            )
+
+        return {
+            'created_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'dataset': {
+                'generated': not options['existing_data'],
+                'seed': options['seed'],
+                'horizon_days': self.horizon_days,
+                'room_types': len(self.room_types),
+                'rooms': len(room_ids),
+                'bookings': booking_count,
+            },
+            'iterations': options['iterations'],
+            'benchmarks': results,
+        }
+
+    def measure(self, make_case, rng, iterations, warmup):
+        """Call ``iterations`` cases from ``make_case``, timing each and counting its queries."""
+        for _ in range(warmup):
+            self.call(make_case(rng))
+
+        timings, query_counts, errors = [], [], 0
+        for _ in range(iterations):
+            case = make_case(rng)
+            with count_queries() as queries:
+                start = time.perf_counter()
+                failed = self.call(case)
+                timings.append((time.perf_counter() - start) * 1000)
+            query_counts.append(queries.count)
+            errors += failed
+
+        timings.sort()
+        return {
+            'iterations': iterations,
+            'errors': errors,
+            'mean_ms': sum(timings) / len(timings),
+            **{f'p{p}_ms': percentile(timings, p) for p in PERCENTILES},
+            'max_ms': timings[-1],
+            'queries_mean': sum(query_counts) / len(query_counts),
+            'queries_max': max(query_counts),
+        }
+
+    def call(self, case):
+        """Run one case; returns 1 when it failed the way a full hotel can, else 0."""
+        try:
+            case()
+        except RoomUnavailableError:
+            return 1
+        return 0
+
+    def compare(self, report, baseline, threshold):
+        if baseline.get('dataset', {}).get('seed') != report['dataset']['seed']:
+            self.stdout.write(self.style.WARNING('  The baseline was measured with a different --seed'))
+
+        regressions = []
+        for name, result in report['benchmarks'].items():
+            before = baseline.get('benchmarks', {}).get(name)
+            if before is None:
+                continue
+            for metric in LATENCY_METRICS:
+                # A baseline without the metric, or one that rounded to 0, gives nothing to compare with
+                if not before.get(metric):
+                    continue
+                if result[metric] > before[metric] * (1 + threshold / 100):
+                    regressions.append(
+                        f'{name}: {metric} {before[metric]:.2f} -> {result[metric]:.2f} '
+                        f'(+{(result[metric] / before[metric] - 1) * 100:.0f}%)'
+                    )
+            if 'queries_max' in before and result['queries_max'] > before['queries_max']:
+                regressions.append(f"{name}: queries_max {before['queries_max']} -> {result['queries_max']}")
+        return regressions
+
+    # Cases: each returns a call with fresh random inputs
+
+    def stay(self, rng):
+        check_in_date = date.today() + timedelta(days=rng.randint(1, max(self.horizon_days - 7, 1)))
+        return check_in_date, check_in_date + timedelta(days=rng.randint(1, 7))
+
+    def case_get_available_rooms_for_type(self, rng):
+        room_type = rng.choice(self.room_types)
+        check_in_date, check_out_date = self.stay(rng)
+        return lambda: list(get_available_rooms_for_type(room_type, check_in_date, check_out_date))
+
+    def case_is_room_available(self, rng):
+        room = rng.choice(self.rooms)
+        check_in_date, check_out_date = self.stay(rng)
+        return lambda: is_room_available(room, check_in_date, check_out_date)
+
+    def case_calculate_total_price(self, rng):
+        room_type = rng.choice(self.room_types)
+        check_in_date, check_out_date = self.stay(rng)
+        return lambda: calculate_total_price(room_type, check_in_date, check_out_date)
+
+    def case_generate_booking_plans(self, rng):
+        check_in_date, check_out_date = self.stay(rng)
+        adults, children = rng.randint(3, 8), rng.randint(0, 3)
+        return lambda: generate_booking_plans(check_in_date, check_out_date, adults, children)
+
+    def case_create_booking_with_payment(self, rng):
+        room_type = rng.choice(self.room_types)
+        check_in_date, check_out_date = self.stay(rng)
+        # Random rather than seeded, so repeated runs on --existing-data never reuse a payment token
+        token = uuid.uuid4().hex
+        validated_data = {
+            'guest': {'first_name': 'Benchmark', 'last_name': 'Guest', 'email': f'benchmark.{token[:12]}@example.com'},
+            'room_type': room_type,
+            'check_in_date': check_in_date,
+            'check_out_date': check_out_date,
+            'number_of_adults': 1,
+            'number_of_children': 0,
+            'payment_token': f'benchmark-{token}',
+            'payment_method': 'PAYPAL',
+        }
+        return lambda: create_booking_with_payment(validated_data)
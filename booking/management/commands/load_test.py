@@ -0,0 +1,344 @@
+import argparse
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Exists, Max, OuterRef
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from hotel.benchmarking import add_dataset_arguments, generated_database, percentile
+from rooms.models import RoomType
+from booking.models import Booking
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = {
+    'search': '/api/rooms/search/',
+    'create': '/api/bookings/create/',
+    'lookup': '/api/bookings/lookup/',
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Upper bounds of the latency histogram buckets in milliseconds; slower requests go in a last bucket
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+LOOKUP_SAMPLE_SIZE = 1000
+
+
+def parse_mix(value):
+    """'search=70,create=20,lookup=10' -> {'search': 70, 'create': 20, 'lookup': 10}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}', expected one of {', '.join(ENDPOINTS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"'{part}' needs a numeric weight, e.g. {name}=50")
+        if mix[name] < 0:
+            raise argparse.ArgumentTypeError(f"The weight of '{name}' cannot be negative")
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError('At least one endpoint needs a positive weight')
+    return mix
+
+
+def histogram(latencies_ms):
+    buckets = Counter()
+    for latency in latencies_ms:
+        bound = next((bound for bound in HISTOGRAM_BUCKETS_MS if latency <= bound), None)
+        buckets[f'<={bound}ms' if bound else f'>{HISTOGRAM_BUCKETS_MS[-1]}ms'] += 1
+    labels = [f'<={bound}ms' for bound in HISTOGRAM_BUCKETS_MS] + [f'>{HISTOGRAM_BUCKETS_MS[-1]}ms']
+    return {label: buckets[label] for label in labels}
+
+
+class Command(BaseCommand):
+    help = (
+        'Drives the search, booking and lookup endpoints from concurrent threads through the '
+        'test client, reports throughput, latency and error rates, then checks that no two '
+        'active bookings overlap on the same room'
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(
+            parser,
+            rooms=100,
+            bookings=2000,
+            existing_data_help='The bookings made by the run are kept.'
+        )
+        parser.add_argument('--concurrency', type=int, default=8, help='Threads sending requests')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests to send in total')
+        parser.add_argument(
+            '--mix',
+            type=parse_mix,
+            default=parse_mix('search=70,create=20,lookup=10'),
+            help='Relative weight of each endpoint (default: search=70,create=20,lookup=10)'
+        )
+        parser.add_argument(
+            '--window-days',
+            type=int,
+            default=14,
+            help='Stays start within this many days from today, so concurrent bookings compete for the same rooms'
+        )
+        parser.add_argument(
+            '--max-error-rate',
+            type=float,
+            default=1.0,
+            help='Percent of server errors (5xx or exceptions) tolerated before the run fails'
+        )
+        parser.add_argument('--output', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency and --requests must be at least 1.')
+        if options['window_days'] < 1:
+            raise CommandError('--window-days must be at least 1.')
+
+        # Lets the test client's 'testserver' host through and keeps emails in memory
+        setup_test_environment()
+        try:
+            if options['existing_data']:
+                report = self.run_load(options)
+            else:
+                # Worker threads open their own connections, which an in-memory SQLite database would not share
+                with generated_database(options, self.stdout, on_disk=True):
+                    report = self.run_load(options)
+        finally:
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"✓ Results written to {options['output']}")
+
+        if report['overlapping_bookings']:
+            raise CommandError(f"{report['overlapping_bookings']} bookings overlap another booking on the same room")
+        if report['error_rate'] > options['max_error_rate']:
+            raise CommandError(
+                f"Server error rate {report['error_rate']:.2f}% is above --max-error-rate {options['max_error_rate']}%"
+            )
+        self.stdout.write(self.style.SUCCESS('No overlapping bookings'))
+
+    def run_load(self, options):
+        rng = random.Random(options['seed'])
+        self.window_days = options['window_days']
+        self.room_types = list(RoomType.objects.values('id', 'max_adults', 'max_children'))
+        if not self.room_types:
+            raise CommandError('The database has no room types to book.')
+        first_new_booking_id = (Booking.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+        # Bookings to look up: a sample of the existing ones plus those made during the run
+        booking_ids = list(Booking.objects.values_list('id', flat=True))
+        self.lookups = list(
+            Booking.objects.filter(
+                id__in=rng.sample(booking_ids, min(len(booking_ids), LOOKUP_SAMPLE_SIZE))
+            ).values_list('confirmation_number', 'guest__email')
+        )
+
+        work = queue.Queue()
+        names, weights = zip(*options['mix'].items())
+        for name in rng.choices(names, weights=weights, k=options['requests']):
+            work.put((name, getattr(self, f'{name}_request')(rng)))
+
+        self.results = defaultdict(list)  # {endpoint: [(milliseconds, status, queries)]}
+        self.rejections = defaultdict(Counter)  # {endpoint: {reason: count}} for 4xx responses
+        self.lock = threading.Lock()
+        threads = [
+            threading.Thread(target=self.worker, args=(work, random.Random(rng.random())))
+            for _ in range(options['concurrency'])
+        ]
+        self.stdout.write(f"Sending {options['requests']} requests from {options['concurrency']} threads...")
+        # Rejected requests are expected under load and counted below instead of logged one by one
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            elapsed = time.perf_counter() - started
+            request_logger.setLevel(level)
+
+        report = self.summarize(elapsed)
+        overlapping = self.overlapping_bookings(first_new_booking_id)
+        report['overlapping_bookings'] = len(overlapping)
+        for confirmation_number, room_number, check_in_date, check_out_date in overlapping[:20]:
+            self.stdout.write(self.style.ERROR(
+                f'  {confirmation_number} on room {room_number} ({check_in_date} to {check_out_date}) overlaps another booking'
+            ))
+        return report
+
+    def worker(self, work, rng):
+        client = Client(raise_request_exception=False)
+        try:
+            while True:
+                try:
+                    name, request = work.get_nowait()
+                except queue.Empty:
+                    return
+
+                start = time.perf_counter()
+                try:
+                    response = request(client, rng)
+                except Exception:
+                    logger.exception('%s request failed', name)
+                    response = None
+                elapsed = (time.perf_counter() - start) * 1000
+
+                status = response.status_code if response is not None else None
+                counter = getattr(response, 'query_counter', None)
+                with self.lock:
+                    self.results[name].append((elapsed, status, counter.count if counter else None))
+                    if status is not None and 400 <= status < 500:
+                        self.rejections[name][self.rejection_reason(response)] += 1
+                if name == 'create' and status == 201:
+                    self.lookups.append((response.json()['confirmation_number'], request.email))
+        finally:
+            connections.close_all()
+
+    def rejection_reason(self, response):
+        try:
+            body = response.json()
+        except ValueError:
+            return f'HTTP {response.status_code}'
+        if isinstance(body, dict) and body:
+            field, message = next(iter(body.items()))
+            message = message[0] if isinstance(message, list) and message else message
+            return f'HTTP {response.status_code} {field}: {str(message)[:80]}'
+        return f'HTTP {response.status_code}'
+
+    def summarize(self, elapsed):
+        endpoints = {}
+        for name, results in sorted(self.results.items()):
+            latencies = sorted(latency for latency, _, _ in results)
+            statuses = Counter(str(status) for _, status, _ in results)
+            errors = sum(1 for _, status, _ in results if status is None or status >= 500)
+            queries = [count for _, _, count in results if count is not None]
+            endpoints[name] = {
+                'requests': len(results),
+                'throughput_rps': len(results) / elapsed,
+                'statuses': dict(sorted(statuses.items())),
+                'ok': sum(1 for _, status, _ in results if status is not None and status < 400),
+                'rejected': sum(1 for _, status, _ in results if status is not None and 400 <= status < 500),
+                'errors': errors,
+                'error_rate': errors / len(results) * 100,
+                'mean_ms': sum(latencies) / len(latencies),
+                **{f'p{p}_ms': percentile(latencies, p) for p in PERCENTILES},
+                'max_ms': latencies[-1],
+                'queries_mean': sum(queries) / len(queries) if queries else None,
+                'histogram': histogram(latencies),
+                'rejections': dict(self.rejections[name].most_common()),
+            }
+
+        total = sum(endpoint['requests'] for endpoint in endpoints.values())
+        errors = sum(endpoint['errors'] for endpoint in endpoints.values())
+        report = {
+            'seconds': elapsed,
+            'requests': total,
+            'throughput_rps': total / elapsed,
+            'error_rate': errors / total * 100,
+            'endpoints': endpoints,
+        }
+
+        self.stdout.write(
+            f"{'endpoint':<10}{'requests':>9}{'req/s':>9}{'ok':>7}{'4xx':>7}{'errors':>8}"
+            + ''.join(f'{f"p{p}":>9}' for p in PERCENTILES) + f"{'max':>9}{'sql':>6}"
+        )
+        for name, endpoint in endpoints.items():
+            self.stdout.write(
+                f"{name:<10}{endpoint['requests']:>9}{endpoint['throughput_rps']:>9.1f}"
+                f"{endpoint['ok']:>7}{endpoint['rejected']:>7}{endpoint['errors']:>8}"
+                + ''.join(f"{endpoint[f'p{p}_ms']:>9.1f}" for p in PERCENTILES)
+                + f"{endpoint['max_ms']:>9.1f}"
+                + (f"{endpoint['queries_mean']:>6.1f}" if endpoint['queries_mean'] is not None else f"{'-':>6}")
+            )
+        for name, endpoint in endpoints.items():
+            self.stdout.write(
+                f'  {name} latency: ' + ', '.join(f'{label} {count}' for label, count in endpoint['histogram'].items() if count)
+            )
+            for reason, count in list(endpoint['rejections'].items())[:5]:
+                self.stdout.write(f'    {count}x {reason}')
+        self.stdout.write(
+            f"✓ {total} requests in {elapsed:.1f}s ({report['throughput_rps']:.1f} req/s), "
+            f"{report['error_rate']:.2f}% server errors"
+        )
+        return report
+
+    def overlapping_bookings(self, first_new_booking_id):
+        """Active bookings made during the run that share a night and a room with another active booking."""
+        active = Booking.objects.filter(status__in=Booking.ACTIVE_STATUSES)
+        return list(
+            active.filter(id__gte=first_new_booking_id)
+            .filter(Exists(
+                active.filter(
+                    room_id=OuterRef('room_id'),
+                    check_in_date__lt=OuterRef('check_out_date'),
+                    check_out_date__gt=OuterRef('check_in_date')
+                ).exclude(id=OuterRef('id'))
+            ))
+            .order_by('id')
+            .values_list('confirmation_number', 'room__room_number', 'check_in_date', 'check_out_date')
+        )
+
+    # Requests: each returns a call sending it with a client
+
+    def stay(self, rng):
+        check_in_date = date.today() + timedelta(days=rng.randint(1, self.window_days))
+        return check_in_date, check_in_date + timedelta(days=rng.randint(1, 4))
+
+    def search_request(self, rng):
+        check_in_date, check_out_date = self.stay(rng)
+        params = {
+            'check_in': str(check_in_date),
+            'check_out': str(check_out_date),
+            'adults': rng.randint(1, 4),
+            'children': rng.choice([0, 0, 0, 1, 2]),
+        }
+        return lambda client, rng: client.get(ENDPOINTS['search'], params)
+
+    def create_request(self, rng):
+        room_type = rng.choice(self.room_types)
+        check_in_date, check_out_date = self.stay(rng)
+        # A small pool of addresses, so some requests come from returning guests
+        email = f'load.guest{rng.randint(1, 200)}@example.com'
+        payload = {
+            'guest': {'first_name': 'Load', 'last_name': 'Guest', 'email': email},
+            'room_type': room_type['id'],
+            'check_in_date': str(check_in_date),
+            'check_out_date': str(check_out_date),
+            'number_of_adults': rng.randint(1, room_type['max_adults']),
+            'number_of_children': 0,
+            'payment_token': f'load-{uuid.uuid4().hex}',
+            'payment_method': 'PAYPAL',
+        }
+
+        def request(client, rng):
+            return client.post(ENDPOINTS['create'], payload, content_type='application/json')
+        request.email = email
+        return request
+
+    def lookup_request(self, rng):
+        def request(client, rng):
+            # Chosen when sent, so bookings made earlier in the run can be looked up too
+            if self.lookups:
+                confirmation_number, email = rng.choice(self.lookups)
+            else:
+                confirmation_number, email = 'BK-0000000', 'nobody@example.com'
+            return client.post(
+                ENDPOINTS['lookup'],
+                {'confirmation_number': confirmation_number, 'email': email},
+                content_type='application/json'
+            )
+        return request
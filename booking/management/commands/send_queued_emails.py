@@ -0,0 +1,37 @@
+import time
+from django.core.management.base import BaseCommand
+from booking.outbox import send_queued_emails
+
+class Command(BaseCommand):
+    help = 'Delivers queued emails from the outbox in batches over one mail connection per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the outbox instead of exiting once it is drained'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between polls when the outbox is empty (with --loop)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = send_queued_emails(batch_size=batch_size)
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'✓ {sent} sent, {failed} failed')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Outbox drained: {total_sent} sent, {total_failed} failed'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from booking.idempotency import sweep_expired_idempotency_keys
+
+class Command(BaseCommand):
+    help = 'Deletes Idempotency-Key records older than BOOKING_IDEMPOTENCY_KEY_TTL_HOURS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            swept = sweep_expired_idempotency_keys(batch_size=options['batch_size'])
+            total += swept
+            if swept < options['batch_size']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'{total} expired idempotency keys swept'))
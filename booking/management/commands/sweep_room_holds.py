@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from booking.services import sweep_expired_holds
+
+class Command(BaseCommand):
+    help = 'Deletes expired room holds so the inventory calendar and availability index free their rooms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            swept = sweep_expired_holds(batch_size=options['batch_size'])
+            total += swept
+            if swept < options['batch_size']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'{total} expired holds swept'))
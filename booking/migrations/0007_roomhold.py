@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_bookinggroup'),
+        ('rooms', '0003_roominventory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('check_in_date', models.DateField()),
+                ('check_out_date', models.DateField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='rooms.room')),
+            ],
+            options={
+                'ordering': ['expires_at'],
+            },
+        ),
+    ]
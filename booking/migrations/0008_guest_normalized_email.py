@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def fill_normalized_email(apps, schema_editor):
+    Guest = apps.get_model('booking', 'Guest')
+    Guest.objects.update(normalized_email=Lower(Trim('email')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_roomhold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guest',
+            name='normalized_email',
+            field=models.EmailField(db_index=True, default='', editable=False, max_length=254),
+        ),
+        migrations.RunPython(fill_normalized_email, migrations.RunPython.noop),
+    ]
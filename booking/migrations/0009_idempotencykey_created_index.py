@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_guest_normalized_email'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='idempotencykey',
+            index=models.Index(fields=['created_at'], name='idempotency_key_created'),
+        ),
+    ]
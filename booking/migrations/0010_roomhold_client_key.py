@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_idempotencykey_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roomhold',
+            name='client_key',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+    ]
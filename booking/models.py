@@ -1,10 +1,18 @@
-from django.db import models
+import uuid
+from datetime import timedelta
+from django.db import models, transaction
+from django.utils import timezone
+
+def normalize_guest_email(email):
+    """Case-insensitive form of an email address used to recognise returning guests"""
+    return (email or '').strip().lower()
 
 # Create your models here.
 class Guest(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     email = models.EmailField()
+    normalized_email = models.EmailField(db_index=True, editable=False, default='')
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     address = models.CharField(max_length=400, blank=True, null=True)
     country = models.CharField(max_length=40, blank=True, null=True)
@@ -12,6 +20,28 @@ class Guest(models.Model):
     
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
+    
+    def save(self, *args, **kwargs):
+        self.normalized_email = normalize_guest_email(self.email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'email' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_email'}
+        super().save(*args, **kwargs)
+
+class BookingGroup(models.Model):
+    """Several rooms booked together for one party under one confirmation number."""
+    guest = models.ForeignKey(Guest, related_name='booking_groups', on_delete=models.CASCADE)
+    confirmation_number = models.CharField(max_length=100, unique=True)
+    check_in_date = models.DateField()
+    check_out_date = models.DateField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Group booking {self.confirmation_number} for {self.guest}"
+    
+    class Meta:
+        ordering = ['-created_at']
 
 class Booking(models.Model):
     
@@ -23,9 +53,12 @@ class Booking(models.Model):
     ('CANCELLED', 'Cancelled'),
     ('NO_SHOW', 'No Show'),
 ]
+    # Statuses that hold a room for the booked nights
+    ACTIVE_STATUSES = ['CONFIRMED', 'CHECKED_IN']
     
     guest = models.ForeignKey(Guest, related_name='bookings', on_delete=models.CASCADE)
     room = models.ForeignKey('rooms.Room', related_name='bookings', on_delete=models.PROTECT)
+    group = models.ForeignKey(BookingGroup, related_name='bookings', on_delete=models.PROTECT, blank=True, null=True)
     number_of_adults = models.PositiveIntegerField()
     number_of_children = models.PositiveIntegerField()
     special_requests = models.TextField(blank=True, null=True)
@@ -47,13 +80,96 @@ class Booking(models.Model):
             raise ValidationError("Check-out date must be after check-in date.")
     
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        # confirmation_number uniqueness and the foreign keys are enforced by the
+        # database; checking them here would cost queries per save and still race
+        self.full_clean(exclude=['guest', 'room', 'group'], validate_unique=False)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.sync_room_nights(adding=adding)
+    
+    def booked_nights(self):
+        """Nights this booking holds its room for, empty unless it is active"""
+        if self.status not in self.ACTIVE_STATUSES:
+            return []
+        return [
+            self.check_in_date + timedelta(days=offset)
+            for offset in range((self.check_out_date - self.check_in_date).days)
+        ]
+    
+    def sync_room_nights(self, adding=False):
+        """
+        Make the RoomNight ledger match this booking's room, dates and status.
+        A night already held by another booking raises IntegrityError.
+        """
+        wanted = {(self.room_id, night) for night in self.booked_nights()}
+        existing = set() if adding else set(self.room_nights.values_list('room_id', 'night'))
+        
+        stale = existing - wanted
+        if stale:
+            self.room_nights.filter(night__in=[night for _, night in stale]).delete()
+        RoomNight.objects.bulk_create([
+            RoomNight(room_id=room_id, booking=self, night=night)
+            for room_id, night in sorted(wanted - existing)
+        ])
         
     class Meta:
         ordering = ['-created_at']
         
         
+class RoomHold(models.Model):
+    """
+    A room set aside for a guest who is paying. Until ``expires_at`` it
+    counts against availability like a booking; `create_booking_with_payment`
+    turns it into the booking and `sweep_room_holds` deletes expired ones.
+    """
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    room = models.ForeignKey('rooms.Room', related_name='holds', on_delete=models.CASCADE)
+    check_in_date = models.DateField()
+    check_out_date = models.DateField()
+    expires_at = models.DateTimeField(db_index=True)
+    # Who asked for the hold ("user:<id>" or "ip:<address>"), to cap holds per client
+    client_key = models.CharField(max_length=100, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Hold on Room {self.room_id} until {self.expires_at}"
+    
+    class Meta:
+        ordering = ['expires_at']
+        
+        
+class ConfirmationSequence(models.Model):
+    """
+    Counter that confirmation numbers are reserved from in blocks, so each
+    process only touches the database once per block.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+        
+        
+class RoomNight(models.Model):
+    """
+    One night a room is held by an active booking.
+    The unique (room, night) constraint makes the database reject double bookings.
+    """
+    room = models.ForeignKey('rooms.Room', related_name='room_nights', on_delete=models.CASCADE)
+    booking = models.ForeignKey(Booking, related_name='room_nights', on_delete=models.CASCADE)
+    night = models.DateField()
+    
+    def __str__(self):
+        return f"Room {self.room_id} on {self.night} - Booking {self.booking_id}"
+    
+    class Meta:
+        ordering = ['night']
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'night'], name='unique_room_night'),
+        ]
+        
+        
 class Payment(models.Model):
     PAYMENT_METHOD_CHOICES = [
         ('CREDIT_CARD', 'Credit Card'),
@@ -84,4 +200,66 @@ class Payment(models.Model):
         return f"Payment {self.id} for Booking {self.booking.confirmation_number} - {self.status}"
     
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']        
+        
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be delivered by the `send_queued_emails` worker.
+    Rows are written in the same transaction as the change they announce, so
+    a rolled back booking never sends mail and a committed one always does.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    booking = models.ForeignKey(Booking, related_name='emails', on_delete=models.SET_NULL, blank=True, null=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to_email = models.EmailField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} - {self.status}"
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due'),
+        ]
+        
+        
+class IdempotencyKey(models.Model):
+    """
+    A client supplied Idempotency-Key and the response it produced, so retries
+    of the same request are answered from here instead of being processed again.
+    """
+    STATUS_CHOICES = [
+        ('IN_PROGRESS', 'In Progress'),
+        ('COMPLETED', 'Completed'),
+    ]
+    
+    key = models.CharField(max_length=255, unique=True)
+    request_fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='IN_PROGRESS')
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.JSONField(blank=True, null=True)
+    booking = models.ForeignKey(Booking, related_name='idempotency_keys', on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.key} - {self.status}"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_key_created'),
+        ]
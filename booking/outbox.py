@@ -0,0 +1,120 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from booking.models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# How long a worker owns the emails it claimed before another worker may retry them
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def queue_email(subject, body, to_email, booking=None, from_email=None):
+    """
+    Add an email to the outbox. Call it inside the transaction that makes the
+    change being announced: the row only becomes visible to the worker when
+    that transaction commits.
+    """
+    return OutboundEmail.objects.create(
+        booking=booking,
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to_email=to_email
+    )
+
+
+def retry_delay(attempts) -> timedelta:
+    """Exponential backoff: base, 2 x base, 4 x base, ... capped at one day."""
+    base = getattr(settings, 'BOOKING_EMAIL_RETRY_BACKOFF_SECONDS', 60)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), 24 * 60 * 60))
+
+
+def claim_due_emails(batch_size):
+    """
+    Claim up to ``batch_size`` due emails for this worker.
+    Rows locked by another worker are skipped, and claimed rows are pushed out
+    by CLAIM_TIMEOUT, so concurrent workers never deliver the same email and an
+    email claimed by a worker that died is picked up again later.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if emails:
+            OutboundEmail.objects.filter(id__in=[email.id for email in emails]).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + CLAIM_TIMEOUT
+            )
+    for email in emails:
+        email.attempts += 1
+    return emails
+
+
+def deliver_emails(emails, connection=None):
+    """
+    Send ``emails`` over one mail connection and record each outcome.
+    Failed emails are rescheduled with backoff until they run out of attempts.
+    Returns (sent, failed).
+    """
+    max_attempts = getattr(settings, 'BOOKING_EMAIL_MAX_ATTEMPTS', 5)
+    connection = connection or get_connection(fail_silently=False)
+    sent, failed = [], []
+
+    try:
+        connection.open()
+    except Exception as e:
+        logger.exception("Could not open mail connection")
+        failed = [(email, e) for email in emails]
+    else:
+        try:
+            for email in emails:
+                message = EmailMessage(
+                    subject=email.subject,
+                    body=email.body,
+                    from_email=email.from_email,
+                    to=[email.to_email],
+                    connection=connection
+                )
+                # One message per call so a rejected recipient only fails its own email
+                try:
+                    connection.send_messages([message])
+                except Exception as e:
+                    failed.append((email, e))
+                else:
+                    sent.append(email)
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    if sent:
+        OutboundEmail.objects.filter(id__in=[email.id for email in sent]).update(
+            status='SENT', sent_at=now, last_error=''
+        )
+    for email, error in failed:
+        gave_up = email.attempts >= max_attempts
+        logger.warning(
+            "Failed to send email %s to %s (attempt %s of %s): %s",
+            email.id, email.to_email, email.attempts, max_attempts, error
+        )
+        OutboundEmail.objects.filter(id=email.id).update(
+            status='FAILED' if gave_up else 'PENDING',
+            next_attempt_at=now if gave_up else now + retry_delay(email.attempts),
+            last_error=str(error)
+        )
+    return len(sent), len(failed)
+
+
+def send_queued_emails(batch_size=100, connection=None):
+    """Claim and deliver one batch of due emails. Returns (sent, failed)."""
+    emails = claim_due_emails(batch_size)
+    if not emails:
+        return 0, 0
+    return deliver_emails(emails, connection=connection)
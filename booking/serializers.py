@@ -1,7 +1,7 @@
 from rest_framework import serializers
-from .models import Guest, Payment, Booking
+from .models import Guest, Payment, Booking, BookingGroup, RoomHold
 from rooms.models import RoomType
-from rooms.services import get_available_rooms_for_type  
+from rooms.services import MAX_ROOMS_PER_PLAN
 from datetime import date
 
 
@@ -21,12 +21,13 @@ class BookingCreateSerializer(serializers.ModelSerializer):
     guest = GuestSerializer(write_only=True)
     payment_token = serializers.CharField(write_only=True)
     payment_method = serializers.ChoiceField(choices=Payment.PAYMENT_METHOD_CHOICES, write_only=True)
+    hold_token = serializers.UUIDField(write_only=True, required=False)
     class Meta:
         model = Booking
         fields = [
             'guest', 'room_type', 'check_in_date', 'check_out_date',
             'number_of_adults', 'number_of_children', 'special_requests',
-            'payment_token', 'payment_method',
+            'payment_token', 'payment_method', 'hold_token',
             'confirmation_number', 'status', 'price_per_night', 'total_price',
             'created_at', 'updated_at'
         ]
@@ -75,18 +76,7 @@ class BookingCreateSerializer(serializers.ModelSerializer):
                 {"number_of_children": "Number of children exceeds room capacity."}
             )
 
-        # 3. Availability check
-        available_rooms = get_available_rooms_for_type(
-            room_type=room_type,
-            check_in_date=check_in,
-            check_out_date=check_out
-        )
-
-        if not available_rooms.exists():
-            raise serializers.ValidationError(
-                "No available rooms for the selected room type and dates."
-            )
-
+        # Availability is checked when the room is claimed in create_booking_with_payment
         return data
     
     def create(self, validated_data):
@@ -108,4 +98,138 @@ class BookingConfirmationSerializer(serializers.ModelSerializer):
             'check_in_date', 'check_out_date', 'number_of_adults', 'number_of_children',
             'price_per_night', 'total_price', 'status', 'payments',
             'created_at'
-        ]
\ No newline at end of file
+        ]
+
+class RoomHoldCreateSerializer(serializers.Serializer):
+    room_type = serializers.PrimaryKeyRelatedField(queryset=RoomType.objects.all())
+    check_in_date = serializers.DateField()
+    check_out_date = serializers.DateField()
+    
+    def validate_check_in_date(self, value):
+        if value < date.today():
+            raise serializers.ValidationError(
+                "Check-in date cannot be in the past."
+            )
+        return value
+    
+    def validate(self, data):
+        if data['check_in_date'] >= data['check_out_date']:
+            raise serializers.ValidationError(
+                {"check_out_date": "Check-out date must be after check-in date."}
+            )
+        return data
+    
+    def create(self, validated_data):
+        from booking.services import hold_room
+        
+        return hold_room(
+            validated_data['room_type'],
+            validated_data['check_in_date'],
+            validated_data['check_out_date'],
+            client_key=validated_data.get('client_key', '')
+        )
+
+
+class RoomHoldSerializer(serializers.ModelSerializer):
+    hold_token = serializers.UUIDField(source='token', read_only=True)
+    room_type = serializers.IntegerField(source='room.room_type_id', read_only=True)
+    class Meta:
+        model = RoomHold
+        fields = ['hold_token', 'room_type', 'check_in_date', 'check_out_date', 'expires_at']
+
+
+class GroupBookingRoomSerializer(serializers.Serializer):
+    # Resolved for all rooms at once in GroupBookingCreateSerializer.validate_rooms
+    room_type = serializers.IntegerField()
+    count = serializers.IntegerField(min_value=1)
+
+
+class GroupBookingCreateSerializer(serializers.Serializer):
+    """A booking plan from the search results, e.g. 2 x Deluxe + 1 x Standard, for one party."""
+    guest = GuestSerializer()
+    rooms = GroupBookingRoomSerializer(many=True, allow_empty=False)
+    check_in_date = serializers.DateField()
+    check_out_date = serializers.DateField()
+    number_of_adults = serializers.IntegerField(min_value=1)
+    number_of_children = serializers.IntegerField(min_value=0, default=0)
+    special_requests = serializers.CharField(required=False, allow_blank=True)
+    payment_token = serializers.CharField()
+    payment_method = serializers.ChoiceField(choices=Payment.PAYMENT_METHOD_CHOICES)
+    
+    def validate_check_in_date(self, value):
+        if value < date.today():
+            raise serializers.ValidationError(
+                "Check-in date cannot be in the past."
+            )
+        return value
+    
+    def validate_rooms(self, value):
+        # Merge repeated room types so each is allocated in one go
+        counts = {}
+        for entry in value:
+            counts[entry['room_type']] = counts.get(entry['room_type'], 0) + entry['count']
+        if sum(counts.values()) > MAX_ROOMS_PER_PLAN:
+            raise serializers.ValidationError(
+                f"A group booking can include at most {MAX_ROOMS_PER_PLAN} rooms."
+            )
+        
+        room_types = RoomType.objects.in_bulk(list(counts))
+        unknown = [str(room_type_id) for room_type_id in counts if room_type_id not in room_types]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown room types: {', '.join(unknown)}.")
+        return [
+            {'room_type': room_types[room_type_id], 'count': count}
+            for room_type_id, count in counts.items()
+        ]
+    
+    def validate(self, data):
+        if data['check_in_date'] >= data['check_out_date']:
+            raise serializers.ValidationError(
+                {"check_out_date": "Check-out date must be after check-in date."}
+            )
+        
+        room_types = [entry['room_type'] for entry in data['rooms'] for _ in range(entry['count'])]
+        if data['number_of_adults'] < len(room_types):
+            raise serializers.ValidationError(
+                {"number_of_adults": "Each room needs at least one adult."}
+            )
+        if data['number_of_adults'] > sum(room_type.max_adults for room_type in room_types):
+            raise serializers.ValidationError(
+                {"number_of_adults": "Number of adults exceeds the capacity of the selected rooms."}
+            )
+        if data['number_of_children'] > sum(room_type.max_children for room_type in room_types):
+            raise serializers.ValidationError(
+                {"number_of_children": "Number of children exceeds the capacity of the selected rooms."}
+            )
+        
+        # Availability is checked when the rooms are claimed in create_group_booking_with_payment
+        return data
+    
+    def create(self, validated_data):
+        from booking.services import create_group_booking_with_payment
+        
+        return create_group_booking_with_payment(validated_data)
+
+
+class GroupBookingItemSerializer(serializers.ModelSerializer):
+    room_number = serializers.CharField(source='room.room_number', read_only=True)
+    room_type_name = serializers.CharField(source='room.room_type.name', read_only=True)
+    payments = PaymentSerializer(many=True, read_only=True)
+    class Meta:
+        model = Booking
+        fields = [
+            'confirmation_number', 'room_number', 'room_type_name',
+            'number_of_adults', 'number_of_children',
+            'price_per_night', 'total_price', 'status', 'payments'
+        ]
+
+
+class BookingGroupConfirmationSerializer(serializers.ModelSerializer):
+    guest = GuestSerializer(read_only=True)
+    bookings = GroupBookingItemSerializer(many=True, read_only=True)
+    class Meta:
+        model = BookingGroup
+        fields = [
+            'confirmation_number', 'guest', 'check_in_date', 'check_out_date',
+            'total_price', 'bookings', 'created_at'
+        ]
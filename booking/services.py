@@ -1,11 +1,17 @@
-from booking.models import Booking, Payment, Guest
-from django.db import transaction
-import uuid
+from booking.models import Booking, BookingGroup, Payment, Guest, RoomHold, RoomNight, normalize_guest_email
+from collections import Counter
+from decimal import Decimal
+from django.db import IntegrityError, transaction
 import random
-import string
-from rooms.services import get_available_rooms_for_type, calculate_total_price, calculate_price_per_night
-from django.core.mail import send_mail
+from booking.confirmation import generate_confirmation_number
+from booking.signals import bookings_bulk_created, room_holds_released
+from datetime import timedelta
 from django.conf import settings
+from django.utils import timezone
+from rooms.pricing import quote_room_type
+from rooms.services import get_available_rooms, get_available_rooms_for_type, price_room_types
+from booking.outbox import queue_email
+from booking.idempotency import side_effect_happened
 
 def process_paypal_payment(payment_token, amount):
     # TODO: Implement actual PayPal API integration
@@ -14,8 +20,8 @@ def process_paypal_payment(payment_token, amount):
 
 
 
-def send_confirmation_email(booking):
-    """Send booking confirmation email to guest"""
+def queue_confirmation_email(booking):
+    """Queue the booking confirmation email to the guest in the outbox"""
     subject = f'Booking Confirmation - {booking.confirmation_number}'
     
     message = f"""
@@ -37,16 +43,232 @@ def send_confirmation_email(booking):
     Hotel Team
     """
     
-    from_email = settings.DEFAULT_FROM_EMAIL
-    recipient_list = [booking.guest.email]
+    return queue_email(
+        subject=subject,
+        body=message,
+        to_email=booking.guest.email,
+        booking=booking
+    )
+
+def queue_group_confirmation_email(group, bookings):
+    """Queue one confirmation email listing every room of a group booking"""
+    subject = f'Booking Confirmation - {group.confirmation_number}'
+    rooms = "\n".join(
+        f"    - {booking.room.room_type.name} - Room {booking.room.room_number} "
+        f"({booking.number_of_adults} adults, {booking.number_of_children} children) - "
+        f"Confirmation Number: {booking.confirmation_number}"
+        for booking in bookings
+    )
     
-    send_mail(
+    message = f"""
+    Dear {group.guest.first_name} {group.guest.last_name},
+
+    Thank you for your booking!
+
+    Booking Details:
+    Group Confirmation Number: {group.confirmation_number}
+    Check-in: {group.check_in_date}
+    Check-out: {group.check_out_date}
+    Rooms:
+{rooms}
+    Total Price: ${group.total_price}
+
+    We look forward to welcoming you!
+
+    Best regards,
+    Hotel Team
+    """
+    
+    return queue_email(
         subject=subject,
-        message=message,
-        from_email=from_email,
-        recipient_list=recipient_list,
-        fail_silently=False,
+        body=message,
+        to_email=group.guest.email
+    )
+
+def get_or_create_guest(guest_data):
+    """
+    Return the guest with this email, matched case-insensitively, or create one
+    if the email is new. An existing guest is reused as it is: booking requests
+    are unauthenticated, so their details must not overwrite the guest that
+    earlier bookings and lookups show. Of duplicate rows the oldest is reused.
+    """
+    guest = (
+        Guest.objects.filter(normalized_email=normalize_guest_email(guest_data.get('email')))
+        .order_by('id')
+        .first()
+    )
+    if guest is None:
+        return Guest.objects.create(**guest_data)
+    return guest
+
+class RoomUnavailableError(Exception):
+    pass
+
+
+# Candidate rooms tried before giving up on a booking
+ALLOCATION_MAX_ATTEMPTS = 10
+
+def allocate_room(room_type, check_in_date, check_out_date, create_booking):
+    """
+    Claim a free room of ``room_type`` for the stay and create its booking.
+
+    Each candidate room is locked with SELECT ... FOR UPDATE SKIP LOCKED by a
+    query that also re-checks its bookings, overrides and holds, and handed to
+    ``create_booking(room)`` inside the same savepoint, so two requests can never
+    claim the same room. Candidates are tried in random order so concurrent
+    requests spread over different rooms instead of queueing on the first one.
+
+    A candidate whose nights turn out to be taken in the RoomNight ledger is
+    rolled back and the next one tried, so ``create_booking`` must only write
+    rows; charges and other side effects belong after allocate_room returns.
+    Any other IntegrityError is raised. Gives up with RoomUnavailableError
+    after ALLOCATION_MAX_ATTEMPTS candidates.
+    """
+    candidate_ids = list(
+        get_available_rooms_for_type(room_type, check_in_date, check_out_date)
+        .values_list('id', flat=True)
     )
+    random.shuffle(candidate_ids)
+
+    for room_id in candidate_ids[:ALLOCATION_MAX_ATTEMPTS]:
+        try:
+            with transaction.atomic():
+                # Lock the room only if it is still free in the database, in one query
+                room = (
+                    get_available_rooms([room_type.id], check_in_date, check_out_date)
+                    .select_for_update(skip_locked=True)
+                    .filter(id=room_id)
+                    .first()
+                )
+
+                # Locked by a concurrent booking, or taken since the candidates were read
+                if room is None:
+                    continue
+
+                return create_booking(room)
+        except IntegrityError:
+            # Only a night of this room booked in the meantime moves on to the next room
+            taken = RoomNight.objects.filter(
+                room_id=room_id,
+                night__gte=check_in_date,
+                night__lt=check_out_date
+            ).exists()
+            if not taken:
+                raise
+
+    raise RoomUnavailableError("No available rooms for the selected room type and dates.")
+
+
+class HoldLimitExceeded(Exception):
+    pass
+
+
+def hold_room(room_type, check_in_date, check_out_date, client_key=''):
+    """
+    Set a room of ``room_type`` aside for BOOKING_HOLD_TTL_SECONDS while the
+    guest pays. The room is claimed exactly like a booking, so a hold never
+    overlaps a booking or another hold. A client may hold at most
+    BOOKING_HOLD_MAX_PER_CLIENT rooms for overlapping dates at a time, so one
+    client can't take every room off sale.
+    """
+    ttl = timedelta(seconds=getattr(settings, 'BOOKING_HOLD_TTL_SECONDS', 600))
+    
+    if client_key:
+        max_holds = getattr(settings, 'BOOKING_HOLD_MAX_PER_CLIENT', 2)
+        active_holds = RoomHold.objects.filter(
+            client_key=client_key,
+            expires_at__gt=timezone.now(),
+            check_in_date__lt=check_out_date,
+            check_out_date__gt=check_in_date
+        ).count()
+        if active_holds >= max_holds:
+            raise HoldLimitExceeded(
+                f"At most {max_holds} rooms can be held at a time for the same dates."
+            )
+    
+    def create_hold(room):
+        return RoomHold.objects.create(
+            room=room,
+            check_in_date=check_in_date,
+            check_out_date=check_out_date,
+            expires_at=timezone.now() + ttl,
+            client_key=client_key
+        )
+    
+    return allocate_room(room_type, check_in_date, check_out_date, create_hold)
+
+
+def release_room_hold(hold_token):
+    """Give a held room back before its hold expires. Returns whether a hold was released."""
+    holds = list(RoomHold.objects.filter(token=hold_token))
+    if holds:
+        RoomHold.objects.filter(id__in=[hold.id for hold in holds]).delete()
+        room_holds_released.send(sender=RoomHold, holds=holds)
+    return bool(holds)
+
+
+def sweep_expired_holds(batch_size=1000) -> int:
+    """
+    Delete up to ``batch_size`` expired holds in one indexed range query on
+    expires_at. Returns the number deleted. The SQL availability checks already
+    ignore expired holds; sweeping frees them in the inventory and index too.
+    """
+    holds = list(
+        RoomHold.objects.filter(expires_at__lte=timezone.now())
+        .only('id', 'room_id', 'check_in_date', 'check_out_date')
+        .order_by('expires_at')[:batch_size]
+    )
+    if holds:
+        RoomHold.objects.filter(id__in=[hold.id for hold in holds]).delete()
+        room_holds_released.send(sender=RoomHold, holds=holds)
+    return len(holds)
+
+
+def book_held_room(hold_token, room_type, check_in_date, check_out_date, create_booking):
+    """
+    Turn the hold ``hold_token`` into a booking through ``create_booking(room)``.
+    The held room is booked without another availability search. A hold that
+    has already expired or been swept falls back to ``allocate_room``, which
+    still finds a room when one is free.
+    """
+    hold = (
+        RoomHold.objects.select_for_update()
+        .select_related('room')
+        .filter(token=hold_token, expires_at__gt=timezone.now())
+        .first()
+    )
+    if hold is None:
+        return allocate_room(room_type, check_in_date, check_out_date, create_booking)
+    
+    if (hold.room.room_type_id, hold.check_in_date, hold.check_out_date) != (room_type.id, check_in_date, check_out_date):
+        raise ValueError("The room hold does not match the room type and dates of this booking.")
+    
+    # The booking takes over the hold's room and nights, so no refresh is needed for it
+    hold.delete()
+    return create_booking(hold.room)
+
+
+# Confirmation numbers a single booking may try; reserved numbers never
+# collide, so a retry only guards against a sequence that was reset
+CONFIRMATION_MAX_ATTEMPTS = 3
+
+def create_booking_record(confirmation_number, confirmation_numbers, **fields):
+    """
+    Insert a booking under ``confirmation_number`` without checking for it first.
+    If the insert collides with an existing confirmation number it is retried
+    with the next of ``confirmation_numbers``; any other IntegrityError (such
+    as a room night already taken) is raised to the caller.
+    """
+    for attempt in range(CONFIRMATION_MAX_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return Booking.objects.create(confirmation_number=confirmation_number, **fields)
+        except IntegrityError:
+            taken = Booking.objects.filter(confirmation_number=confirmation_number).exists()
+            if not taken or attempt == CONFIRMATION_MAX_ATTEMPTS - 1:
+                raise
+            confirmation_number = confirmation_numbers()
+
 
 def create_booking_with_payment(validated_data):
     guest_data = validated_data.pop('guest')
@@ -58,40 +280,23 @@ def create_booking_with_payment(validated_data):
     special_requests = validated_data.pop('special_requests', '')
     payment_token = validated_data.pop('payment_token')
     payment_method = validated_data.pop('payment_method')
+    hold_token = validated_data.pop('hold_token', None)
+    # Reserved by the view before its transaction opened, or here before ours does
+    confirmation_numbers = validated_data.pop('confirmation_numbers', None)
+    if confirmation_numbers is None:
+        confirmation_numbers = generate_confirmation_number.reserve(CONFIRMATION_MAX_ATTEMPTS)
     
-    # 1. create guest object 
-    guest = Guest.objects.create(**guest_data)
-    
-    # 2. find an available room
-    available_rooms = get_available_rooms_for_type(room_type, check_in_date, check_out_date)
-    if not available_rooms.exists():
-        raise Exception("No available rooms")  # Should never happen due to validation
-    room = available_rooms.first()
-    total_price = calculate_total_price(room_type, check_in_date, check_out_date)
-    price_per_night = calculate_price_per_night(room_type, check_in_date)
-    def generate_confirmation_number():
-        """Generate a short, unique confirmation number like BK-ABC123"""
-        chars = string.ascii_uppercase + string.digits
-        random_part = ''.join(random.choices(chars, k=6))
-        code = f"BK-{random_part}"
-        
-        # Ensure uniqueness - regenerate if exists
-        while Booking.objects.filter(confirmation_number=code).exists():
-            random_part = ''.join(random.choices(chars, k=6))
-            code = f"BK-{random_part}"
-        
-        return code
-
-    # Then in create_booking_with_payment(), replace the uuid line with:
-    confirmation_number = generate_confirmation_number()
-    
-    # 3. create booking and payment atomically
-    payment_success = process_paypal_payment(payment_token, total_price)
-    if not payment_success:
-        raise Exception("Payment failed")
+    quote = quote_room_type(room_type, check_in_date, check_out_date)
+    total_price = quote.total
+    price_per_night = quote.price_per_night
+    confirmation_number = confirmation_numbers()
     
-    with transaction.atomic():
-        booking = Booking.objects.create(
+    def book_room(room):
+        # 3. create the booking while the room is locked
+        room.room_type = room_type
+        return create_booking_record(
+            confirmation_number,
+            confirmation_numbers,
             guest=guest,
             room=room,
             check_in_date=check_in_date,
@@ -101,25 +306,189 @@ def create_booking_with_payment(validated_data):
             special_requests=special_requests,
             price_per_night=price_per_night,
             total_price=total_price,
-            status='CONFIRMED',
-            confirmation_number=confirmation_number
+            status='CONFIRMED'
         )
+    
+    with transaction.atomic():
+        # 1. find the returning guest or create a new one
+        guest = get_or_create_guest(guest_data)
+        
+        # 2. book the room held for this guest, or claim an available one
+        if hold_token:
+            booking = book_held_room(hold_token, room_type, check_in_date, check_out_date, book_room)
+        else:
+            booking = allocate_room(room_type, check_in_date, check_out_date, book_room)
         
+        # 4. charge once the room is claimed, outside the retries over rooms; the
+        # payment is recorded first so a reused payment token fails before the charge
         payment = Payment.objects.create(
             booking=booking,
             amount=total_price,
             payment_method=payment_method,
             transaction_id=payment_token,  # Store the PayPal token
-            status='COMPLETED',
+            status='PENDING',
             payment_gateway='PAYPAL'
         )
+        payment_success = process_paypal_payment(payment_token, total_price)
+        if not payment_success:
+            raise Exception("Payment failed")
+        side_effect_happened('payment charged')
+        payment.status = 'COMPLETED'
+        payment.save(update_fields=['status'])
         
-        
-    # TODO: Implement email sending
-    try:
-        send_confirmation_email(booking)
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+        # 5. queue the confirmation email; `send_queued_emails` delivers it after commit
+        queue_confirmation_email(booking)
         
     return booking
 
+
+def split_party(room_types, adults, children):
+    """
+    Spread a party over one room of each entry in ``room_types``.
+    Every room gets one adult first, then the remaining adults and the
+    children fill the rooms in order up to their capacity. Returns
+    [(adults, children), ...] per room, or None if the party does not fit.
+    """
+    if (
+        adults < len(room_types)
+        or adults > sum(room_type.max_adults for room_type in room_types)
+        or children > sum(room_type.max_children for room_type in room_types)
+    ):
+        return None
+
+    remaining_adults = adults - len(room_types)
+    remaining_children = children
+    party = []
+    for room_type in room_types:
+        extra_adults = min(room_type.max_adults - 1, remaining_adults)
+        room_children = min(room_type.max_children, remaining_children)
+        remaining_adults -= extra_adults
+        remaining_children -= room_children
+        party.append((1 + extra_adults, room_children))
+    return party
+
+
+def claim_rooms(room_types, check_in_date, check_out_date):
+    """
+    Lock one free room for every entry in ``room_types`` and return them in
+    the same order. Each room type takes only as many rooms as it needs, with
+    one SELECT ... FOR UPDATE SKIP LOCKED ... LIMIT per type, so the rest stay
+    free for concurrent bookings while this one pays. Raises
+    RoomUnavailableError if any type runs short; the caller's transaction
+    then releases the rooms already locked.
+    """
+    wanted = Counter(room_type.id for room_type in room_types)
+    free_rooms = {}
+    for room_type in room_types:
+        if room_type.id in free_rooms:
+            continue
+        free_rooms[room_type.id] = list(
+            get_available_rooms([room_type.id], check_in_date, check_out_date)
+            .select_for_update(skip_locked=True)[:wanted[room_type.id]]
+        )
+        if len(free_rooms[room_type.id]) < wanted[room_type.id]:
+            raise RoomUnavailableError(
+                f"Not enough {room_type.name} rooms available for the selected dates."
+            )
+
+    claimed = []
+    for room_type in room_types:
+        room = free_rooms[room_type.id].pop()
+        room.room_type = room_type
+        claimed.append(room)
+    return claimed
+
+
+def create_group_booking_with_payment(validated_data):
+    """
+    Book several rooms for one party in one transaction: either every room of
+    the plan is booked and paid for, or none is.
+    """
+    guest_data = validated_data.pop('guest')
+    rooms = validated_data.pop('rooms')
+    check_in_date = validated_data.pop('check_in_date')
+    check_out_date = validated_data.pop('check_out_date')
+    number_of_adults = validated_data.pop('number_of_adults')
+    number_of_children = validated_data.pop('number_of_children')
+    special_requests = validated_data.pop('special_requests', '')
+    payment_token = validated_data.pop('payment_token')
+    payment_method = validated_data.pop('payment_method')
+    confirmation_numbers = validated_data.pop('confirmation_numbers', None)
+    
+    # One entry per room, largest rooms first so they take the extra guests
+    room_types = sorted(
+        (entry['room_type'] for entry in rooms for _ in range(entry['count'])),
+        key=lambda room_type: (-room_type.max_adults, -room_type.max_children, room_type.id)
+    )
+    party = split_party(room_types, number_of_adults, number_of_children)
+    if party is None:
+        raise ValueError("The party does not fit in the selected rooms.")
+    
+    quotes = price_room_types({room_type.id: room_type for room_type in room_types}.values(), check_in_date, check_out_date)
+    total_price = sum((quotes[room_type.id].total for room_type in room_types), Decimal("0.00"))
+    if confirmation_numbers is None:
+        # One for the group and one per booking, before the transaction opens
+        confirmation_numbers = generate_confirmation_number.reserve(1 + len(room_types))
+    
+    with transaction.atomic():
+        # 1. find the returning guest or create a new one
+        guest = get_or_create_guest(guest_data)
+        
+        # 2. lock one free room per entry of the plan, one query per room type
+        claimed_rooms = claim_rooms(room_types, check_in_date, check_out_date)
+        
+        # 3. insert the group, its bookings and their room nights in bulk;
+        # bulk_create skips Booking.save(), so the ledger is written here
+        group = BookingGroup.objects.create(
+            guest=guest,
+            confirmation_number=confirmation_numbers(prefix='GR'),
+            check_in_date=check_in_date,
+            check_out_date=check_out_date,
+            total_price=total_price
+        )
+        bookings = Booking.objects.bulk_create([
+            Booking(
+                guest=guest,
+                room=room,
+                group=group,
+                check_in_date=check_in_date,
+                check_out_date=check_out_date,
+                number_of_adults=adults,
+                number_of_children=children,
+                special_requests=special_requests,
+                price_per_night=quotes[room.room_type_id].price_per_night,
+                total_price=quotes[room.room_type_id].total,
+                confirmation_number=confirmation_numbers(),
+                status='CONFIRMED'
+            )
+            for room, (adults, children) in zip(claimed_rooms, party)
+        ])
+        RoomNight.objects.bulk_create([
+            RoomNight(room_id=booking.room_id, booking=booking, night=night)
+            for booking in bookings
+            for night in booking.booked_nights()
+        ])
+        
+        # 4. charge the whole group once, then record a payment per booking
+        payment_success = process_paypal_payment(payment_token, total_price)
+        if not payment_success:
+            raise Exception("Payment failed")
+        side_effect_happened('payment charged')
+        
+        Payment.objects.bulk_create([
+            Payment(
+                booking=booking,
+                amount=booking.total_price,
+                payment_method=payment_method,
+                transaction_id=f"{payment_token}-{index}",  # transaction_id is unique per payment
+                status='COMPLETED',
+                payment_gateway='PAYPAL'
+            )
+            for index, booking in enumerate(bookings, start=1)
+        ])
+        
+        # 5. post_save never fired for the bulk insert
+        bookings_bulk_created.send(sender=Booking, bookings=bookings)
+        queue_group_confirmation_email(group, bookings)
+        
+    return group
@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent after bookings are inserted with bulk_create, which skips save() and
+# post_save. Receivers get ``bookings``, the list of created Booking objects.
+bookings_bulk_created = Signal()
+
+# Sent after room holds are deleted in bulk (released, converted or expired).
+# Receivers get ``holds``, the list of deleted RoomHold objects.
+room_holds_released = Signal()
@@ -1,3 +1,434 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.db import IntegrityError, OperationalError, transaction
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from booking.confirmation import (
+    ALPHABET, ConfirmationNumberGenerator, encode_confirmation_number, is_valid_confirmation_number
+)
+from booking.idempotency import sweep_expired_idempotency_keys
+from booking.management.commands.benchmark_services import Command as BenchmarkCommand
+from hotel.query_budget import assert_within_query_budget
+from booking.models import Booking, ConfirmationSequence, IdempotencyKey, OutboundEmail, Payment, RoomNight
+from booking.outbox import CLAIM_TIMEOUT, claim_due_emails, queue_email, send_queued_emails
+from booking.services import RoomUnavailableError, claim_rooms, create_booking_with_payment
+from rest_framework.throttling import ScopedRateThrottle
+from rooms.availability_index import get_availability_index, index_enabled
+from rooms.models import Room
+from rooms.tests import HotelTestCase, stay_date
 
-# Create your tests here.
+
+class BookingTestCase(HotelTestCase):
+    def booking_payload(self, payment_token='tok-1', **overrides):
+        return {
+            'guest': {'first_name': 'Ada', 'last_name': 'Guest', 'email': 'ada@example.com'},
+            'room_type': self.standard.id,
+            'check_in_date': stay_date(0).isoformat(),
+            'check_out_date': stay_date(2).isoformat(),
+            'number_of_adults': 1,
+            'number_of_children': 0,
+            'payment_token': payment_token,
+            'payment_method': 'PAYPAL',
+            **overrides,
+        }
+
+    def booking_data(self, payment_token='tok-1', **overrides):
+        return {
+            'guest': {'first_name': 'Ada', 'last_name': 'Guest', 'email': 'ada@example.com'},
+            'room_type': self.standard,
+            'check_in_date': stay_date(0),
+            'check_out_date': stay_date(2),
+            'number_of_adults': 1,
+            'number_of_children': 0,
+            'payment_token': payment_token,
+            'payment_method': 'PAYPAL',
+            **overrides,
+        }
+
+
+@mock.patch('booking.services.process_paypal_payment', return_value=True)
+class ChargeOnceTests(BookingTestCase):
+    def test_room_conflict_charges_once(self, charge):
+        # Room 101 looks free to the availability query, but its nights are
+        # already in the ledger, so claiming it fails and room 102 is booked
+        cancelled = self.book('101', stay_date(5), stay_date(6), 'BK-TEST01')
+        Booking.objects.filter(id=cancelled.id).update(status='CANCELLED')
+        RoomNight.objects.create(room=self.rooms['101'], booking=cancelled, night=stay_date(1))
+
+        with mock.patch('booking.services.random.shuffle'):
+            booking = create_booking_with_payment(self.booking_data())
+
+        self.assertEqual(booking.room, self.rooms['102'])
+        self.assertEqual(charge.call_count, 1)
+        self.assertEqual(booking.payments.get().status, 'COMPLETED')
+
+    def test_reused_payment_token_is_not_charged(self, charge):
+        earlier = self.book('201', stay_date(5), stay_date(6), 'BK-TEST01')
+        Payment.objects.create(booking=earlier, amount=Decimal('100.00'), payment_method='PAYPAL', transaction_id='tok-1')
+
+        with self.assertRaises(IntegrityError):
+            create_booking_with_payment(self.booking_data(payment_token='tok-1'))
+
+        self.assertEqual(charge.call_count, 0)
+        self.assertFalse(Booking.objects.filter(room__room_type=self.standard).exists())
+
+
+class ClaimRoomsTests(HotelTestCase):
+    def test_locks_only_the_rooms_it_needs(self):
+        with CaptureQueriesContext(connection) as queries:
+            rooms = claim_rooms([self.family, self.standard, self.family], stay_date(0), stay_date(2))
+
+        self.assertEqual([room.room_type for room in rooms], [self.family, self.standard, self.family])
+        self.assertEqual(len({room.id for room in rooms}), 3)
+        # One limited query per room type, rather than every free room of the plan's types
+        room_queries = [query['sql'] for query in queries if 'FROM "rooms_room"' in query['sql']]
+        self.assertEqual(len(room_queries), 2)
+        self.assertTrue(all(sql.rstrip().endswith(('LIMIT 1', 'LIMIT 2')) for sql in room_queries))
+
+    def test_raises_when_a_type_runs_short(self):
+        self.book('201', stay_date(1), stay_date(2), 'BK-TEST01')
+        with self.assertRaises(RoomUnavailableError):
+            claim_rooms([self.standard, self.family, self.family], stay_date(0), stay_date(2))
+
+
+class ConfirmationNumberTests(TestCase):
+    def test_check_character_catches_typos_and_swaps(self):
+        for value in (0, 1, 35, 36, 123_456, 2_176_782_335):
+            number = encode_confirmation_number(value)
+            self.assertRegex(number, r'^BK-[0-9A-Z]{7}$')
+            self.assertTrue(is_valid_confirmation_number(number))
+
+            code = number[3:]
+            for position, char in enumerate(code):
+                for typo in ALPHABET:
+                    if typo != char:
+                        self.assertFalse(is_valid_confirmation_number(f"BK-{code[:position]}{typo}{code[position + 1:]}"))
+            for position in range(len(code) - 1):
+                if code[position] != code[position + 1]:
+                    swapped = code[:position] + code[position + 1] + code[position] + code[position + 2:]
+                    self.assertFalse(is_valid_confirmation_number(f"BK-{swapped}"))
+
+    def test_blocks_are_reserved_once_and_never_overlap(self):
+        first = ConfirmationNumberGenerator(sequence_name='test', block_size=5)
+        second = ConfirmationNumberGenerator(sequence_name='test', block_size=5)
+
+        numbers = [first() for _ in range(3)]
+        with self.assertNumQueries(0):
+            numbers += [first() for _ in range(2)]
+        numbers += [second() for _ in range(5)] + [first()]
+
+        self.assertEqual(len(set(numbers)), 11)
+        self.assertEqual(ConfirmationSequence.objects.get(name='test').next_value, 15)
+
+    def test_blocks_are_not_reserved_inside_a_transaction(self):
+        generator = ConfirmationNumberGenerator(sequence_name='test', block_size=5)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            generator()
+        self.assertFalse(ConfirmationSequence.objects.filter(name='test').exists())
+
+
+@mock.patch('booking.services.process_paypal_payment', return_value=True)
+class BookingConfirmationNumberTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.generator = ConfirmationNumberGenerator(sequence_name='test', block_size=5)
+        patcher = mock.patch('booking.views.generate_confirmation_number', self.generator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self):
+        return self.client.post('/api/bookings/create/', self.booking_payload(), content_type='application/json')
+
+    def test_failed_booking_keeps_its_block_reserved(self, charge):
+        Room.objects.filter(room_type=self.standard).update(status='MAINTENANCE')
+        self.assertEqual(self.create().status_code, 400)
+
+        # The rolled back request must not give its numbers back to the sequence
+        self.assertEqual(ConfirmationSequence.objects.get(name='test').next_value, 5)
+        other = ConfirmationNumberGenerator(sequence_name='test', block_size=5)
+        self.assertNotEqual(other(), self.generator())
+
+    def test_taken_confirmation_number_is_retried(self, charge):
+        self.book('201', stay_date(5), stay_date(6), encode_confirmation_number(0))
+
+        response = self.create()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['confirmation_number'], encode_confirmation_number(1))
+
+
+@mock.patch('booking.services.process_paypal_payment', return_value=True)
+class IdempotencyKeyTests(BookingTestCase):
+    def create(self, payment_token='tok-1', key='key-1'):
+        return self.client.post(
+            '/api/bookings/create/',
+            self.booking_payload(payment_token=payment_token),
+            content_type='application/json',
+            headers={'Idempotency-Key': key}
+        )
+
+    def test_failure_after_charge_is_replayed_without_charging_again(self, charge):
+        with mock.patch('booking.services.queue_confirmation_email', side_effect=RuntimeError('mail queue down')):
+            first = self.create()
+        retry = self.create()
+
+        self.assertEqual(first.status_code, 400)
+        self.assertEqual((retry.status_code, retry.json()), (400, first.json()))
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(charge.call_count, 1)
+        self.assertFalse(Booking.objects.exists())
+
+    def set_standard_rooms_status(self, status):
+        # Saved one by one, so the signals refresh the availability index and inventory
+        with self.captureOnCommitCallbacks(execute=True):
+            for room in Room.objects.filter(room_type=self.standard):
+                room.status = status
+                room.save()
+
+    def test_failure_before_charge_releases_the_key(self, charge):
+        self.set_standard_rooms_status('MAINTENANCE')
+        self.assertEqual(self.create().status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.set_standard_rooms_status('AVAILABLE')
+        self.assertEqual(self.create().status_code, 201)
+        self.assertEqual(charge.call_count, 1)
+
+    def test_locked_database_is_a_server_error(self, charge):
+        with mock.patch('booking.services.get_or_create_guest', side_effect=OperationalError('database is locked')):
+            response = self.create()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(charge.call_count, 0)
+
+    def test_server_error_after_charge_releases_the_key(self, charge):
+        with mock.patch('booking.services.queue_confirmation_email', side_effect=OperationalError('database is locked')):
+            first = self.create()
+        retry = self.create()
+
+        self.assertEqual(first.status_code, 503)
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', retry.headers)
+        self.assertEqual(Booking.objects.get().confirmation_number, retry.json()['confirmation_number'])
+
+    def test_sweep_deletes_expired_keys(self, charge):
+        IdempotencyKey.objects.create(key='old', request_fingerprint='x')
+        IdempotencyKey.objects.create(key='new', request_fingerprint='x')
+        IdempotencyKey.objects.filter(key='old').update(created_at=timezone.now() - timedelta(hours=25))
+
+        self.assertEqual(sweep_expired_idempotency_keys(), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        # The clock the worker sees, by which the emails queued in the test are due
+        self.now = timezone.now() + timedelta(seconds=1)
+
+    def queue(self, to_email='ada@example.com'):
+        return queue_email('Booking Confirmation', 'See you soon', to_email)
+
+    def rejecting_connection(self, *rejected):
+        def send_messages(messages):
+            if messages[0].to[0] in rejected:
+                raise SMTPRecipientsRefused({messages[0].to[0]: (550, b'No such user')})
+            return 1
+        return mock.Mock(send_messages=mock.Mock(side_effect=send_messages))
+
+    def send_at(self, now, **kwargs):
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            return send_queued_emails(**kwargs)
+
+    def test_failed_email_is_retried_with_backoff(self):
+        email = self.queue()
+        connection = self.rejecting_connection('ada@example.com')
+
+        self.assertEqual(self.send_at(self.now, connection=connection), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('PENDING', 1))
+        self.assertEqual(email.next_attempt_at, self.now + timedelta(seconds=60))
+
+        # Not due again until the backoff has passed, then twice as long
+        self.assertEqual(self.send_at(self.now + timedelta(seconds=59), connection=connection), (0, 0))
+        self.assertEqual(self.send_at(self.now + timedelta(seconds=60), connection=connection), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(email.next_attempt_at, self.now + timedelta(seconds=60 + 120))
+
+    @override_settings(BOOKING_EMAIL_MAX_ATTEMPTS=2)
+    def test_email_fails_after_max_attempts(self):
+        email = self.queue()
+        OutboundEmail.objects.filter(id=email.id).update(attempts=1)
+
+        self.assertEqual(self.send_at(self.now, connection=self.rejecting_connection('ada@example.com')), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('FAILED', 2))
+        self.assertIn('No such user', email.last_error)
+        self.assertEqual(self.send_at(self.now + timedelta(days=2)), (0, 0))
+
+    def test_batch_is_sent_over_one_connection(self):
+        for _ in range(3):
+            self.queue()
+
+        with mock.patch('booking.outbox.get_connection', wraps=get_connection) as connect:
+            self.assertEqual(send_queued_emails(), (3, 0))
+
+        connect.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status='SENT').exists())
+
+    def test_rejected_recipient_fails_only_its_email(self):
+        self.queue('bounce@example.com')
+        self.queue()
+        connection = self.rejecting_connection('bounce@example.com')
+
+        self.assertEqual(send_queued_emails(connection=connection), (1, 1))
+        connection.open.assert_called_once()
+        connection.close.assert_called_once()
+        self.assertEqual(OutboundEmail.objects.get(status='SENT').to_email, 'ada@example.com')
+
+    def test_claimed_emails_are_skipped_by_other_workers(self):
+        self.queue()
+        self.queue()
+
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            claimed = claim_due_emails(10)
+            self.assertEqual(claim_due_emails(10), [])
+        self.assertEqual(len(claimed), 2)
+
+        # A worker that died holds them until the claim times out
+        with mock.patch('django.utils.timezone.now', return_value=self.now + CLAIM_TIMEOUT):
+            reclaimed = claim_due_emails(10)
+        self.assertEqual([email.attempts for email in reclaimed], [2, 2])
+
+
+class BenchmarkCompareTests(TestCase):
+    def test_zero_and_missing_baseline_metrics_are_skipped(self):
+        report = {'dataset': {'seed': 1}, 'benchmarks': {'search': {'p50_ms': 2.0, 'p95_ms': 5.0, 'queries_max': 3}}}
+        baseline = {'dataset': {'seed': 1}, 'benchmarks': {'search': {'p50_ms': 0.0, 'p95_ms': 2.0}}}
+
+        regressions = BenchmarkCommand().compare(report, baseline, threshold=10)
+
+        self.assertEqual(regressions, ['search: p95_ms 2.00 -> 5.00 (+150%)'])
+
+
+class RoomHoldLimitTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def hold(self, room_type, check_in_days=0, check_out_days=2):
+        return self.client.post('/api/bookings/holds/', {
+            'room_type': room_type.id,
+            'check_in_date': stay_date(check_in_days).isoformat(),
+            'check_out_date': stay_date(check_out_days).isoformat(),
+        }, content_type='application/json')
+
+    @override_settings(BOOKING_HOLD_MAX_PER_CLIENT=2)
+    def test_holds_are_capped_per_client_and_stay(self):
+        self.assertEqual([self.hold(self.family).status_code for _ in range(2)], [201, 201])
+        self.assertEqual(self.hold(self.standard, 1, 3).status_code, 429)
+        self.assertEqual(self.hold(self.standard, 2, 4).status_code, 201)
+
+    def test_holds_are_throttled(self):
+        with mock.patch.object(ScopedRateThrottle, 'THROTTLE_RATES', {'room_holds': '2/minute'}):
+            responses = [self.hold(self.family, days, days + 1).status_code for days in range(3)]
+        self.assertEqual(responses, [201, 201, 429])
+
+
+@mock.patch('booking.services.process_paypal_payment', return_value=True)
+class ReturningGuestTests(BookingTestCase):
+    def test_booking_does_not_change_an_existing_guest(self, charge):
+        earlier = self.book('201', stay_date(5), stay_date(6), 'BK-TEST01')
+        data = self.booking_data()
+        data['guest'] = {'first_name': 'Mallory', 'last_name': 'Other', 'email': ' ADA@example.com', 'phone_number': '555'}
+
+        booking = create_booking_with_payment(data)
+
+        self.assertEqual(booking.guest, earlier.guest)
+        self.guest.refresh_from_db()
+        self.assertEqual((self.guest.first_name, self.guest.last_name, self.guest.phone_number), ('Ada', 'Guest', None))
+
+
+class BookingLookupTests(HotelTestCase):
+    def test_non_string_fields_are_rejected(self):
+        self.book('101', stay_date(0), stay_date(1), 'BK-TEST01')
+        for path in ('/api/bookings/lookup/', '/api/bookings/async/lookup/'):
+            for body in ({'confirmation_number': 123, 'email': 'ada@example.com'}, {'confirmation_number': 'BK-TEST01', 'email': ['ada@example.com']}):
+                response = self.client.post(path, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+            response = self.client.post(path, {'confirmation_number': 'bk-test01', 'email': 'Ada@example.com'}, content_type='application/json')
+            self.assertEqual(response.json()['confirmation_number'], 'BK-TEST01')
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    async def test_async_lookup_matches_sync(self):
+        await sync_to_async(self.book)('101', stay_date(0), stay_date(1), 'BK-TEST01')
+        body = {'confirmation_number': 'BK-TEST01', 'email': 'ada@example.com'}
+
+        response = await self.async_client.post('/api/bookings/async/lookup/', body, content_type='application/json')
+        expected = await sync_to_async(self.client.post)('/api/bookings/lookup/', body, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        assert_within_query_budget(response)
+        self.assertEqual(response.json(), expected.json())
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+@mock.patch('booking.services.process_paypal_payment', return_value=True)
+class QueryBudgetTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # A fresh generator, so every booking pays for reserving a block (but
+        # not for creating the sequence, which happens once per database)
+        ConfirmationSequence.objects.create(name='booking')
+        # Loaded once per process, not per request
+        if index_enabled():
+            get_availability_index()
+        patcher = mock.patch('booking.views.generate_confirmation_number', ConfirmationNumberGenerator())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, path, data, **extra):
+        response = self.client.post(path, data, content_type='application/json', **extra)
+        assert_within_query_budget(response)
+        return response
+
+    def test_create_booking(self, charge):
+        response = self.post('/api/bookings/create/', self.booking_payload(), headers={'Idempotency-Key': 'key-1'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.post('/api/bookings/create/', self.booking_payload(), headers={'Idempotency-Key': 'key-1'}).status_code, 201)
+
+    def test_create_group_booking(self, charge):
+        data = self.booking_payload(number_of_adults=5)
+        data['rooms'] = [{'room_type': self.standard.id, 'count': 2}, {'room_type': self.family.id, 'count': 1}]
+        del data['room_type']
+        self.assertEqual(self.post('/api/bookings/group/', data).status_code, 201)
+
+    def test_hold_and_release(self, charge):
+        response = self.post('/api/bookings/holds/', {
+            'room_type': self.family.id,
+            'check_in_date': stay_date(0).isoformat(),
+            'check_out_date': stay_date(2).isoformat(),
+        })
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.delete(f"/api/bookings/holds/{response.json()['hold_token']}/")
+        self.assertEqual(response.status_code, 204)
+        assert_within_query_budget(response)
+
+    def test_lookup(self, charge):
+        self.book('101', stay_date(0), stay_date(1), 'BK-TEST01')
+        response = self.post('/api/bookings/lookup/', {'confirmation_number': 'BK-TEST01', 'email': 'ada@example.com'})
+        self.assertEqual(response.status_code, 200)
@@ -1,7 +1,11 @@
-from .views import CreateBookingView, BookingLookupView
+from .views import CreateBookingView, CreateGroupBookingView, BookingLookupView, BookingLookupAsyncView, RoomHoldView, RoomHoldReleaseView
 from django.urls import path
 
 urlpatterns = [
     path('create/', CreateBookingView.as_view(), name='create-booking'),
+    path('group/', CreateGroupBookingView.as_view(), name='create-group-booking'),
+    path('holds/', RoomHoldView.as_view(), name='room-hold'),
+    path('holds/<uuid:hold_token>/', RoomHoldReleaseView.as_view(), name='room-hold-release'),
     path('lookup/', BookingLookupView.as_view(), name='booking-lookup'),
+    path('async/lookup/', BookingLookupAsyncView.as_view(), name='booking-lookup-async'),
 ]
\ No newline at end of file
@@ -1,28 +1,206 @@
 from rest_framework.generics import CreateAPIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import BookingCreateSerializer, BookingConfirmationSerializer
+from .models import Booking, BookingGroup, normalize_guest_email
+from .serializers import (
+    BookingCreateSerializer, BookingConfirmationSerializer,
+    GroupBookingCreateSerializer, BookingGroupConfirmationSerializer,
+    RoomHoldCreateSerializer, RoomHoldSerializer
+)
 from rest_framework.views import APIView
+from rest_framework.throttling import ScopedRateThrottle
+from django.db import OperationalError, transaction
+from django.db.models import Prefetch
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from hotel.async_api import json_response, parse_json_body
+from hotel.request_timing import timed
+from .confirmation import generate_confirmation_number
+from .services import CONFIRMATION_MAX_ATTEMPTS, HoldLimitExceeded, release_room_hold
+from .idempotency import (
+    IDEMPOTENCY_HEADER, IdempotencyKeyInUse, IdempotencyKeyMismatch, begin_idempotent_request,
+    complete_idempotent_request, release_idempotent_request, request_fingerprint, tracking_side_effects
+)
 
-class CreateBookingView(CreateAPIView):
+class IdempotentCreateMixin:
+    """
+    Create view that clients can retry safely by sending an Idempotency-Key
+    header: a retry gets the original response without running the create again.
+    """
+    confirmation_serializer_class = None
+    
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return self.create_booking(request)
+        
+        # Retries with the same key get the original response without booking again
+        try:
+            record, replay = begin_idempotent_request(key, request_fingerprint(request))
+        except IdempotencyKeyMismatch as e:
+            return Response({"error": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except IdempotencyKeyInUse as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+        
+        if replay:
+            return Response(
+                record.response_body,
+                status=record.response_status,
+                headers={'Idempotent-Replayed': 'true'}
+            )
+        
+        response = None
+        with tracking_side_effects() as side_effects:
+            try:
+                response = self.create_booking(request, idempotency_record=record)
+            finally:
+                if not side_effects or (response is not None and response.status_code >= 500):
+                    # Nothing happened yet, or a server error (e.g. a locked
+                    # database) that tells the client to retry: the retry runs again
+                    release_idempotent_request(record)
+                elif response is not None and response.status_code >= 400:
+                    # Failed after charging: retries get this failure instead of charging again
+                    complete_idempotent_request(record, response)
+        return response
+    
+    def get_confirmation_instance(self, instance):
+        return instance
+    
+    def confirmation_numbers_needed(self, validated_data):
+        return CONFIRMATION_MAX_ATTEMPTS
+    
+    def create_booking(self, request, idempotency_record=None):
+        serializer = self.get_serializer(data=request.data)
+        with timed('serialize'):
+            serializer.is_valid(raise_exception=True)
+        
+        try:
+            # Taken before the transaction opens, so a rollback can't give them back
+            confirmation_numbers = generate_confirmation_number.reserve(
+                self.confirmation_numbers_needed(serializer.validated_data)
+            )
+            with transaction.atomic():
+                instance = serializer.save(confirmation_numbers=confirmation_numbers)
+                confirmation_serializer = self.confirmation_serializer_class(self.get_confirmation_instance(instance))
+                with timed('serialize'):
+                    data = confirmation_serializer.data
+                response = Response(data, status=status.HTTP_201_CREATED)
+                if idempotency_record is not None:
+                    complete_idempotent_request(
+                        idempotency_record,
+                        response,
+                        booking=instance if isinstance(instance, Booking) else None
+                    )
+        except OperationalError as e:
+            # e.g. "database is locked": the server's failure, not the request's, so clients may retry
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '1'}
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return response
+
+
+class CreateBookingView(IdempotentCreateMixin, CreateAPIView):
     serializer_class = BookingCreateSerializer
+    confirmation_serializer_class = BookingConfirmationSerializer
+    # 21 per booking and 5 more with an Idempotency-Key, plus 4 when a block of
+    # confirmation numbers is reserved
+    query_budget = 30
+
+
+class CreateGroupBookingView(IdempotentCreateMixin, CreateAPIView):
+    """Books every room of a booking plan in one request, or none of them."""
+    serializer_class = GroupBookingCreateSerializer
+    confirmation_serializer_class = BookingGroupConfirmationSerializer
+    # 16, plus one per room type of the plan (rooms are locked per type, at most
+    # MAX_ROOMS_PER_PLAN types), plus 4 when a block of confirmation numbers is reserved
+    query_budget = 30
+    
+    def confirmation_numbers_needed(self, validated_data):
+        # One for the group and one per room
+        return 1 + sum(entry['count'] for entry in validated_data['rooms'])
+    
+    def get_confirmation_instance(self, group):
+        return BookingGroup.objects.select_related('guest').prefetch_related(
+            Prefetch('bookings', queryset=Booking.objects.select_related('room__room_type').prefetch_related('payments'))
+        ).get(pk=group.pk)
+    
+class RoomHoldView(CreateAPIView):
+    """
+    Sets a room aside while the guest pays. Pass the returned hold_token to
+    the booking create endpoint before the hold expires.
+    """
+    serializer_class = RoomHoldCreateSerializer
+    # Holds are anonymous, so they are rate limited per client as well as capped
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'room_holds'
+    query_budget = 7
+    
+    def get_client_key(self):
+        if self.request.user.is_authenticated:
+            return f"user:{self.request.user.pk}"
+        return f"ip:{self.get_throttles()[0].get_ident(self.request)}"
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
         try:
-            booking = serializer.save()
+            hold = serializer.save(client_key=self.get_client_key())
+        except HoldLimitExceeded as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
         except Exception as e:
             return Response(
-                {"error": str(e)}, 
+                {"error": str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        confirmation_serializer = BookingConfirmationSerializer(booking)
-        return Response(confirmation_serializer.data, status=status.HTTP_201_CREATED)
+        return Response(RoomHoldSerializer(hold).data, status=status.HTTP_201_CREATED)
+
+
+class RoomHoldReleaseView(APIView):
+    query_budget = 3
     
+    def delete(self, request, hold_token, *args, **kwargs):
+        
+        if not release_room_hold(hold_token):
+            return Response(
+                {"error": "Hold not found."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def booking_lookup_queryset(confirmation_number, email):
+    """
+    The booking with ``confirmation_number`` whose guest has ``email``, with what
+    BookingConfirmationSerializer reads. Matching both in one query makes a wrong
+    email look the same as an unknown confirmation number.
+    """
+    return (
+        Booking.objects.select_related('guest', 'room__room_type')
+        .prefetch_related('payments')
+        .filter(
+            confirmation_number=confirmation_number.strip().upper(),
+            guest__normalized_email=normalize_guest_email(email)
+        )
+    )
+
+
 class BookingLookupView(APIView):
+    # booking with guest, room and room type, then its payments
+    query_budget = 2
     
     def post(self, request, *args, **kwargs):
         confirmation_number = request.data.get('confirmation_number')
@@ -34,23 +212,62 @@ class BookingLookupView(APIView):
                 {"error": "Both confirmation_number and email are required."},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if not isinstance(confirmation_number, str) or not isinstance(email, str):
+            return Response(
+                {"error": "confirmation_number and email must be strings."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Look up booking
-        try:
-            booking = Booking.objects.get(confirmation_number=confirmation_number)
-        except Booking.DoesNotExist:
+        booking = booking_lookup_queryset(confirmation_number, email).first()
+        if booking is None:
             return Response(
                 {"error": "Booking not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Verify email matches
-        if booking.guest.email != email:
-            return Response(
-                {"error": "Email does not match booking records."},
-                status=status.HTTP_403_FORBIDDEN
+        # Return booking details
+        serializer = BookingConfirmationSerializer(booking)
+        with timed('serialize'):
+            data = serializer.data
+        return Response(data, status=status.HTTP_200_OK)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BookingLookupAsyncView(View):
+    """BookingLookupView on the async ORM, for ASGI. Same body and response."""
+    # booking with guest, room and room type, then its payments
+    query_budget = 2
+    
+    async def post(self, request, *args, **kwargs):
+        data = parse_json_body(request)
+        if data is None:
+            return json_response(
+                {"detail": "JSON parse error."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        confirmation_number = data.get('confirmation_number')
+        email = data.get('email')
+        
+        # Validate both are provided
+        if not confirmation_number or not email:
+            return json_response(
+                {"error": "Both confirmation_number and email are required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not isinstance(confirmation_number, str) or not isinstance(email, str):
+            return json_response(
+                {"error": "confirmation_number and email must be strings."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        booking = await booking_lookup_queryset(confirmation_number, email).afirst()
+        if booking is None:
+            return json_response(
+                {"error": "Booking not found."},
+                status=status.HTTP_404_NOT_FOUND
             )
         
-        # Return booking details
         serializer = BookingConfirmationSerializer(booking)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        with timed('serialize'):
+            data = serializer.data
+        return json_response(data)
@@ -0,0 +1,21 @@
+import json
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+
+def json_response(data, status=200):
+    """
+    JSON response for plain async views, rendered like DRF's responses so the
+    async endpoints return the same values (e.g. decimals as numbers) as their
+    sync counterparts.
+    """
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def parse_json_body(request):
+    """The request's JSON object body, or None when it isn't one."""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
@@ -0,0 +1,65 @@
+import math
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(math.ceil(percent / 100 * len(sorted_values)), 1) - 1]
+
+
+def add_dataset_arguments(parser, rooms=500, bookings=20000, existing_data_help=''):
+    """The seed_rooms options sizing the generated dataset, plus --existing-data."""
+    dataset = parser.add_argument_group('dataset', 'Passed to seed_rooms to fill a throwaway database')
+    dataset.add_argument('--room-types', type=int, default=10)
+    dataset.add_argument('--rooms', type=int, default=rooms)
+    dataset.add_argument('--bookings', type=int, default=bookings)
+    dataset.add_argument('--pricing-rules', type=int, default=50)
+    dataset.add_argument('--overrides', type=int, default=100)
+    dataset.add_argument('--horizon-days', type=int, default=365)
+    dataset.add_argument('--seed', type=int, default=0, help='Seeds both the dataset and the generated inputs')
+    dataset.add_argument(
+        '--existing-data',
+        action='store_true',
+        help=f'Use the configured database as it is instead of a generated one. {existing_data_help}'.strip()
+    )
+
+
+@contextmanager
+def generated_database(options, stdout, on_disk=False):
+    """
+    Switch the default connection to a new test database filled by seed_rooms
+    from the dataset options, and drop it on exit. ``on_disk`` keeps an SQLite
+    database in a file instead of in memory, so other threads can write to it.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    if on_disk and connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'hotel_benchmark.sqlite3')
+
+    stdout.write('Creating benchmark database...')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        started = time.perf_counter()
+        call_command(
+            'seed_rooms',
+            room_types=options['room_types'],
+            rooms=options['rooms'],
+            bookings=options['bookings'],
+            pricing_rules=options['pricing_rules'],
+            overrides=options['overrides'],
+            horizon_days=options['horizon_days'],
+            seed=options['seed'],
+            stdout=stdout if options['verbosity'] > 1 else StringIO()
+        )
+        stdout.write(f'✓ Dataset generated in {time.perf_counter() - started:.1f}s')
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,55 @@
+import time
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+
+class QueryCounter:
+    """Counts the SQL statements (and their time) run while installed on a connection."""
+
+    def __init__(self, record_sql=False):
+        self.count = 0
+        self.duration = 0.0
+        self.record_sql = record_sql
+        self.queries = []  # [(sql, seconds)] when record_sql is set
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.record_sql:
+                self.queries.append((sql, elapsed))
+
+
+@contextmanager
+def count_queries(record_sql=False, using=None):
+    """
+    Count queries on one database alias, or on every configured alias.
+    Works without DEBUG, since it hooks ``execute_wrapper`` rather than
+    ``connection.queries``.
+    """
+    counter = QueryCounter(record_sql=record_sql)
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(counter))
+        yield counter
+
+
+@asynccontextmanager
+async def acount_queries(record_sql=False, using=None):
+    """
+    count_queries for async code. The async ORM runs its queries on the
+    request's thread-sensitive sync thread, whose connections are not the
+    event loop thread's, so the wrappers are installed and removed there.
+    """
+    stack = ExitStack()
+    counter = await sync_to_async(stack.enter_context)(count_queries(record_sql=record_sql, using=using))
+    try:
+        yield counter
+    finally:
+        await sync_to_async(stack.close)()
@@ -0,0 +1,136 @@
+import logging
+from collections import Counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from hotel.db_metrics import acount_queries, count_queries
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """
+    Declare how many SQL queries a view may run per request. Works on view
+    functions and classes; class-based views can also set a ``query_budget``
+    attribute directly.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def get_query_budget(request):
+    """The budget declared by the view that handled ``request``, or None."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = getattr(match.func, 'view_class', match.func)
+    return getattr(view, 'query_budget', None)
+
+
+def repeated_queries(queries, threshold=2):
+    """
+    SQL statements run ``threshold`` times or more, most repeated first. The
+    same statement with different parameters is the signature of an N+1.
+    """
+    counts = Counter(sql for sql, _ in queries)
+    return [(sql, times) for sql, times in counts.most_common() if times >= threshold]
+
+
+def describe_queries(counter, budget):
+    lines = [f"{counter.count} queries ({counter.duration * 1000:.1f} ms), budget {budget}"]
+    for sql, times in repeated_queries(counter.queries):
+        lines.append(f"  repeated {times}x: {sql[:200]}")
+    return "\n".join(lines)
+
+
+def should_record_sql():
+    """Whether request counters should keep their statements: in strict mode or with DEBUG on."""
+    return settings.DEBUG or getattr(settings, 'QUERY_BUDGET_STRICT', False)
+
+
+def load_request_user(request):
+    """
+    Load the session user before a request's queries are counted: DRF's
+    authentication loads it for every view, and it should not count against
+    the view's own budget. Returns whether the user is authenticated.
+    """
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts the queries of every request and compares them with the view's
+    ``query_budget``. Over-budget requests are logged with their repeated
+    statements, or raise QueryBudgetExceeded when QUERY_BUDGET_STRICT is set
+    (as in tests). The counter is also left on the response as ``query_counter``.
+    Statements are only recorded in strict mode or with DEBUG on; otherwise
+    just the count and time are kept.
+
+    When an outer middleware (ServerTimingMiddleware) already counts the
+    request and leaves its counter on ``request.query_counter``, that counter
+    is reused rather than wrapping the connections a second time.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        counter = getattr(request, 'query_counter', None)
+        if counter is not None:
+            return self.check_budget(request, self.get_response(request), counter)
+
+        load_request_user(request)
+        with count_queries(record_sql=should_record_sql()) as counter:
+            response = self.get_response(request)
+        return self.check_budget(request, response, counter)
+
+    async def __acall__(self, request):
+        counter = getattr(request, 'query_counter', None)
+        if counter is not None:
+            return self.check_budget(request, await self.get_response(request), counter)
+
+        # On the sync thread the ORM runs queries on under ASGI
+        await sync_to_async(load_request_user)(request)
+        async with acount_queries(record_sql=should_record_sql()) as counter:
+            response = await self.get_response(request)
+        return self.check_budget(request, response, counter)
+
+    def check_budget(self, request, response, counter):
+        budget = get_query_budget(request)
+        response.query_counter = counter
+        response.query_budget = budget
+        if budget is not None and counter.count > budget:
+            message = f"{request.method} {request.path} exceeded its query budget: {describe_queries(counter, budget)}"
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+def assert_within_query_budget(response, budget=None):
+    """
+    Test helper: fail unless ``response`` (from the test client, with
+    QueryBudgetMiddleware installed) stayed within ``budget`` or, by default,
+    the budget its view declares.
+    """
+    budget = budget if budget is not None else getattr(response, 'query_budget', None)
+    counter = getattr(response, 'query_counter', None)
+    if counter is None:
+        raise AssertionError("No query count on the response; is QueryBudgetMiddleware installed?")
+    if budget is None:
+        raise AssertionError("The view does not declare a query budget.")
+    if counter.count > budget:
+        raise AssertionError(describe_queries(counter, budget))
@@ -0,0 +1,195 @@
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from hotel.db_metrics import acount_queries, count_queries
+from hotel.query_budget import load_request_user, repeated_queries, should_record_sql
+
+logger = logging.getLogger(__name__)
+
+BREAKDOWN_HEADER = 'X-Query-Breakdown'
+
+_current_timings = ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent in the block to the current request's ``name`` timing,
+    e.g. ``with timed('serialize'): data = serializer.data``. Does nothing
+    outside a request handled by ServerTimingMiddleware.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] += time.perf_counter() - start
+
+
+def _header_text(value):
+    """Make ``value`` safe inside a quoted Server-Timing description."""
+    return re.sub(r'\s+', ' ', value.replace('"', '').replace('\\', '')).strip()
+
+
+def _wants_breakdown(request):
+    return request.headers.get(BREAKDOWN_HEADER) == '1'
+
+
+def _record_sql(request):
+    # Statements are only needed for a breakdown, or by QueryBudgetMiddleware when strict or debugging
+    return _wants_breakdown(request) or should_record_sql()
+
+
+def _response_user(request, response):
+    # DRF authenticates JWT users on its own request object, so prefer that one
+    drf_request = getattr(response, 'renderer_context', {}).get('request')
+    return getattr(drf_request or request, 'user', None)
+
+
+def slowest_queries(queries, limit):
+    """[(sql, times, seconds)] for the statements that took longest in total."""
+    totals = defaultdict(lambda: [0, 0.0])
+    for sql, seconds in queries:
+        totals[sql][0] += 1
+        totals[sql][1] += seconds
+    ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+    return [(sql, times, seconds) for sql, (times, seconds) in ranked[:limit]]
+
+
+class ServerTimingMiddleware:
+    """
+    Measures each request and reports it in a ``Server-Timing`` header and a
+    structured log line:
+
+    - ``db``: number of SQL queries and time spent in them
+    - ``view``: the view itself, including its queries and serialization
+    - ``serialize``: blocks wrapped in ``timed('serialize')`` by views
+    - ``render``: turning the response into bytes
+    - ``total``: everything below this middleware
+
+    Staff users can send ``X-Query-Breakdown: 1`` to also get the slowest
+    statements (SERVER_TIMING_BREAKDOWN_LIMIT of them) in the header and log.
+
+    The counter is left on ``request.query_counter`` so QueryBudgetMiddleware,
+    below this one, checks the same count instead of keeping its own.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'SERVER_TIMING_ENABLED', True):
+            return self.get_response(request)
+
+        timings = defaultdict(float)
+        token = _current_timings.set(timings)
+        request._timing_marks = {}
+        start = time.perf_counter()
+        load_request_user(request)
+        try:
+            with count_queries(record_sql=_record_sql(request)) as counter:
+                request.query_counter = counter
+                response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        total = time.perf_counter() - start
+
+        user = _response_user(request, response) if _wants_breakdown(request) else None
+        return self.report(request, response, counter, timings, start, total, user)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'SERVER_TIMING_ENABLED', True):
+            return await self.get_response(request)
+
+        timings = defaultdict(float)
+        token = _current_timings.set(timings)
+        request._timing_marks = {}
+        start = time.perf_counter()
+        await sync_to_async(load_request_user)(request)
+        try:
+            async with acount_queries(record_sql=_record_sql(request)) as counter:
+                request.query_counter = counter
+                response = await self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        total = time.perf_counter() - start
+
+        user = None
+        if _wants_breakdown(request) and hasattr(request, 'auser'):
+            user = await request.auser()
+        return self.report(request, response, counter, timings, start, total, user)
+
+    def report(self, request, response, counter, timings, start, total, user):
+        """Add the Server-Timing header and log the request; ``user`` asked for a breakdown, if anyone."""
+        marks = request._timing_marks
+        if 'view_start' in marks:
+            view_end = marks.get('view_end', start + total)
+            timings['view'] = view_end - marks['view_start']
+            if 'view_end' in marks:
+                timings['render'] = start + total - view_end
+
+        metrics = [
+            ('db', counter.duration, f'{counter.count} queries'),
+            *((name, timings[name], None) for name in ('view', 'serialize', 'render') if name in timings),
+            ('total', total, None),
+        ]
+        breakdown = []
+        if user is not None and user.is_staff:
+            limit = getattr(settings, 'SERVER_TIMING_BREAKDOWN_LIMIT', 10)
+            breakdown = slowest_queries(counter.queries, limit)
+            metrics += [
+                (f'sql{position}', seconds, f'{times}x {_header_text(sql)[:100]}')
+                for position, (sql, times, seconds) in enumerate(breakdown, start=1)
+            ]
+
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={seconds * 1000:.1f}' + (f';desc="{description}"' if description else '')
+            for name, seconds, description in metrics
+        )
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'sql_count': counter.count,
+            'sql_ms': round(counter.duration * 1000, 1),
+            **{f'{name}_ms': round(timings[name] * 1000, 1) for name in ('view', 'serialize', 'render') if name in timings},
+            'total_ms': round(total * 1000, 1),
+        }
+        if counter.record_sql:
+            fields['repeated_sql'] = len(repeated_queries(counter.queries))
+        if breakdown:
+            fields['queries'] = [
+                {'sql': sql, 'count': times, 'ms': round(seconds * 1000, 2)}
+                for sql, times, seconds in breakdown
+            ]
+        logger.info('request_timing %s', json.dumps(fields), extra={'request_timing': fields})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        marks = getattr(request, '_timing_marks', None)
+        if marks is not None:
+            marks['view_start'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Called after the view returns and before the response is rendered
+        marks = getattr(request, '_timing_marks', None)
+        if marks is not None:
+            marks['view_end'] = time.perf_counter()
+        return response
@@ -52,8 +52,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'hotel.request_timing.ServerTimingMiddleware',
+    'hotel.query_budget.QueryBudgetMiddleware',
 ]
 
+# Views declare a `query_budget`; requests over it are logged, or fail when strict (e.g. in tests)
+QUERY_BUDGET_STRICT = False
+
+# Server-Timing header and a `request_timing` log line per request; staff can send
+# `X-Query-Breakdown: 1` to see the slowest statements as well
+SERVER_TIMING_ENABLED = True
+SERVER_TIMING_BREAKDOWN_LIMIT = 10
+
 ROOT_URLCONF = 'hotel.urls'
 
 TEMPLATES = [
@@ -78,7 +88,11 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    )
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        # Room holds per client (user or IP address)
+        'room_holds': '10/minute',
+    },
 }
 
 from datetime import timedelta
@@ -97,13 +111,55 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction opens, and wait for it,
+            # instead of failing with "database is locked" when concurrent
+            # bookings upgrade their read locks midway
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# Room availability
+# 'sql' answers searches from bookings and overrides directly.
+# 'inventory' reads the per-night RoomInventory calendar; run `rebuild_inventory` before enabling.
+# 'bitset' keeps an in-process NumPy index per worker (requires numpy), loaded on first use.
+# 'ledger' checks bookings through the per-night RoomNight table; run `backfill_room_nights` first.
+ROOM_AVAILABILITY_BACKEND = 'sql'
+ROOM_INVENTORY_HORIZON_DAYS = 365
+ROOM_AVAILABILITY_INDEX_HORIZON_DAYS = 730
+
+# Cache
+# LocMem is per process; point 'default' at a shared backend (e.g. Redis or Memcached) in production.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Room search responses are cached for this many seconds (0 disables the cache)
+ROOM_SEARCH_CACHE_TIMEOUT = 300
+ROOM_SEARCH_CACHE_HORIZON_DAYS = 730
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For testing - prints to console
 DEFAULT_FROM_EMAIL = 'noreply@yourhotel.com'
 
+# Booking emails are queued in the OutboundEmail outbox and delivered by `send_queued_emails`.
+# Failed sends are retried after 1x, 2x, 4x, ... the backoff until the attempts run out.
+BOOKING_EMAIL_MAX_ATTEMPTS = 5
+BOOKING_EMAIL_RETRY_BACKOFF_SECONDS = 60
+
+# Responses to booking requests sent with an Idempotency-Key header are replayed for this long;
+# run `sweep_idempotency_keys` periodically to delete older keys
+BOOKING_IDEMPOTENCY_KEY_TTL_HOURS = 24
+
+# Rooms held during checkout count as taken for this long; run `sweep_room_holds` every minute or so
+BOOKING_HOLD_TTL_SECONDS = 600
+# Rooms one client may hold at a time for overlapping dates
+BOOKING_HOLD_MAX_PER_CLIENT = 2
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hotel.settings')
 
 application = get_wsgi_application()
+
+# Warm the in-process availability index before serving traffic
+from rooms.availability_index import index_enabled, get_availability_index  # noqa: E402
+
+if index_enabled():
+    get_availability_index()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Amenity, RoomType, Room, RoomPricing, RoomAvailabilityOverride, RoomImage
+from .models import Amenity, RoomType, Room, RoomPricing, RoomAvailabilityOverride, RoomImage, RoomInventory
 # Register your models here.
 admin.site.register(Amenity)
 admin.site.register(RoomType)
@@ -7,3 +7,4 @@ admin.site.register(Room)
 admin.site.register(RoomPricing)
 admin.site.register(RoomAvailabilityOverride)
 admin.site.register(RoomImage)
+admin.site.register(RoomInventory)
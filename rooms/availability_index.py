@@ -0,0 +1,195 @@
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rooms.models import Room, RoomAvailabilityOverride
+from booking.models import Booking, RoomHold
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the 'bitset' backend
+    np = None
+
+
+def index_enabled() -> bool:
+    return getattr(settings, 'ROOM_AVAILABILITY_BACKEND', 'sql') == 'bitset'
+
+
+class AvailabilityIndex:
+    """
+    In-process availability index.
+    Holds one boolean matrix per room type (rooms x nights, True = blocked) over a
+    rolling horizon starting today, so a stay is answered with a slice and an
+    ``any`` over its nights instead of SQL. Each process keeps its own copy and
+    only sees writes made through signals in that process. An expired room hold
+    keeps blocking its nights until `sweep_room_holds` deletes it.
+    """
+
+    def __init__(self, start_date, horizon_days):
+        if np is None:
+            raise ImproperlyConfigured("The 'bitset' availability backend requires numpy.")
+        self.start_date = start_date
+        self.horizon_days = horizon_days
+        self.room_ids = {}  # room_type_id -> np.ndarray of room ids
+        self.sellable = {}  # room_type_id -> np.ndarray[bool], room status is AVAILABLE
+        self.blocked = {}  # room_type_id -> np.ndarray[bool] of shape (rooms, nights)
+        self.positions = {}  # room_id -> (room_type_id, row)
+        self._lock = threading.Lock()
+
+    @property
+    def end_date(self):
+        return self.start_date + timedelta(days=self.horizon_days)
+
+    def covers(self, check_in_date, check_out_date) -> bool:
+        return self.start_date <= check_in_date and check_out_date <= self.end_date
+
+    def _slice(self, check_in_date, check_out_date):
+        return slice((check_in_date - self.start_date).days, (check_out_date - self.start_date).days)
+
+    # Loading
+
+    def load(self, room_type_ids=None):
+        """(Re)build the matrices for ``room_type_ids``, or for every room type."""
+        rooms = Room.objects.order_by('room_type_id', 'id')
+        if room_type_ids is not None:
+            rooms = rooms.filter(room_type_id__in=room_type_ids)
+        rooms_by_type = defaultdict(list)
+        for room_id, room_type_id, status in rooms.values_list('id', 'room_type_id', 'status'):
+            rooms_by_type[room_type_id].append((room_id, status == 'AVAILABLE'))
+
+        matrices = {}
+        for room_type_id, type_rooms in rooms_by_type.items():
+            matrices[room_type_id] = (
+                np.array([room_id for room_id, _ in type_rooms], dtype=np.int64),
+                np.array([sellable for _, sellable in type_rooms], dtype=bool),
+                np.zeros((len(type_rooms), self.horizon_days), dtype=bool),
+            )
+        positions = {
+            room_id: (room_type_id, row)
+            for room_type_id, type_rooms in rooms_by_type.items()
+            for row, (room_id, _) in enumerate(type_rooms)
+        }
+
+        for room_id, range_start, range_end in self._blocking_ranges(list(positions)):
+            room_type_id, row = positions[room_id]
+            matrices[room_type_id][2][row, self._slice(max(range_start, self.start_date), min(range_end, self.end_date))] = True
+
+        with self._lock:
+            for room_type_id in (room_type_ids if room_type_ids is not None else list(self.room_ids)):
+                self.room_ids.pop(room_type_id, None)
+                self.sellable.pop(room_type_id, None)
+                self.blocked.pop(room_type_id, None)
+            self.positions = {
+                room_id: position for room_id, position in self.positions.items()
+                if position[0] in self.room_ids
+            }
+            for room_type_id, (room_ids, sellable, blocked) in matrices.items():
+                self.room_ids[room_type_id] = room_ids
+                self.sellable[room_type_id] = sellable
+                self.blocked[room_type_id] = blocked
+            self.positions.update(positions)
+        return self
+
+    def _blocking_ranges(self, room_ids):
+        bookings = Booking.objects.filter(
+            room_id__in=room_ids,
+            status__in=Booking.ACTIVE_STATUSES,
+            check_in_date__lt=self.end_date,
+            check_out_date__gt=self.start_date
+        ).values_list('room_id', 'check_in_date', 'check_out_date')
+        overrides = RoomAvailabilityOverride.objects.filter(
+            room_id__in=room_ids,
+            start_date__lt=self.end_date,
+            end_date__gt=self.start_date
+        ).values_list('room_id', 'start_date', 'end_date')
+        holds = RoomHold.objects.filter(
+            room_id__in=room_ids,
+            check_in_date__lt=self.end_date,
+            check_out_date__gt=self.start_date,
+            expires_at__gt=timezone.now()
+        ).values_list('room_id', 'check_in_date', 'check_out_date')
+        yield from bookings
+        yield from overrides
+        yield from holds
+
+    def refresh_room(self, room_id):
+        """Re-read one room's status, bookings and overrides after a change."""
+        room = Room.objects.filter(id=room_id).values('room_type_id', 'status').first()
+        position = self.positions.get(room_id)
+
+        # Rooms that appeared, disappeared or moved type change the matrix shape
+        if room is None or position is None or position[0] != room['room_type_id']:
+            self.load([type_id for type_id in {position and position[0], room and room['room_type_id']} if type_id])
+            return
+
+        room_type_id, row = position
+        nights = np.zeros(self.horizon_days, dtype=bool)
+        for _, range_start, range_end in self._blocking_ranges([room_id]):
+            nights[self._slice(max(range_start, self.start_date), min(range_end, self.end_date))] = True
+        with self._lock:
+            self.blocked[room_type_id][row] = nights
+            self.sellable[room_type_id][row] = room['status'] == 'AVAILABLE'
+
+    # Queries
+
+    def _free_rows(self, room_type_id, check_in_date, check_out_date):
+        if room_type_id not in self.blocked:
+            return np.zeros(0, dtype=bool)
+        nights = self.blocked[room_type_id][:, self._slice(check_in_date, check_out_date)]
+        return self.sellable[room_type_id] & ~nights.any(axis=1)
+
+    def is_available(self, room_id, check_in_date, check_out_date) -> bool:
+        position = self.positions.get(room_id)
+        if position is None:
+            return False
+        room_type_id, row = position
+        if not self.sellable[room_type_id][row]:
+            return False
+        return not self.blocked[room_type_id][row, self._slice(check_in_date, check_out_date)].any()
+
+    def available_room_ids(self, room_type_id, check_in_date, check_out_date):
+        free = self._free_rows(room_type_id, check_in_date, check_out_date)
+        return self.room_ids[room_type_id][free].tolist() if free.size else []
+
+    def available_room_count(self, room_type_id, check_in_date, check_out_date) -> int:
+        return int(self._free_rows(room_type_id, check_in_date, check_out_date).sum())
+
+    def nightly_counts(self, room_type_id):
+        """Sellable rooms per night over the horizon, comparable with the inventory calendar."""
+        if room_type_id not in self.blocked:
+            return np.zeros(self.horizon_days, dtype=np.int64)
+        sellable = self.sellable[room_type_id]
+        return (sellable[:, None] & ~self.blocked[room_type_id]).sum(axis=0)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_availability_index():
+    """Returns the process-wide index, loading it on first use and when the horizon rolls over."""
+    global _index
+    today = date.today()
+    if _index is None or _index.start_date != today:
+        with _index_lock:
+            if _index is None or _index.start_date != today:
+                horizon_days = getattr(settings, 'ROOM_AVAILABILITY_INDEX_HORIZON_DAYS', 730)
+                _index = AvailabilityIndex(today, horizon_days).load()
+    return _index
+
+
+def loaded_availability_index():
+    """Returns the index only if this process has already built it."""
+    return _index
+
+
+def reset_availability_index():
+    """
+    Drop this process's index, so the next use loads it again. For tests,
+    whose rolled back transactions change the database under a loaded index.
+    """
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,167 @@
+from collections import Counter
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from rooms.models import Room, RoomAvailabilityOverride, RoomInventory, RoomType
+from booking.models import Booking, RoomHold
+
+
+def inventory_enabled() -> bool:
+    return getattr(settings, 'ROOM_AVAILABILITY_BACKEND', 'sql') == 'inventory'
+
+
+def inventory_window():
+    """Returns the (first_night, end) range the calendar is maintained for."""
+    start = date.today()
+    return start, start + timedelta(days=getattr(settings, 'ROOM_INVENTORY_HORIZON_DAYS', 365))
+
+
+def _clip_to_window(start_date, end_date):
+    window_start, window_end = inventory_window()
+    return max(start_date, window_start), min(end_date, window_end)
+
+
+def compute_inventory(room_type_ids, start_date, end_date):
+    """
+    Compute the sellable room count per (room type, night) from the source tables.
+    Returns {(room_type_id, night): (total_rooms, available_rooms)} for every
+    night in [start_date, end_date).
+    """
+    room_type_ids = list(room_type_ids)
+    number_of_nights = (end_date - start_date).days
+    if number_of_nights <= 0 or not room_type_ids:
+        return {}
+
+    # 1. Rooms that can be sold at all
+    room_to_type = dict(
+        Room.objects.filter(room_type_id__in=room_type_ids, status='AVAILABLE')
+        .values_list('id', 'room_type_id')
+    )
+
+    # 2. Collect blocked nights per room from bookings, overrides and holds
+    blocked_nights = {room_id: set() for room_id in room_to_type}
+    booking_ranges = Booking.objects.filter(
+        room_id__in=list(room_to_type),
+        status__in=Booking.ACTIVE_STATUSES,
+        check_in_date__lt=end_date,
+        check_out_date__gt=start_date
+    ).values_list('room_id', 'check_in_date', 'check_out_date')
+    override_ranges = RoomAvailabilityOverride.objects.filter(
+        room_id__in=list(room_to_type),
+        start_date__lt=end_date,
+        end_date__gt=start_date
+    ).values_list('room_id', 'start_date', 'end_date')
+    hold_ranges = RoomHold.objects.filter(
+        room_id__in=list(room_to_type),
+        check_in_date__lt=end_date,
+        check_out_date__gt=start_date,
+        expires_at__gt=timezone.now()
+    ).values_list('room_id', 'check_in_date', 'check_out_date')
+
+    for ranges in (booking_ranges, override_ranges, hold_ranges):
+        for room_id, range_start, range_end in ranges:
+            first = max((range_start - start_date).days, 0)
+            last = min((range_end - start_date).days, number_of_nights)
+            blocked_nights[room_id].update(range(first, last))
+
+    # 3. Fold rooms into per-type, per-night counts
+    totals = Counter(room_to_type.values())
+    blocked = Counter()
+    for room_id, nights in blocked_nights.items():
+        room_type_id = room_to_type[room_id]
+        for offset in nights:
+            blocked[(room_type_id, offset)] += 1
+
+    inventory = {}
+    for room_type_id in room_type_ids:
+        total = totals[room_type_id]
+        for offset in range(number_of_nights):
+            night = start_date + timedelta(days=offset)
+            inventory[(room_type_id, night)] = (total, total - blocked[(room_type_id, offset)])
+    return inventory
+
+
+def refresh_inventory(room_type_ids, start_date=None, end_date=None) -> int:
+    """
+    Recompute and upsert calendar rows for the given room types, clipped to the
+    maintained window. Returns the number of rows written.
+    """
+    window_start, window_end = inventory_window()
+    start_date, end_date = _clip_to_window(start_date or window_start, end_date or window_end)
+    inventory = compute_inventory(room_type_ids, start_date, end_date)
+    rows = [
+        RoomInventory(
+            room_type_id=room_type_id,
+            night=night,
+            total_rooms=total,
+            available_rooms=available
+        )
+        for (room_type_id, night), (total, available) in inventory.items()
+    ]
+    RoomInventory.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['room_type', 'night'],
+        update_fields=['total_rooms', 'available_rooms', 'updated_at']
+    )
+    return len(rows)
+
+
+def rebuild_inventory() -> int:
+    """
+    Drop the calendar and rebuild it for every room type over the whole window,
+    in one transaction so searches never see it half built.
+    """
+    with transaction.atomic():
+        RoomInventory.objects.all().delete()
+        return refresh_inventory(RoomType.objects.values_list('id', flat=True))
+
+
+def verify_inventory():
+    """
+    Compare stored rows against a fresh computation.
+    Returns a list of (room_type_id, night, stored, expected) mismatches.
+    """
+    window_start, window_end = inventory_window()
+    expected = compute_inventory(RoomType.objects.values_list('id', flat=True), window_start, window_end)
+    stored = {
+        (room_type_id, night): (total, available)
+        for room_type_id, night, total, available in RoomInventory.objects.filter(
+            night__gte=window_start, night__lt=window_end
+        ).values_list('room_type_id', 'night', 'total_rooms', 'available_rooms')
+    }
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        if stored.get(key) != expected.get(key):
+            mismatches.append((key[0], key[1], stored.get(key), expected.get(key)))
+    return mismatches
+
+
+def get_inventory_room_counts(room_type_ids, check_in_date, check_out_date):
+    """
+    Sellable room count per room type for a stay, from the calendar.
+
+    The calendar counts free rooms per night, not which rooms they are, so it
+    only gives the number of rooms free for the whole stay for one-night stays
+    and for room types with a sold-out night. Other room types, and those whose
+    nights are not all in the calendar, are left out so the caller counts them
+    with the live queries. ``room_type_ids`` None reads every room type.
+    """
+    number_of_nights = (check_out_date - check_in_date).days
+    rows = RoomInventory.objects.filter(night__gte=check_in_date, night__lt=check_out_date)
+    if room_type_ids is not None:
+        rows = rows.filter(room_type_id__in=room_type_ids)
+    rows = rows.values('room_type_id').annotate(
+        nights=Count('id'),
+        available=Min('available_rooms')
+    ).order_by()
+
+    return {
+        row['room_type_id']: row['available']
+        for row in rows
+        if row['nights'] == number_of_nights and (number_of_nights == 1 or row['available'] == 0)
+    }
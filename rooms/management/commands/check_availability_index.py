@@ -0,0 +1,57 @@
+import random
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from rooms.availability_index import get_availability_index
+from rooms.inventory import compute_inventory
+from rooms.models import RoomType
+from rooms.services import get_available_rooms
+
+class Command(BaseCommand):
+    help = 'Loads the in-process availability index and compares it with the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=200, help='Random stays to check room by room')
+        parser.add_argument('--max-nights', type=int, default=14, help='Longest sampled stay')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        index = get_availability_index()
+        self.stdout.write(f'Checking index for {index.start_date} to {index.end_date}...')
+        errors = []
+
+        # 1. Per-night sellable counts against an independent computation
+        room_type_ids = list(RoomType.objects.values_list('id', flat=True))
+        expected = compute_inventory(room_type_ids, index.start_date, index.end_date)
+        for room_type_id in room_type_ids:
+            counts = index.nightly_counts(room_type_id)
+            for offset, count in enumerate(counts):
+                night = index.start_date + timedelta(days=offset)
+                if int(count) != expected[(room_type_id, night)][1]:
+                    errors.append(f'room type {room_type_id} on {night}: index {count}, database {expected[(room_type_id, night)][1]}')
+
+        self.stdout.write(f'✓ Nightly counts checked for {len(room_type_ids)} room types')
+
+        # 2. Random stays, room by room, against the SQL availability rules
+        rng = random.Random(options['seed'])
+        for _ in range(options['samples'] if room_type_ids else 0):
+            room_type_id = rng.choice(room_type_ids)
+            check_in = index.start_date + timedelta(days=rng.randrange(index.horizon_days - 1))
+            check_out = min(check_in + timedelta(days=rng.randint(1, options['max_nights'])), index.end_date)
+            from_database = set(
+                get_available_rooms([room_type_id], check_in, check_out).values_list('id', flat=True)
+            )
+            from_index = set(index.available_room_ids(room_type_id, check_in, check_out))
+            if from_index != from_database:
+                errors.append(
+                    f'room type {room_type_id} for {check_in} to {check_out}: '
+                    f'index {sorted(from_index)}, database {sorted(from_database)}'
+                )
+
+        self.stdout.write(f"✓ {options['samples']} sampled stays checked")
+
+        for error in errors[:20]:
+            self.stdout.write(f'  {error}')
+        if errors:
+            raise CommandError(f'Availability index check failed: {len(errors)} mismatches')
+
+        self.stdout.write(self.style.SUCCESS('Availability index matches the database!'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from rooms.inventory import inventory_window, rebuild_inventory, verify_inventory
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-night room inventory calendar and verifies it against bookings and overrides'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Compare the stored calendar with the source tables without rebuilding it'
+        )
+
+    def handle(self, *args, **options):
+        window_start, window_end = inventory_window()
+
+        if not options['verify_only']:
+            self.stdout.write(f'Rebuilding inventory for {window_start} to {window_end}...')
+            rows = rebuild_inventory()
+            self.stdout.write(f'✓ {rows} inventory rows written')
+
+        mismatches = verify_inventory()
+        for room_type_id, night, stored, expected in mismatches[:20]:
+            self.stdout.write(
+                f'  room type {room_type_id} on {night}: stored {stored}, expected {expected}'
+            )
+
+        if mismatches:
+            raise CommandError(f'Inventory verification failed: {len(mismatches)} mismatched nights')
+
+        self.stdout.write(self.style.SUCCESS('Inventory verified successfully!'))
@@ -1,33 +1,87 @@
-from django.core.management.base import BaseCommand
-from rooms.models import RoomType, Room, Amenity, RoomImage
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries, transaction
+from django.db.models import Max
+from rooms.inventory import inventory_enabled, rebuild_inventory
+from rooms.models import RoomType, Room, Amenity, RoomImage, RoomPricing, RoomAvailabilityOverride
+from rooms.pricing import PricingSchedule
+from rooms.search_cache import invalidate_search_cache
+from booking.confirmation import ConfirmationNumberGenerator
+from booking.models import Booking, Guest, RoomNight, normalize_guest_email
+
+GENERATOR_OPTIONS = ('room_types', 'rooms', 'bookings', 'pricing_rules', 'overrides', 'horizon_days', 'seed')
+
+# (name, base price range, max adults, max children, bed type, bed count, size, share of rooms)
+ROOM_TYPE_TEMPLATES = [
+    ('Single Room', (60, 90), 1, 0, 'SINGLE', 1, 180, 10),
+    ('Standard Room', (90, 140), 2, 1, 'DOUBLE', 1, 250, 35),
+    ('Twin Room', (90, 140), 2, 1, 'TWIN', 2, 260, 20),
+    ('Deluxe Suite', (160, 240), 3, 2, 'KING', 1, 400, 20),
+    ('Family Suite', (220, 320), 4, 3, 'KING', 2, 600, 10),
+    ('Penthouse Suite', (400, 700), 2, 2, 'KING', 1, 900, 5),
+]
+
+# Nights per stay: mostly short breaks, a bump at one week and a thin tail up to two
+STAY_LENGTHS = list(range(1, 15))
+STAY_CUM_WEIGHTS = list(accumulate([18, 24, 17, 11, 8, 5, 8, 2, 1, 1, 1, 1, 1, 2]))
+
+PAST_STATUSES = ['CHECKED_OUT', 'CANCELLED', 'NO_SHOW']
+PAST_STATUS_CUM_WEIGHTS = list(accumulate([90, 7, 3]))
+FUTURE_STATUSES = ['CONFIRMED', 'CANCELLED', 'PENDING']
+FUTURE_STATUS_CUM_WEIGHTS = list(accumulate([88, 8, 4]))
+
+ROOM_STATUSES = ['AVAILABLE', 'MAINTENANCE', 'OUT_OF_SERVICE']
+ROOM_STATUS_CUM_WEIGHTS = list(accumulate([97, 2, 1]))
+
+OVERRIDE_REASONS = ['MAINTENANCE', 'RENOVATION', 'VIP_HOLD', 'BLOCKED']
+OVERRIDE_REASON_CUM_WEIGHTS = list(accumulate([60, 15, 10, 15]))
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Ahmed', 'Sofia', 'Wei', 'Olga', 'Carlos', 'Aisha', 'Liam', 'Yuki',
+    'Noah', 'Emma', 'Ravi', 'Chloe', 'Mateo', 'Fatima', 'Lucas', 'Hana', 'Omar', 'Elena',
+]
+LAST_NAMES = [
+    'Smith', 'Garcia', 'Chen', 'Khan', 'Müller', 'Rossi', 'Silva', 'Kim', 'Novak', 'Dubois',
+    'Johnson', 'Tanaka', 'Okafor', 'Petrov', 'Larsen', 'Haddad', 'Kowalski', 'Singh', 'Brown', 'Ali',
+]
+COUNTRIES = ['United States', 'United Kingdom', 'Germany', 'France', 'Spain', 'Italy', 'Japan', 'Brazil', 'India', 'Canada']
+
+ROOMS_PER_FLOOR = 40
 
 class Command(BaseCommand):
-    help = 'Seeds the database with test room data'
+    help = (
+        'Seeds the database with test room data. Pass any of the synthetic data '
+        'options to bulk-generate a dataset of the given size instead.'
+    )
+
+    def add_arguments(self, parser):
+        generator = parser.add_argument_group('synthetic data')
+        generator.add_argument('--room-types', type=int, help='Room types to create (default 10)')
+        generator.add_argument('--rooms', type=int, help='Rooms to create across the room types (default 200)')
+        generator.add_argument('--bookings', type=int, help='Bookings to create (default 0)')
+        generator.add_argument('--pricing-rules', type=int, help='Seasonal RoomPricing rules to create (default 0)')
+        generator.add_argument('--overrides', type=int, help='Availability overrides to create (default 0)')
+        generator.add_argument(
+            '--horizon-days',
+            type=int,
+            help='Bookings, rules and overrides fall within this many days before and after today (default 365)'
+        )
+        generator.add_argument('--seed', type=int, help='Random seed, for a reproducible dataset')
+        generator.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        if any(options[name] is not None for name in GENERATOR_OPTIONS):
+            self.generate(options)
+            return
 
-    def handle(self, *args, **kwargs):
         self.stdout.write('Seeding database...')
 
         # Create Amenities
-        wifi, _ = Amenity.objects.get_or_create(
-            name="WiFi",
-            defaults={"description": "High-speed internet", "is_premium": False}
-        )
-        tv, _ = Amenity.objects.get_or_create(
-            name="TV",
-            defaults={"description": "Flat screen TV", "is_premium": False}
-        )
-        minibar, _ = Amenity.objects.get_or_create(
-            name="Mini Bar",
-            defaults={"description": "Stocked mini bar", "is_premium": True}
-        )
-        ac, _ = Amenity.objects.get_or_create(
-            name="Air Conditioning",
-            defaults={"description": "Climate control", "is_premium": False}
-        )
-        balcony, _ = Amenity.objects.get_or_create(
-            name="Balcony",
-            defaults={"description": "Private balcony", "is_premium": True}
-        )
+        wifi, tv, minibar, ac, balcony = self.create_amenities()
 
         self.stdout.write('✓ Amenities created')
 
@@ -118,4 +172,343 @@ class Command(BaseCommand):
             )
 
         self.stdout.write('✓ Images created')
-        self.stdout.write(self.style.SUCCESS('Database seeded successfully!'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Database seeded successfully!'))
+
+    def create_amenities(self):
+        """The standard amenities: WiFi, TV, Mini Bar, Air Conditioning and Balcony"""
+        wifi, _ = Amenity.objects.get_or_create(
+            name="WiFi",
+            defaults={"description": "High-speed internet", "is_premium": False}
+        )
+        tv, _ = Amenity.objects.get_or_create(
+            name="TV",
+            defaults={"description": "Flat screen TV", "is_premium": False}
+        )
+        minibar, _ = Amenity.objects.get_or_create(
+            name="Mini Bar",
+            defaults={"description": "Stocked mini bar", "is_premium": True}
+        )
+        ac, _ = Amenity.objects.get_or_create(
+            name="Air Conditioning",
+            defaults={"description": "Climate control", "is_premium": False}
+        )
+        balcony, _ = Amenity.objects.get_or_create(
+            name="Balcony",
+            defaults={"description": "Private balcony", "is_premium": True}
+        )
+        return wifi, tv, minibar, ac, balcony
+
+    def generate(self, options):
+        """Bulk-generate a synthetic dataset sized by the command options."""
+        room_type_count = self._option(options, 'room_types', 10)
+        room_count = self._option(options, 'rooms', 200)
+        booking_count = self._option(options, 'bookings', 0)
+        pricing_rule_count = self._option(options, 'pricing_rules', 0)
+        override_count = self._option(options, 'overrides', 0)
+        horizon_days = self._option(options, 'horizon_days', 365)
+        self.batch_size = max(options['batch_size'], 1)
+        if room_type_count < 1 and room_count:
+            raise CommandError('Rooms need at least one room type.')
+        if room_count < 1 and (booking_count or override_count):
+            raise CommandError('Bookings and overrides need at least one room.')
+        if horizon_days < 1:
+            raise CommandError('--horizon-days must be at least 1.')
+
+        rng = random.Random(options['seed'])
+        today = date.today()
+        first_night, end = today - timedelta(days=horizon_days), today + timedelta(days=horizon_days)
+        self.total_rows = 0
+        started = time.perf_counter()
+        self.stdout.write('Generating synthetic data...')
+
+        room_types = self._create_room_types(rng, room_type_count)
+        rooms = self._create_rooms(rng, room_types, room_count)
+        schedules = self._create_pricing_rules(rng, room_types, pricing_rule_count, first_night, end)
+        blocked = self._create_overrides(rng, rooms, override_count, first_night, end)
+        self._create_bookings(rng, rooms, schedules, blocked, booking_count, first_night, end)
+
+        # Bulk inserts skip the signals that keep derived availability state current
+        if inventory_enabled():
+            rows = rebuild_inventory()
+            self.stdout.write(f'✓ {rows} inventory rows rebuilt')
+        invalidate_search_cache()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {self.total_rows} rows in {elapsed:.1f}s ({self._rate(self.total_rows, elapsed)} rows/sec)'
+        ))
+
+    def _option(self, options, name, default):
+        value = options[name]
+        if value is None:
+            return default
+        if value < 0:
+            raise CommandError(f"--{name.replace('_', '-')} cannot be negative.")
+        return value
+
+    def _rate(self, rows, elapsed):
+        return f'{rows / elapsed:,.0f}' if elapsed else '-'
+
+    def _report(self, label, rows, started):
+        elapsed = time.perf_counter() - started
+        self.total_rows += rows
+        self.stdout.write(f'✓ {rows} {label} created in {elapsed:.1f}s ({self._rate(rows, elapsed)} rows/sec)')
+
+    def _create_room_types(self, rng, count):
+        started = time.perf_counter()
+        amenities = self.create_amenities()
+        first_number = RoomType.objects.count() + 1
+
+        with transaction.atomic():
+            room_types = RoomType.objects.bulk_create([
+                RoomType(
+                    name=f'{name} {first_number + position}',
+                    description=f'Generated {name.lower()}',
+                    base_price=Decimal(rng.randint(*price_range)),
+                    max_adults=max_adults,
+                    max_children=max_children,
+                    bed_type=bed_type,
+                    bed_count=bed_count,
+                    size=size
+                )
+                for position, (name, price_range, max_adults, max_children, bed_type, bed_count, size, _)
+                in enumerate(ROOM_TYPE_TEMPLATES[position % len(ROOM_TYPE_TEMPLATES)] for position in range(count))
+            ], batch_size=self.batch_size)
+
+            # Every room type gets the basic amenities, pricier ones more of the premium ones
+            RoomType.amenities.through.objects.bulk_create([
+                RoomType.amenities.through(roomtype_id=room_type.id, amenity_id=amenity.id)
+                for room_type in room_types
+                for amenity in amenities
+                if not amenity.is_premium or rng.random() < min(room_type.base_price / 300, 1)
+            ], batch_size=self.batch_size)
+
+            RoomImage.objects.bulk_create([
+                RoomImage(
+                    room_type_id=room_type.id,
+                    image_url=f'https://images.example.com/room-types/{room_type.id}/{order}.jpg',
+                    description=room_type.name if order == 1 else f'{room_type.name} view {order}',
+                    is_primary=order == 1,
+                    order=order
+                )
+                for room_type in room_types
+                for order in range(1, rng.randint(1, 4) + 1)
+            ], batch_size=self.batch_size)
+
+        self._report('room types', len(room_types), started)
+        return room_types
+
+    def _create_rooms(self, rng, room_types, count):
+        started = time.perf_counter()
+        # Every room type gets a room, the rest follow the template's share of rooms
+        weights = [ROOM_TYPE_TEMPLATES[position % len(ROOM_TYPE_TEMPLATES)][-1] for position in range(len(room_types))]
+        assigned = room_types[:count] + rng.choices(room_types, weights=weights, k=max(count - len(room_types), 0))
+        rng.shuffle(assigned)
+        first_floor = (Room.objects.aggregate(floor=Max('floor_number'))['floor'] or 0) + 1
+
+        rooms = []
+        with transaction.atomic():
+            for start in range(0, count, self.batch_size):
+                rooms += Room.objects.bulk_create([
+                    Room(
+                        room_number=f'{first_floor + position // ROOMS_PER_FLOOR}{position % ROOMS_PER_FLOOR + 1:02d}',
+                        room_type=room_type,
+                        floor_number=first_floor + position // ROOMS_PER_FLOOR,
+                        status=rng.choices(ROOM_STATUSES, cum_weights=ROOM_STATUS_CUM_WEIGHTS)[0]
+                    )
+                    for position, room_type in enumerate(assigned[start:start + self.batch_size], start=start)
+                ])
+
+        self._report('rooms', len(rooms), started)
+        return rooms
+
+    def _create_pricing_rules(self, rng, room_types, count, first_night, end):
+        """Seasonal rules of 3 to 30 nights; returns a PricingSchedule per room type id."""
+        started = time.perf_counter()
+        span = (end - first_night).days
+        rules = []
+        for _ in range(count):
+            room_type = rng.choice(room_types)
+            length = min(rng.randint(3, 30), span)
+            start_date = first_night + timedelta(days=rng.randint(0, span - length))
+            factor = rng.uniform(0.7, 1.6)
+            rules.append(RoomPricing(
+                room_type=room_type,
+                price_per_night=(room_type.base_price * Decimal(factor)).quantize(Decimal('0.01')),
+                reason='Peak season' if factor >= 1.2 else 'High demand' if factor > 1 else 'Promotion',
+                start_date=start_date,
+                end_date=start_date + timedelta(days=length - 1)
+            ))
+        with transaction.atomic():
+            rules = RoomPricing.objects.bulk_create(rules, batch_size=self.batch_size)
+        self._report('pricing rules', len(rules), started)
+
+        rules_by_type = {room_type.id: [] for room_type in room_types}
+        for rule in rules:
+            rules_by_type[rule.room_type_id].append((rule.start_date, rule.end_date, rule.price_per_night, rule.id))
+        return {
+            room_type.id: PricingSchedule(room_type.base_price, rules_by_type[room_type.id])
+            for room_type in room_types
+        }
+
+    def _create_overrides(self, rng, rooms, count, first_night, end):
+        """Non-overlapping overrides of 1 to 14 nights; returns {room_id: [(start, end)]}."""
+        started = time.perf_counter()
+        span = (end - first_night).days
+        blocked = {}
+        overrides = []
+        for _ in range(count):
+            room = rng.choice(rooms)
+            length = min(rng.randint(1, 14), span)
+            start_date = first_night + timedelta(days=rng.randint(0, span - length))
+            end_date = start_date + timedelta(days=length)
+            ranges = blocked.setdefault(room.id, [])
+            if any(start < end_date and stop > start_date for start, stop in ranges):
+                continue
+            ranges.append((start_date, end_date))
+            overrides.append(RoomAvailabilityOverride(
+                room=room,
+                start_date=start_date,
+                end_date=end_date,
+                reason=rng.choices(OVERRIDE_REASONS, cum_weights=OVERRIDE_REASON_CUM_WEIGHTS)[0]
+            ))
+        with transaction.atomic():
+            RoomAvailabilityOverride.objects.bulk_create(overrides, batch_size=self.batch_size)
+        self._report('availability overrides', len(overrides), started)
+
+        for ranges in blocked.values():
+            ranges.sort()
+        return blocked
+
+    def _stays(self, rng, count, first_night, end, blocked):
+        """
+        Up to ``count`` non-overlapping (check_in, check_out) stays between
+        first_night and end that avoid the ``blocked`` ranges. The free nights
+        are cut into one slot per stay and each stay is placed inside its slot,
+        so stays never overlap and occupancy rises with the number of bookings.
+        """
+        segments = []
+        cursor = first_night
+        for start, stop in blocked:
+            if start > cursor:
+                segments.append((cursor, start))
+            cursor = max(cursor, stop)
+        if cursor < end:
+            segments.append((cursor, end))
+        free = sum((stop - start).days for start, stop in segments)
+        if not free:
+            return
+
+        covered = assigned = 0
+        for start, stop in segments:
+            length = (stop - start).days
+            covered += length
+            target = round(count * covered / free)
+            stays, assigned = min(target - assigned, length), target
+            for slot in range(stays):
+                slot_start = length * slot // stays
+                slot_length = length * (slot + 1) // stays - slot_start
+                nights = min(rng.choices(STAY_LENGTHS, cum_weights=STAY_CUM_WEIGHTS)[0], slot_length)
+                check_in_date = start + timedelta(days=slot_start + rng.randint(0, slot_length - nights))
+                yield check_in_date, check_in_date + timedelta(days=nights)
+
+    def _create_guests(self, rng, count):
+        started = time.perf_counter()
+        guest_ids = []
+        for start in range(0, count, self.batch_size):
+            guests = []
+            for number in range(start, min(start + self.batch_size, count)):
+                first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                email = f'{first_name}.{last_name}.{number}@example.com'
+                guests.append(Guest(
+                    first_name=first_name,
+                    last_name=last_name,
+                    email=email,
+                    # bulk_create skips Guest.save, which normally fills this in
+                    normalized_email=normalize_guest_email(email),
+                    country=rng.choice(COUNTRIES)
+                ))
+            with transaction.atomic():
+                guest_ids += [guest.id for guest in Guest.objects.bulk_create(guests)]
+        self._report('guests', len(guest_ids), started)
+        return guest_ids
+
+    def _create_bookings(self, rng, rooms, schedules, blocked, count, first_night, end):
+        if not count:
+            return
+        # Returning guests: about three bookings per guest, a few guests with many
+        guest_ids = self._create_guests(rng, max(count // 3, 1))
+        started = time.perf_counter()
+        today = date.today()
+        next_confirmation_number = ConfirmationNumberGenerator(block_size=self.batch_size)
+        quotes = {}
+        pending = []
+        created = nights_created = 0
+
+        per_room, extra = divmod(count, len(rooms))
+        busier_rooms = set(rng.sample(range(len(rooms)), extra))
+        for position, room in enumerate(rooms):
+            room_type = room.room_type
+            room_count = per_room + (position in busier_rooms)
+            for check_in_date, check_out_date in self._stays(rng, room_count, first_night, end, blocked.get(room.id, ())):
+                if check_out_date <= today:
+                    status = rng.choices(PAST_STATUSES, cum_weights=PAST_STATUS_CUM_WEIGHTS)[0]
+                elif check_in_date <= today:
+                    status = 'CHECKED_IN'
+                else:
+                    status = rng.choices(FUTURE_STATUSES, cum_weights=FUTURE_STATUS_CUM_WEIGHTS)[0]
+
+                key = (room_type.id, check_in_date, check_out_date)
+                if key not in quotes:
+                    quote = schedules[room_type.id].quote(check_in_date, check_out_date)
+                    quotes[key] = (quote.price_per_night, quote.total)
+                price_per_night, total_price = quotes[key]
+
+                children = 0
+                if room_type.max_children and rng.random() < 0.3:
+                    children = rng.randint(1, room_type.max_children)
+                pending.append(Booking(
+                    guest_id=guest_ids[int(len(guest_ids) * rng.random() ** 2)],
+                    room_id=room.id,
+                    number_of_adults=rng.randint(1, room_type.max_adults),
+                    number_of_children=children,
+                    price_per_night=price_per_night,
+                    total_price=total_price,
+                    status=status,
+                    check_in_date=check_in_date,
+                    check_out_date=check_out_date
+                ))
+                if len(pending) >= self.batch_size:
+                    nights_created += self._write_bookings(pending, next_confirmation_number)
+                    created += len(pending)
+                    pending = []
+        nights_created += self._write_bookings(pending, next_confirmation_number)
+        created += len(pending)
+
+        if created < count:
+            self.stdout.write(self.style.WARNING(
+                f'  Only {created} of {count} bookings fit; use more rooms or a longer --horizon-days'
+            ))
+        self._report('bookings', created, started)
+        self.total_rows += nights_created
+        self.stdout.write(f'✓ {nights_created} room nights recorded')
+
+    def _write_bookings(self, bookings, next_confirmation_number):
+        """Insert one chunk of bookings with their RoomNight ledger rows, which bulk_create does not write."""
+        if not bookings:
+            return 0
+        # Reserved before the transaction opens, as ConfirmationNumberGenerator requires
+        confirmation_numbers = next_confirmation_number.reserve(len(bookings))
+        with transaction.atomic():
+            for booking in bookings:
+                booking.confirmation_number = confirmation_numbers()
+            Booking.objects.bulk_create(bookings)
+            room_nights = [
+                RoomNight(room_id=booking.room_id, booking_id=booking.id, night=night)
+                for booking in bookings
+                for night in booking.booked_nights()
+            ]
+            RoomNight.objects.bulk_create(room_nights, batch_size=self.batch_size)
+        # With DEBUG on every multi-megabyte INSERT would otherwise stay in connection.queries
+        reset_queries()
+        return len(room_nights)
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0002_amenity_created_at_amenity_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('total_rooms', models.PositiveIntegerField(help_text='Rooms of this type in AVAILABLE status')),
+                ('available_rooms', models.PositiveIntegerField(help_text='Rooms still sellable for this night')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('room_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='rooms.roomtype')),
+            ],
+            options={
+                'verbose_name_plural': 'Room Inventory',
+                'ordering': ['night'],
+                'constraints': [models.UniqueConstraint(fields=('room_type', 'night'), name='unique_room_type_night')],
+            },
+        ),
+    ]
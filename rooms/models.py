@@ -143,3 +143,23 @@ class RoomAvailabilityOverride(models.Model):
         ordering = ['start_date']
         verbose_name_plural = "Room Availability Overrides"
     
+
+
+class RoomInventory(models.Model):
+    """RoomInventory Model Definition"""
+
+    room_type = models.ForeignKey('RoomType', related_name='inventory', on_delete=models.CASCADE)
+    night = models.DateField()
+    total_rooms = models.PositiveIntegerField(help_text="Rooms of this type in AVAILABLE status")
+    available_rooms = models.PositiveIntegerField(help_text="Rooms still sellable for this night")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.room_type.name} - {self.night}: {self.available_rooms}/{self.total_rooms}"
+
+    class Meta:
+        ordering = ['night']
+        verbose_name_plural = "Room Inventory"
+        constraints = [
+            models.UniqueConstraint(fields=['room_type', 'night'], name='unique_room_type_night'),
+        ]
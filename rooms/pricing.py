@@ -0,0 +1,78 @@
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+
+
+@dataclass
+class PriceQuote:
+    """Price of one room of a room type for a stay."""
+
+    check_in_date: date
+    check_out_date: date
+    nightly: list = field(default_factory=list)  # [(night, price), ...]
+
+    @property
+    def total(self) -> Decimal:
+        return sum((price for _, price in self.nightly), Decimal("0.00"))
+
+    @property
+    def price_per_night(self) -> Decimal | None:
+        """Price of the check-in night, as stored on bookings; None for a stay without nights"""
+        return self.nightly[0][1] if self.nightly else None
+
+    @property
+    def average_per_night(self) -> Decimal:
+        return self.total / len(self.nightly) if self.nightly else Decimal("0.00")
+
+
+class PricingSchedule:
+    """
+    The RoomPricing rules of one room type, resolved in memory.
+
+    A rule covers its start_date through its end_date inclusive. Where rules
+    overlap, the one with the earliest start_date wins, then the one created
+    first (lowest id); nights no rule covers use the room type's base_price.
+    """
+
+    def __init__(self, base_price, rules):
+        self.base_price = base_price
+        # (start_date, end_date, price_per_night, id), highest precedence first
+        self.rules = sorted(rules, key=lambda rule: (rule[0], rule[3]))
+
+    @classmethod
+    def for_room_type(cls, room_type, start_date, end_date):
+        """Load the rules touching [start_date, end_date) in one query."""
+        rules = room_type.pricings.filter(
+            start_date__lt=end_date,
+            end_date__gte=start_date
+        ).values_list('start_date', 'end_date', 'price_per_night', 'id')
+        return cls(room_type.base_price, rules)
+
+    def quote(self, check_in_date, check_out_date) -> PriceQuote:
+        number_of_nights = (check_out_date - check_in_date).days
+        prices = [self.base_price] * max(number_of_nights, 0)
+
+        # Paint lowest precedence first so the winning rule is written last
+        for start_date, end_date, price, _ in reversed(self.rules):
+            first = max((start_date - check_in_date).days, 0)
+            last = min((end_date - check_in_date).days + 1, number_of_nights)
+            if first < last:
+                prices[first:last] = [price] * (last - first)
+
+        return PriceQuote(
+            check_in_date=check_in_date,
+            check_out_date=check_out_date,
+            nightly=[
+                (check_in_date + timedelta(days=offset), price)
+                for offset, price in enumerate(prices)
+            ]
+        )
+
+    def price_for(self, target_date) -> Decimal:
+        return self.quote(target_date, target_date + timedelta(days=1)).nightly[0][1]
+
+
+def quote_room_type(room_type, check_in_date, check_out_date) -> PriceQuote:
+    return PricingSchedule.for_room_type(room_type, check_in_date, check_out_date).quote(
+        check_in_date, check_out_date
+    )
@@ -0,0 +1,159 @@
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.db.models import OuterRef, Q, Subquery
+from rooms.models import RoomImage, RoomType
+from rooms.inventory import get_inventory_room_counts, inventory_enabled
+from rooms.availability_index import get_availability_index, index_enabled
+from rooms.services import (
+    AvailabilitySnapshot,
+    annotate_available_room_counts,
+    aprice_room_types,
+    price_room_types,
+)
+
+# Columns read into RoomTypeRow, in field order
+ROOM_TYPE_ROW_FIELDS = (
+    'id', 'name', 'slug', 'description', 'max_adults', 'max_children',
+    'bed_type', 'bed_count', 'size', 'base_price', 'primary_image',
+)
+
+
+@dataclass(slots=True, eq=False)
+class RoomTypeRow:
+    """
+    The RoomType columns search needs, read with values_list() instead of
+    building model instances. Has the attributes the booking plan search and
+    price_room_types use, so it can stand in for a RoomType in a snapshot.
+    """
+
+    id: int
+    name: str
+    slug: str
+    description: str
+    max_adults: int
+    max_children: int
+    bed_type: str
+    bed_count: int
+    size: int
+    base_price: Decimal
+    primary_image: str
+    available_room_count: int = 0
+
+
+def primary_image_url():
+    """URL of the room type's primary image (or first image when none is flagged), as a subquery"""
+    return Subquery(
+        RoomImage.objects.filter(room_type=OuterRef('pk'))
+        .order_by('-is_primary', 'order')
+        .values('image_url')[:1]
+    )
+
+
+def _room_type_rows_query(check_in_date, check_out_date, known_counts=None):
+    """
+    Available room types with their counts and primary images in one query,
+    as tuples in RoomTypeRow field order. Room types in ``known_counts``
+    ({room_type_id: count}, from the inventory calendar) are not counted
+    again: they come back with a count of 0, and only if they have a room.
+    """
+    known_counts = known_counts or {}
+    return (
+        annotate_available_room_counts(RoomType.objects.all(), check_in_date, check_out_date, list(known_counts))
+        .filter(Q(available_room_count__gt=0) | Q(id__in=[room_type_id for room_type_id, count in known_counts.items() if count > 0]))
+        .annotate(primary_image=primary_image_url())
+        # Meta.ordering is not applied to grouped queries
+        .order_by(*RoomType._meta.ordering)
+        .values_list(*ROOM_TYPE_ROW_FIELDS, 'available_room_count')
+    )
+
+
+def _rows_with_counts(counts):
+    return RoomType.objects.filter(id__in=list(counts)).annotate(
+        primary_image=primary_image_url()
+    ).values_list(*ROOM_TYPE_ROW_FIELDS)
+
+
+def available_room_type_rows(check_in_date, check_out_date) -> list:
+    """
+    RoomTypeRows of the room types with a room available for the stay, in
+    RoomType order, from a single room type query on every backend: the
+    'bitset' index counts in memory, and the 'inventory' calendar's exact
+    counts are read first and the rest counted live in the same query.
+    """
+    if index_enabled():
+        index = get_availability_index()
+        if index.covers(check_in_date, check_out_date):
+            counts = {
+                room_type_id: index.available_room_count(room_type_id, check_in_date, check_out_date)
+                for room_type_id in list(index.room_ids)
+            }
+            counts = {room_type_id: count for room_type_id, count in counts.items() if count > 0}
+            return [
+                RoomTypeRow(*values, available_room_count=counts[values[0]])
+                for values in _rows_with_counts(counts)
+            ]
+
+    known_counts = get_inventory_room_counts(None, check_in_date, check_out_date) if inventory_enabled() else {}
+    rows = [RoomTypeRow(*values) for values in _room_type_rows_query(check_in_date, check_out_date, known_counts)]
+    for row in rows:
+        row.available_room_count = known_counts.get(row.id, row.available_room_count)
+    return rows
+
+
+def take_lean_availability_snapshot(check_in_date: date, check_out_date: date) -> AvailabilitySnapshot:
+    """take_availability_snapshot for every room type, holding RoomTypeRows instead of RoomTypes"""
+    room_types = available_room_type_rows(check_in_date, check_out_date)
+    return AvailabilitySnapshot(
+        check_in_date=check_in_date,
+        check_out_date=check_out_date,
+        room_types=room_types,
+        quotes=price_room_types(room_types, check_in_date, check_out_date)
+    )
+
+
+async def atake_lean_availability_snapshot(check_in_date: date, check_out_date: date) -> AvailabilitySnapshot:
+    """
+    take_lean_availability_snapshot on the async ORM. The availability and
+    pricing queries run one after the other, as in the sync path: the async
+    ORM sends every query through the request's one sync thread, so awaiting
+    them together would not overlap them.
+    """
+    if index_enabled() or inventory_enabled():
+        return await sync_to_async(take_lean_availability_snapshot)(check_in_date, check_out_date)
+
+    room_types = [
+        RoomTypeRow(*values) async for values in _room_type_rows_query(check_in_date, check_out_date)
+    ]
+    return AvailabilitySnapshot(
+        check_in_date=check_in_date,
+        check_out_date=check_out_date,
+        room_types=room_types,
+        quotes=await aprice_room_types(room_types, check_in_date, check_out_date)
+    )
+
+
+def room_type_availability_data(room_types, quotes) -> list:
+    """
+    RoomTypeAvailabilitySerializer's output for ``room_types`` (RoomTypeRows),
+    built directly instead of through the serializer's fields. Prices stay
+    Decimals for the renderer, as the serializer's method fields return them.
+    """
+    return [
+        {
+            'id': room_type.id,
+            'name': room_type.name,
+            'slug': room_type.slug,
+            'description': room_type.description,
+            'max_adults': room_type.max_adults,
+            'max_children': room_type.max_children,
+            'bed_type': room_type.bed_type,
+            'bed_count': room_type.bed_count,
+            'size': room_type.size,
+            'price_per_night': quotes[room_type.id].price_per_night,
+            'total_price': quotes[room_type.id].total,
+            'primary_image': room_type.primary_image,
+        }
+        for room_type in room_types
+    ]
@@ -0,0 +1,92 @@
+import hashlib
+import uuid
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'room-search'
+GLOBAL_VERSION_KEY = f'{KEY_PREFIX}:version'
+
+
+def search_cache_enabled() -> bool:
+    return getattr(settings, 'ROOM_SEARCH_CACHE_TIMEOUT', 0) > 0
+
+
+def _horizon_end():
+    return date.today() + timedelta(days=getattr(settings, 'ROOM_SEARCH_CACHE_HORIZON_DAYS', 730))
+
+
+def _night_key(night):
+    return f'{KEY_PREFIX}:night:{night.isoformat()}'
+
+
+def _nights(start_date, end_date):
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days)]
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def _current_versions(keys):
+    """
+    Read version tokens for ``keys``, creating missing ones.
+    A token that was evicted comes back as a fresh value rather than a reused
+    one, so eviction can only cause a miss, never a stale hit.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def search_cache_key(check_in_date, check_out_date, adults, children, *variants):
+    """
+    Cache key for one search. It embeds the version token of every night of
+    the stay, so bumping any night in a changed range retires exactly the
+    cached searches that overlap it. ``variants`` are extra request options
+    that change the response. Returns None for searches not cached.
+    """
+    if not search_cache_enabled() or check_out_date > _horizon_end():
+        return None
+
+    keys = [GLOBAL_VERSION_KEY] + [_night_key(night) for night in _nights(check_in_date, check_out_date)]
+    versions = _current_versions(keys)
+    digest = hashlib.sha1(':'.join(str(versions[key]) for key in keys).encode()).hexdigest()
+    variant = ','.join(str(value) for value in variants)
+    return f'{KEY_PREFIX}:{check_in_date.isoformat()}:{check_out_date.isoformat()}:{adults}:{children}:{variant}:{digest}'
+
+
+def get_cached_search(cache_key):
+    if cache_key is None:
+        return None
+    return cache.get(cache_key)
+
+
+def cache_search(cache_key, data):
+    if cache_key is not None:
+        cache.set(cache_key, data, timeout=settings.ROOM_SEARCH_CACHE_TIMEOUT)
+
+
+def invalidate_search_cache(start_date=None, end_date=None):
+    """
+    Retire cached searches whose stay overlaps [start_date, end_date), or every
+    cached search when no range is given.
+    """
+    if not search_cache_enabled():
+        return
+    if start_date is None or end_date is None:
+        cache.set(GLOBAL_VERSION_KEY, _new_version(), timeout=None)
+        return
+
+    # Searches cannot start in the past or end beyond the horizon
+    start_date = max(start_date, date.today())
+    end_date = min(end_date, _horizon_end())
+    if start_date >= end_date:
+        return
+    cache.set_many(
+        {_night_key(night): _new_version() for night in _nights(start_date, end_date)},
+        timeout=None
+    )
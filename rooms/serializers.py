@@ -31,23 +31,68 @@ class RoomTypeSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+def get_primary_image_url(room_type):
+    """
+    URL of the primary image (or first image if no primary flag).
+    Uses prefetched ``images`` when present; images are ordered primary first.
+    """
+    images = room_type.images.all()[:1]
+
+    if not images:
+        return None
+
+    return images[0].image_url
+
+
 class RoomTypeDetailSerializer(serializers.ModelSerializer):
     amenities = AmenitySerializer(many=True, read_only=True)
     images = RoomImageSerializer(many=True, read_only=True)
+    primary_image = serializers.SerializerMethodField()
     available_room_count = serializers.SerializerMethodField()
+    stay = serializers.SerializerMethodField()
     
     class Meta:
         model = RoomType
         fields = [
             'id', 'name', 'slug', 'description', 'base_price',
             'max_adults', 'max_children', 'bed_type', 'bed_count', 'size',
-            'amenities', 'images', 'available_room_count',
-            'created_at'
+            'amenities', 'images', 'primary_image', 'available_room_count',
+            'stay', 'created_at'
         ]
     
+    def get_primary_image(self, obj):
+        return get_primary_image_url(obj)
+    
     def get_available_room_count(self, obj):
-        """Returns count of rooms of this type with AVAILABLE status"""
+        """
+        Rooms free for the requested stay when the view annotated them,
+        otherwise the count of rooms of this type with AVAILABLE status
+        """
+        if hasattr(obj, 'available_room_count'):
+            return obj.available_room_count
         return obj.rooms.filter(status='AVAILABLE').count()
+    
+    def get_stay(self, obj):
+        """
+        Price breakdown for the check_in/check_out the detail was requested
+        for, or None without dates
+        """
+        quote = self.context.get('price_quotes', {}).get(obj.id)
+        if quote is None:
+            return None
+
+        return {
+            'check_in_date': quote.check_in_date,
+            'check_out_date': quote.check_out_date,
+            'nights': len(quote.nightly),
+            'price_per_night': quote.price_per_night,
+            'average_per_night': quote.average_per_night,
+            'total_price': quote.total,
+            'nightly_prices': [
+                {'date': night, 'price': price}
+                for night, price in quote.nightly
+            ]
+        }
 
 class RoomTypeAvailabilitySerializer(serializers.ModelSerializer):
     price_per_night = serializers.SerializerMethodField()
@@ -72,6 +117,10 @@ class RoomTypeAvailabilitySerializer(serializers.ModelSerializer):
         if not check_in:
             return None
 
+        quote = self.context.get('price_quotes', {}).get(obj.id)
+        if quote:
+            return quote.price_per_night
+
         price = calculate_price_per_night(obj, check_in)
         return price
 
@@ -85,6 +134,10 @@ class RoomTypeAvailabilitySerializer(serializers.ModelSerializer):
         if not check_in or not check_out:
             return None
 
+        quote = self.context.get('price_quotes', {}).get(obj.id)
+        if quote:
+            return quote.total
+
         total = calculate_total_price(obj, check_in, check_out)
         return total
 
@@ -92,15 +145,7 @@ class RoomTypeAvailabilitySerializer(serializers.ModelSerializer):
         """
         Returns the primary image URL (or first image if no primary flag)
         """
-        image = obj.images.filter(is_primary=True).first()
-
-        if not image:
-            image = obj.images.first()
-
-        if not image:
-            return None
-
-        return image.image_url
+        return get_primary_image_url(obj)
 
 
 class RoomSerializer(serializers.ModelSerializer):
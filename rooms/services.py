@@ -1,15 +1,36 @@
 from datetime import date, timedelta
 from decimal import Decimal
-from rooms.models import Room, RoomAvailabilityOverride, RoomType
-from booking.models import Booking
+from rooms.models import Room, RoomAvailabilityOverride, RoomPricing, RoomType
+from booking.models import Booking, RoomHold, RoomNight
 from collections import Counter
+from dataclasses import dataclass
 from decimal import Decimal
+from itertools import count
+import heapq
+import logging
+from django.conf import settings
+from django.utils import timezone
+from django.db.models import Count, Q
+from rooms.inventory import inventory_enabled, get_inventory_room_counts
+from rooms.availability_index import index_enabled, get_availability_index
+from rooms.pricing import PricingSchedule, quote_room_type
+from hotel.db_metrics import count_queries
+
+logger = logging.getLogger(__name__)
 
 def check_date_overlap(check_in_date_1: date, check_out_date_1: date, check_in_date_2: date, check_out_date_2: date) -> bool:
     return check_in_date_1 < check_out_date_2 and check_out_date_1 > check_in_date_2
 
-def is_room_available(room, search_check_in_date, search_check_out_date) -> bool:
-    
+def is_room_available(room, search_check_in_date, search_check_out_date, live=False) -> bool:
+    """
+    Whether ``room`` can be booked for the stay. ``live=True`` always asks the
+    database, for checks that must not trust an in-process index.
+    """
+    if index_enabled() and not live:
+        index = get_availability_index()
+        if index.covers(search_check_in_date, search_check_out_date):
+            return index.is_available(room.id, search_check_in_date, search_check_out_date)
+
     # 1. Room status check
     if room.status != 'AVAILABLE':
         return False
@@ -21,9 +42,23 @@ def is_room_available(room, search_check_in_date, search_check_out_date) -> bool
     ).exists():
         return False
 
-    # 3. Active bookings
+    # 3. Unexpired holds of guests paying for the room
+    if room.holds.filter(
+        check_in_date__lt=search_check_out_date,
+        check_out_date__gt=search_check_in_date,
+        expires_at__gt=timezone.now()
+    ).exists():
+        return False
+
+    # 4. Active bookings
+    if ledger_enabled():
+        return not room.room_nights.filter(
+            night__gte=search_check_in_date,
+            night__lt=search_check_out_date
+        ).exists()
+
     if room.bookings.filter(
-        status__in=['CONFIRMED', 'CHECKED_IN'],
+        status__in=Booking.ACTIVE_STATUSES,
         check_in_date__lt=search_check_out_date,
         check_out_date__gt=search_check_in_date
     ).exists():
@@ -31,143 +66,382 @@ def is_room_available(room, search_check_in_date, search_check_out_date) -> bool
 
     return True
 
+def ledger_enabled() -> bool:
+    return getattr(settings, 'ROOM_AVAILABILITY_BACKEND', 'sql') == 'ledger'
+
+def _booked_room_ids(check_in_date, check_out_date):
+    """Subquery of room ids with an active booking overlapping the stay."""
+    if ledger_enabled():
+        return RoomNight.objects.filter(
+            night__gte=check_in_date,
+            night__lt=check_out_date
+        ).values("room_id")
+
+    return Booking.objects.filter(
+        status__in=Booking.ACTIVE_STATUSES,
+        check_in_date__lt=check_out_date,
+        check_out_date__gt=check_in_date
+    ).values("room_id")
+
+def _overridden_room_ids(check_in_date, check_out_date):
+    """Subquery of room ids blocked by an availability override during the stay."""
+    return RoomAvailabilityOverride.objects.filter(
+        start_date__lt=check_out_date,
+        end_date__gt=check_in_date
+    ).values("room_id")
+
+def _held_room_ids(check_in_date, check_out_date):
+    """Subquery of room ids under an unexpired hold overlapping the stay."""
+    return RoomHold.objects.filter(
+        check_in_date__lt=check_out_date,
+        check_out_date__gt=check_in_date,
+        expires_at__gt=timezone.now()
+    ).values("room_id")
+
 def get_available_rooms_for_type(room_type, check_in_date, check_out_date):
+    if index_enabled():
+        index = get_availability_index()
+        if index.covers(check_in_date, check_out_date):
+            return Room.objects.filter(
+                id__in=index.available_room_ids(room_type.id, check_in_date, check_out_date)
+            )
+
+    return get_available_rooms([room_type.id], check_in_date, check_out_date)
+
+def get_available_rooms(room_type_ids, check_in_date, check_out_date):
+    """Rooms of any of ``room_type_ids`` free for the stay, always read from the database."""
     return Room.objects.filter(
-        room_type=room_type,
+        room_type_id__in=room_type_ids,
         status='AVAILABLE'
     ).exclude(
-        id__in=Booking.objects.filter(
-            status__in=['CONFIRMED', 'CHECKED_IN'],
-            check_in_date__lt=check_out_date,
-            check_out_date__gt=check_in_date
-        ).values("room_id")
+        id__in=_booked_room_ids(check_in_date, check_out_date)
     ).exclude(
-        id__in=RoomAvailabilityOverride.objects.filter(
-            start_date__lt=check_out_date,
-            end_date__gt=check_in_date
-        ).values("room_id")
+        id__in=_overridden_room_ids(check_in_date, check_out_date)
+    ).exclude(
+        id__in=_held_room_ids(check_in_date, check_out_date)
     )
+
+def annotate_available_room_counts(room_types, check_in_date, check_out_date, skip_room_type_ids=()):
+    """
+    Annotate each room type with ``available_room_count`` for the stay.
+    Uses the same booking, override and hold rules as ``get_available_rooms_for_type``
+    but resolves every room type in a single grouped query. Room types in
+    ``skip_room_type_ids``, whose counts the caller already knows, are not
+    counted and get 0.
+    """
+    available = (
+        Q(rooms__status='AVAILABLE')
+        & ~Q(rooms__id__in=_booked_room_ids(check_in_date, check_out_date))
+        & ~Q(rooms__id__in=_overridden_room_ids(check_in_date, check_out_date))
+        & ~Q(rooms__id__in=_held_room_ids(check_in_date, check_out_date))
+    )
+    if skip_room_type_ids:
+        available = ~Q(id__in=skip_room_type_ids) & available
+    return room_types.annotate(available_room_count=Count('rooms', filter=available))
+
+
+def search_available_room_types(room_types, check_in_date, check_out_date):
+    """
+    Returns the room types in ``room_types`` with at least one room available for
+    the stay, each carrying ``available_room_count``. With the 'inventory' backend
+    the counts come from the RoomInventory calendar where it is exact (see
+    get_inventory_room_counts), and with 'bitset' from the in-process
+    AvailabilityIndex, falling back to the live query for the rest.
+    """
+    if index_enabled():
+        index = get_availability_index()
+        if index.covers(check_in_date, check_out_date):
+            available_room_types = []
+            for room_type in room_types:
+                room_type.available_room_count = index.available_room_count(
+                    room_type.id, check_in_date, check_out_date
+                )
+                if room_type.available_room_count > 0:
+                    available_room_types.append(room_type)
+            return available_room_types
+
+    if not inventory_enabled():
+        return list(
+            annotate_available_room_counts(room_types, check_in_date, check_out_date)
+            .filter(available_room_count__gt=0)
+        )
+
+    room_types = list(room_types)
+    counts = get_inventory_room_counts([room_type.id for room_type in room_types], check_in_date, check_out_date)
+    missing_ids = [room_type.id for room_type in room_types if room_type.id not in counts]
+    if missing_ids:
+        counts.update(
+            annotate_available_room_counts(
+                RoomType.objects.filter(id__in=missing_ids), check_in_date, check_out_date
+            ).values_list('id', 'available_room_count')
+        )
+
+    available_room_types = []
+    for room_type in room_types:
+        room_type.available_room_count = counts[room_type.id]
+        if room_type.available_room_count > 0:
+            available_room_types.append(room_type)
+    return available_room_types
     
     
 def calculate_price_per_night(room_type, target_date: date) -> Decimal:
-    pricing = room_type.pricings.filter(
-        start_date__lte=target_date,
-        end_date__gte=target_date
-    ).first()
+    return PricingSchedule.for_room_type(
+        room_type, target_date, target_date + timedelta(days=1)
+    ).price_for(target_date)
 
-    if pricing:
-        return pricing.price_per_night
+def calculate_total_price(room_type, check_in_date, check_out_date) -> Decimal:
+    return quote_room_type(room_type, check_in_date, check_out_date).total
 
-    return room_type.base_price
+def price_room_types(room_types, check_in_date, check_out_date):
+    """
+    Price one room of each room type for the stay.
+    Fetches the RoomPricing rows for every room type in a single query and
+    returns {room_type_id: PriceQuote}.
+    """
+    room_types = list(room_types)
+    rules = stay_pricing_rules([room_type.id for room_type in room_types], check_in_date, check_out_date)
+    return quote_room_types(room_types, rules, check_in_date, check_out_date)
 
-def calculate_total_price(room_type, check_in_date, check_out_date) -> Decimal:
-    total_price = Decimal("0.00")
-    current_date = check_in_date
 
-    number_of_nights = (check_out_date - check_in_date).days
+def stay_pricing_rules(room_type_ids, check_in_date, check_out_date):
+    """(room_type_id, start_date, end_date, price_per_night, id) of the rules touching the stay"""
+    return RoomPricing.objects.filter(
+        room_type_id__in=room_type_ids,
+        start_date__lt=check_out_date,
+        end_date__gte=check_in_date
+    ).values_list('room_type_id', 'start_date', 'end_date', 'price_per_night', 'id')
+
 
-    for _ in range(number_of_nights):
-        nightly_price = calculate_price_per_night(room_type, current_date)
-        total_price += nightly_price
-        current_date += timedelta(days=1)
+def quote_room_types(room_types, rules, check_in_date, check_out_date):
+    rules_by_type = {room_type.id: [] for room_type in room_types}
+    for room_type_id, *rule in rules:
+        if room_type_id in rules_by_type:
+            rules_by_type[room_type_id].append(rule)
 
-    return total_price
+    return {
+        room_type.id: PricingSchedule(room_type.base_price, rules_by_type[room_type.id]).quote(
+            check_in_date, check_out_date
+        )
+        for room_type in room_types
+    }
 
 
-def generate_booking_plans(check_in_date, check_out_date, adults, children):
+async def aprice_room_types(room_types, check_in_date, check_out_date):
+    """price_room_types on the async ORM"""
+    rules = [
+        rule async for rule in
+        stay_pricing_rules([room_type.id for room_type in room_types], check_in_date, check_out_date)
+    ]
+    return quote_room_types(room_types, rules, check_in_date, check_out_date)
+
+
+@dataclass
+class AvailabilitySnapshot:
+    """
+    Available room counts and stay prices for every room type, read once per
+    request so search results and booking plans are built from memory.
+    """
+
+    check_in_date: date
+    check_out_date: date
+    room_types: list  # room types with available rooms, each with available_room_count
+    quotes: dict  # {room_type_id: PriceQuote}
+
+    def fitting(self, adults, children):
+        """Room types where a single room holds the whole party"""
+        return [
+            room_type for room_type in self.room_types
+            if room_type.max_adults >= adults and room_type.max_children >= children
+        ]
+
+
+def take_availability_snapshot(check_in_date, check_out_date, room_types=None) -> AvailabilitySnapshot:
+    """One availability query and one pricing query for all of ``room_types``."""
+    available_room_types = search_available_room_types(
+        RoomType.objects.all() if room_types is None else room_types,
+        check_in_date,
+        check_out_date
+    )
+    return AvailabilitySnapshot(
+        check_in_date=check_in_date,
+        check_out_date=check_out_date,
+        room_types=available_room_types,
+        quotes=price_room_types(available_room_types, check_in_date, check_out_date)
+    )
+
+
+MAX_ROOMS_PER_PLAN = 10
+
+# Ranking key per plan objective; earlier elements matter more
+PLAN_OBJECTIVES = {
+    'budget_friendly': lambda plan: (plan['total_price'], plan['total_rooms']),
+    'convenience': lambda plan: (plan['total_rooms'], plan['total_price']),
+    'least_waste': lambda plan: (plan['wasted_beds'], plan['total_price']),
+}
+DEFAULT_PLAN_OBJECTIVES = ('budget_friendly', 'convenience')
+
+def generate_booking_plans(check_in_date, check_out_date, adults, children, objectives=DEFAULT_PLAN_OBJECTIVES, limit=5, snapshot=None):
     """
     Generate multiple room booking combinations when no single room fits everyone.
-    Returns plans sorted by cheapest price and fewest rooms.
+    Returns the ``limit`` best plans for each objective in ``objectives``:
+    cheapest price (budget_friendly), fewest rooms (convenience) and, on request,
+    fewest empty beds (least_waste). Plans are checked against ``snapshot``,
+    which is taken here when the caller has none.
     """
-    # 1. Get all room types with any availability
-    all_room_types = RoomType.objects.all()
-    
-    available_room_types = []
-    for room_type in all_room_types:
-        available_rooms = get_available_rooms_for_type(room_type, check_in_date, check_out_date)
-        if available_rooms.exists():
-            available_room_types.append(room_type)
-    
-    if not available_room_types:
-        return []
-    
-    # 2. Generate all possible combinations
-    all_plans = _find_room_combinations(adults, children, available_room_types)
-    
-    # 3. Validate and price each plan
-    valid_plans = []
-    for plan in all_plans:
-        # Check if we have enough available rooms for each type in this plan
-        room_counts = Counter(plan)
-        is_valid = True
-        
-        for room_type, count_needed in room_counts.items():
-            available_count = get_available_rooms_for_type(
-                room_type, check_in_date, check_out_date
-            ).count()
-            
-            if available_count < count_needed:
-                is_valid = False
-                break
+    with count_queries() as queries:
+        # 1. Available room counts and stay prices, read once
+        if snapshot is None:
+            snapshot = take_availability_snapshot(check_in_date, check_out_date)
         
-        if is_valid:
-            # Calculate total price
-            total_price = Decimal('0.00')
-            for room_type in plan:
-                total_price += calculate_total_price(room_type, check_in_date, check_out_date)
-            
-            valid_plans.append({
-                'rooms': room_counts,  # {RoomType: count}
-                'total_rooms': len(plan),
-                'total_price': total_price,
-                'price_per_night': total_price / (check_out_date - check_in_date).days
-            })
+        if not snapshot.room_types:
+            plans = {objective: [] for objective in objectives}
+        else:
+            # 2. Search for the best plans per objective in memory
+            plans = _plan_top_k(
+                adults,
+                children,
+                [(room_type, room_type.available_room_count) for room_type in snapshot.room_types],
+                {room_type_id: quote.total for room_type_id, quote in snapshot.quotes.items()},
+                objectives,
+                limit
+            )
     
-    # 4. Sort plans
-    by_price = sorted(valid_plans, key=lambda x: x['total_price'])
-    by_rooms = sorted(valid_plans, key=lambda x: x['total_rooms'])
+    logger.info(
+        "Booking plans for %s to %s (%s adults, %s children): %s room types, %s queries",
+        check_in_date, check_out_date, adults, children, len(snapshot.room_types), queries.count
+    )
     
-    return {
-        'budget_friendly': by_price[:5],  # Top 5 cheapest
-        'convenience': by_rooms[:5]  # Top 5 fewest rooms
-    }
+    number_of_nights = (check_out_date - check_in_date).days
+    for ranked_plans in plans.values():
+        for plan in ranked_plans:
+            plan['price_per_night'] = plan['total_price'] / number_of_nights
+    return plans
 
 
-def _find_room_combinations(remaining_adults, remaining_children, available_room_types, current_plan=None, depth=0):
-    
+def _plan_top_k(adults, children, available_room_types, stay_prices, objectives, limit, max_rooms=MAX_ROOMS_PER_PLAN):
     """
-    Recursive function to find all valid room combinations.
+    Branch-and-bound search for the ``limit`` best room plans per objective.
+    ``available_room_types`` is a list of (room_type, available_count) and
+    ``stay_prices`` maps room type ids to the price of one room for the stay.
+
+    Plans are room multisets: each is built once by choosing a count per room
+    type, capped by availability and ``max_rooms``, and only plans where every
+    room is needed are kept. A bounded heap per objective holds the best plans
+    so far, and a branch is cut when its lower bound cannot beat the worst
+    kept plan of any objective.
     """
-    if current_plan is None:
-        current_plan = []
+    ranking_keys = {objective: PLAN_OBJECTIVES[objective] for objective in objectives}
+    heaps = {objective: [] for objective in objectives}  # max-heaps of (-key, -sequence, plan)
+    sequence = count()
     
-    # Limit recursion depth to prevent infinite loops
-    if depth > 10:
-        return []
+    # Most adults per room first, so the capacity bounds prune early
+    room_types = sorted(
+        available_room_types,
+        key=lambda item: (-item[0].max_adults, -item[0].max_children, item[0].id)
+    )
     
-    # Base case: everyone accommodated
-    if remaining_adults <= 0 and remaining_children <= 0:
-        return [current_plan]
+    # Bounds over the room types still to choose from (suffix from each index)
+    max_adults_from = [0] * (len(room_types) + 1)
+    max_children_from = [0] * (len(room_types) + 1)
+    cheapest_slot_from = [None] * (len(room_types) + 1)
+    for index in range(len(room_types) - 1, -1, -1):
+        room_type = room_types[index][0]
+        slots = room_type.max_adults + room_type.max_children
+        slot_price = stay_prices[room_type.id] / slots if slots else None
+        cheapest = cheapest_slot_from[index + 1]
+        max_adults_from[index] = max(max_adults_from[index + 1], room_type.max_adults)
+        max_children_from[index] = max(max_children_from[index + 1], room_type.max_children)
+        cheapest_slot_from[index] = slot_price if cheapest is None or (slot_price is not None and slot_price < cheapest) else cheapest
     
-    # Invalid case
-    if remaining_adults < 0 or remaining_children < 0:
-        return []
+    def lower_bounds(index, remaining_adults, remaining_children, total_price, total_rooms):
+        adults_left = max(remaining_adults, 0)
+        children_left = max(remaining_children, 0)
+        price_bound = total_price + (adults_left + children_left) * (cheapest_slot_from[index] or 0)
+        rooms_bound = total_rooms + max(
+            -(-adults_left // max_adults_from[index]) if adults_left else 0,
+            -(-children_left // max_children_from[index]) if children_left else 0
+        )
+        waste_bound = max(-remaining_adults, 0) + max(-remaining_children, 0)
+        return {
+            'total_price': price_bound,
+            'total_rooms': rooms_bound,
+            'wasted_beds': waste_bound,
+        }
     
-    all_plans = []
+    def can_improve(bounds):
+        for objective, heap in heaps.items():
+            if len(heap) < limit or ranking_keys[objective](bounds) < _negate(heap[0][0]):
+                return True
+        return False
     
-    for room_type in available_room_types:
-        # Add this room to current plan
-        new_plan = current_plan + [room_type]
+    def record(room_counts, remaining_adults, remaining_children, total_price, total_rooms):
+        plan = {
+            'rooms': room_counts,  # {RoomType: count}
+            'total_rooms': total_rooms,
+            'total_price': total_price,
+            'wasted_beds': -remaining_adults - remaining_children,
+        }
+        order = next(sequence)
+        for objective, heap in heaps.items():
+            entry = (_negate(ranking_keys[objective](plan)), -order, plan)
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+    
+    def extend(index, remaining_adults, remaining_children, rooms_left, chosen, total_price, total_rooms):
+        # Base case: everyone accommodated
+        if remaining_adults <= 0 and remaining_children <= 0:
+            room_counts = Counter(dict(chosen))
+            if _every_room_needed(room_counts, adults, children):
+                record(room_counts, remaining_adults, remaining_children, total_price, total_rooms)
+            return
         
-        # Recurse
-        plans = _find_room_combinations(
-            remaining_adults - room_type.max_adults,
-            remaining_children - room_type.max_children,
-            available_room_types,
-            new_plan,
-            depth + 1
-        )
+        if index == len(room_types) or rooms_left == 0:
+            return
         
-        all_plans.extend(plans)
+        # Remaining room types cannot hold the remaining guests
+        if (rooms_left * max_adults_from[index] < remaining_adults
+                or rooms_left * max_children_from[index] < remaining_children):
+            return
+        
+        if not can_improve(lower_bounds(index, remaining_adults, remaining_children, total_price, total_rooms)):
+            return
+        
+        room_type, available_count = room_types[index]
+        for room_count in range(min(available_count, rooms_left) + 1):
+            adults_left = remaining_adults - room_count * room_type.max_adults
+            children_left = remaining_children - room_count * room_type.max_children
+            extend(
+                index + 1,
+                adults_left,
+                children_left,
+                rooms_left - room_count,
+                chosen + [(room_type, room_count)] if room_count else chosen,
+                total_price + stay_prices[room_type.id] * room_count,
+                total_rooms + room_count
+            )
+            # More rooms of this type would only add a redundant room
+            if adults_left <= 0 and children_left <= 0:
+                break
     
-    return all_plans
\ No newline at end of file
+    extend(0, adults, children, max_rooms, [], Decimal('0.00'), 0)
+    
+    return {
+        objective: [plan for _, _, plan in sorted(heap, reverse=True)]
+        for objective, heap in heaps.items()
+    }
+
+
+def _negate(key):
+    return tuple(-value for value in key)
+
+
+def _every_room_needed(plan, adults, children) -> bool:
+    """True when removing any single room leaves someone without a bed."""
+    total_adults = sum(room_type.max_adults * count for room_type, count in plan.items())
+    total_children = sum(room_type.max_children * count for room_type, count in plan.items())
+    return all(
+        total_adults - room_type.max_adults < adults or total_children - room_type.max_children < children
+        for room_type in plan
+    )
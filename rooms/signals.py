@@ -0,0 +1,229 @@
+from datetime import timedelta
+from django.db import transaction
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rooms.availability_index import index_enabled, loaded_availability_index, reset_availability_index
+from rooms.inventory import inventory_enabled, refresh_inventory
+from rooms.models import Room, RoomAvailabilityOverride, RoomImage, RoomPricing, RoomType
+from rooms.search_cache import invalidate_search_cache, search_cache_enabled
+from booking.models import Booking, RoomHold
+from booking.signals import bookings_bulk_created, room_holds_released
+
+
+def _tracking_enabled() -> bool:
+    return inventory_enabled() or index_enabled() or search_cache_enabled()
+
+
+def _schedule_refresh(room_ids=(), room_type_ids=(), start_date=None, end_date=None):
+    """
+    Refresh the inventory calendar and the availability index for the given
+    rooms / room types, and retire the affected cached searches, once the
+    current transaction commits.
+    """
+    room_ids = {room_id for room_id in room_ids if room_id}
+    room_type_ids = {room_type_id for room_type_id in room_type_ids if room_type_id}
+
+    def refresh():
+        if inventory_enabled():
+            type_ids = room_type_ids | set(
+                Room.objects.filter(id__in=room_ids).values_list('room_type_id', flat=True)
+            )
+            if type_ids:
+                refresh_inventory(type_ids, start_date, end_date)
+
+        index = loaded_availability_index()
+        if index_enabled() and index is not None:
+            if room_type_ids:
+                index.load(list(room_type_ids))
+            for room_id in room_ids:
+                index.refresh_room(room_id)
+
+        if room_type_ids or start_date is None:
+            invalidate_search_cache()
+        else:
+            invalidate_search_cache(start_date, end_date)
+
+    if room_ids or room_type_ids:
+        transaction.on_commit(refresh)
+
+
+def _remember_state(sender, instance, fields):
+    if not _tracking_enabled() or instance.pk is None:
+        return
+    instance._availability_previous = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+# Bookings
+
+BOOKING_FIELDS = ('room_id', 'status', 'check_in_date', 'check_out_date')
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_state(sender, instance, **kwargs):
+    _remember_state(sender, instance, BOOKING_FIELDS)
+
+
+@receiver(post_save, sender=Booking)
+def refresh_availability_for_booking(sender, instance, created, **kwargs):
+    if not _tracking_enabled():
+        return
+    current = {field: getattr(instance, field) for field in BOOKING_FIELDS}
+    previous = getattr(instance, '_availability_previous', None)
+    if previous == current:
+        return
+
+    for state in filter(None, (previous, current)):
+        _schedule_refresh(
+            room_ids=[state['room_id']],
+            start_date=state['check_in_date'],
+            end_date=state['check_out_date']
+        )
+
+
+@receiver(post_delete, sender=Booking)
+def refresh_availability_for_deleted_booking(sender, instance, **kwargs):
+    if _tracking_enabled():
+        _schedule_refresh(
+            room_ids=[instance.room_id],
+            start_date=instance.check_in_date,
+            end_date=instance.check_out_date
+        )
+
+
+@receiver(bookings_bulk_created)
+def refresh_availability_for_bulk_bookings(sender, bookings, **kwargs):
+    if _tracking_enabled() and bookings:
+        _schedule_refresh(
+            room_ids=[booking.room_id for booking in bookings],
+            start_date=min(booking.check_in_date for booking in bookings),
+            end_date=max(booking.check_out_date for booking in bookings)
+        )
+
+
+# Room holds
+
+@receiver(post_save, sender=RoomHold)
+def refresh_availability_for_hold(sender, instance, created, **kwargs):
+    if _tracking_enabled():
+        _schedule_refresh(
+            room_ids=[instance.room_id],
+            start_date=instance.check_in_date,
+            end_date=instance.check_out_date
+        )
+
+
+@receiver(room_holds_released)
+def refresh_availability_for_released_holds(sender, holds, **kwargs):
+    if _tracking_enabled() and holds:
+        _schedule_refresh(
+            room_ids=[hold.room_id for hold in holds],
+            start_date=min(hold.check_in_date for hold in holds),
+            end_date=max(hold.check_out_date for hold in holds)
+        )
+
+
+# Availability overrides
+
+OVERRIDE_FIELDS = ('room_id', 'start_date', 'end_date')
+
+
+@receiver(pre_save, sender=RoomAvailabilityOverride)
+def remember_override_state(sender, instance, **kwargs):
+    _remember_state(sender, instance, OVERRIDE_FIELDS)
+
+
+@receiver(post_save, sender=RoomAvailabilityOverride)
+def refresh_availability_for_override(sender, instance, **kwargs):
+    if not _tracking_enabled():
+        return
+    previous = getattr(instance, '_availability_previous', None)
+    if previous:
+        _schedule_refresh(
+            room_ids=[previous['room_id']],
+            start_date=previous['start_date'],
+            end_date=previous['end_date']
+        )
+    _schedule_refresh(
+        room_ids=[instance.room_id],
+        start_date=instance.start_date,
+        end_date=instance.end_date
+    )
+
+
+@receiver(post_delete, sender=RoomAvailabilityOverride)
+def refresh_availability_for_deleted_override(sender, instance, **kwargs):
+    if _tracking_enabled():
+        _schedule_refresh(
+            room_ids=[instance.room_id],
+            start_date=instance.start_date,
+            end_date=instance.end_date
+        )
+
+
+# Rooms
+
+ROOM_FIELDS = ('room_type_id', 'status')
+
+
+@receiver(pre_save, sender=Room)
+def remember_room_state(sender, instance, **kwargs):
+    _remember_state(sender, instance, ROOM_FIELDS)
+
+
+@receiver(post_save, sender=Room)
+def refresh_availability_for_room(sender, instance, created, **kwargs):
+    if not _tracking_enabled():
+        return
+    previous = getattr(instance, '_availability_previous', None)
+    if previous == {field: getattr(instance, field) for field in ROOM_FIELDS}:
+        return
+    # A room joining or leaving the sellable pool changes every night of its type
+    _schedule_refresh(room_type_ids=[instance.room_type_id, previous and previous['room_type_id']])
+
+
+@receiver(post_delete, sender=Room)
+def refresh_availability_for_deleted_room(sender, instance, **kwargs):
+    if _tracking_enabled():
+        _schedule_refresh(room_type_ids=[instance.room_type_id])
+
+
+# Search results only
+
+def _schedule_invalidation(start_date=None, end_date=None):
+    if search_cache_enabled():
+        transaction.on_commit(lambda: invalidate_search_cache(start_date, end_date))
+
+
+PRICING_FIELDS = ('start_date', 'end_date')
+
+
+@receiver(pre_save, sender=RoomPricing)
+def remember_pricing_state(sender, instance, **kwargs):
+    _remember_state(sender, instance, PRICING_FIELDS)
+
+
+@receiver(post_save, sender=RoomPricing)
+@receiver(post_delete, sender=RoomPricing)
+def invalidate_search_for_pricing(sender, instance, **kwargs):
+    # Pricing end dates are inclusive
+    previous = getattr(instance, '_availability_previous', None)
+    if previous:
+        _schedule_invalidation(previous['start_date'], previous['end_date'] + timedelta(days=1))
+    _schedule_invalidation(instance.start_date, instance.end_date + timedelta(days=1))
+
+
+@receiver(post_save, sender=RoomType)
+@receiver(post_delete, sender=RoomType)
+@receiver(post_save, sender=RoomImage)
+@receiver(post_delete, sender=RoomImage)
+def invalidate_all_searches(sender, instance, **kwargs):
+    _schedule_invalidation()
+
+
+# Settings changed by tests
+
+@receiver(setting_changed)
+def reset_availability_index_for_settings(setting, **kwargs):
+    if setting in ('ROOM_AVAILABILITY_BACKEND', 'ROOM_AVAILABILITY_INDEX_HORIZON_DAYS'):
+        reset_availability_index()
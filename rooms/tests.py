@@ -1,3 +1,408 @@
-from django.test import TestCase
+import random
+from collections import Counter
+from itertools import product
+from io import StringIO
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from booking.models import Booking, Guest, RoomHold
+from booking.services import release_room_hold
+from hotel.query_budget import assert_within_query_budget
+from rest_framework.renderers import JSONRenderer
+from rooms.availability_index import get_availability_index, index_enabled, reset_availability_index
+from rooms.inventory import rebuild_inventory
+from django.utils import timezone
+from rooms.models import Room, RoomAvailabilityOverride, RoomImage, RoomPricing, RoomType
+from rooms.read_models import RoomTypeRow, room_type_availability_data, take_lean_availability_snapshot
+from rooms.search_cache import cache_search, get_cached_search, search_cache_key
+from rooms.serializers import RoomTypeAvailabilitySerializer
+from rooms.services import (
+    MAX_ROOMS_PER_PLAN, PLAN_OBJECTIVES, _every_room_needed, _plan_top_k, get_available_rooms,
+    search_available_room_types
+)
+from rooms.views import parse_stay_dates
 
-# Create your tests here.
+
+def stay_date(days):
+    return date.today() + timedelta(days=10 + days)
+
+
+class HotelTestCase(TestCase):
+    """Two room types with two rooms each, and a guest to book them for."""
+
+    def setUp(self):
+        # A loaded index would still hold an earlier test's rolled back bookings
+        reset_availability_index()
+        self.standard = RoomType.objects.create(
+            name='Standard', description='Standard room', base_price=Decimal('100.00'),
+            max_adults=2, max_children=1, bed_type='DOUBLE', bed_count=1, size=200
+        )
+        self.family = RoomType.objects.create(
+            name='Family', description='Family room', base_price=Decimal('250.00'),
+            max_adults=4, max_children=3, bed_type='KING', bed_count=2, size=450
+        )
+        self.rooms = {
+            number: Room.objects.create(room_number=number, room_type=room_type, floor_number=int(number[0]))
+            for number, room_type in [
+                ('101', self.standard), ('102', self.standard), ('201', self.family), ('202', self.family)
+            ]
+        }
+        self.guest = Guest.objects.create(first_name='Ada', last_name='Guest', email='ada@example.com')
+
+    def hold(self, room_number, check_in_date, check_out_date):
+        return RoomHold.objects.create(
+            room=self.rooms[room_number],
+            check_in_date=check_in_date,
+            check_out_date=check_out_date,
+            expires_at=timezone.now() + timedelta(minutes=10)
+        )
+
+    def book(self, room_number, check_in_date, check_out_date, confirmation_number):
+        return Booking.objects.create(
+            guest=self.guest,
+            room=self.rooms[room_number],
+            check_in_date=check_in_date,
+            check_out_date=check_out_date,
+            number_of_adults=1,
+            number_of_children=0,
+            price_per_night=Decimal('100.00'),
+            total_price=Decimal('100.00') * (check_out_date - check_in_date).days,
+            confirmation_number=confirmation_number,
+            status='CONFIRMED'
+        )
+
+
+class InventoryCountTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        # Each night of the stay has a free Standard room, but never the same one
+        self.book('101', stay_date(0), stay_date(1), 'BK-TEST01')
+        self.book('102', stay_date(1), stay_date(2), 'BK-TEST02')
+
+    def available_counts(self, check_in_date, check_out_date):
+        return {
+            room_type.name: room_type.available_room_count
+            for room_type in search_available_room_types(RoomType.objects.all(), check_in_date, check_out_date)
+        }
+
+    def test_inventory_counts_match_live_query(self):
+        stays = [(stay_date(0), stay_date(2)), (stay_date(0), stay_date(1)), (stay_date(1), stay_date(3))]
+        expected = [self.available_counts(*stay) for stay in stays]
+
+        with override_settings(ROOM_AVAILABILITY_BACKEND='inventory'):
+            rebuild_inventory()
+            self.assertEqual([self.available_counts(*stay) for stay in stays], expected)
+
+        self.assertEqual(expected[0], {'Family': 2})
+
+
+@override_settings(ROOM_AVAILABILITY_BACKEND='bitset', ROOM_AVAILABILITY_INDEX_HORIZON_DAYS=90)
+class AvailabilityIndexTests(HotelTestCase):
+    def available(self, room_type, check_in_days, check_out_days):
+        return get_availability_index().available_room_ids(room_type.id, stay_date(check_in_days), stay_date(check_out_days))
+
+    def room_ids(self, *numbers):
+        return [self.rooms[number].id for number in numbers]
+
+    def test_load_blocks_bookings_overrides_and_holds(self):
+        self.book('101', stay_date(0), stay_date(2), 'BK-TEST01')
+        RoomAvailabilityOverride.objects.create(room=self.rooms['201'], start_date=stay_date(1), end_date=stay_date(3), reason='MAINTENANCE')
+        self.hold('202', stay_date(2), stay_date(4))
+        RoomHold.objects.create(room=self.rooms['102'], check_in_date=stay_date(0), check_out_date=stay_date(2), expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(self.available(self.standard, 0, 2), self.room_ids('102'))
+        self.assertEqual(self.available(self.standard, 2, 3), self.room_ids('101', '102'))
+        self.assertEqual(self.available(self.family, 0, 1), self.room_ids('201', '202'))
+        self.assertEqual(self.available(self.family, 1, 2), self.room_ids('202'))
+        self.assertEqual(self.available(self.family, 2, 3), [])
+        self.assertEqual(get_availability_index().nightly_counts(self.family.id)[10:15].tolist(), [2, 1, 0, 1, 2])
+
+    def test_signals_refresh_the_loaded_index(self):
+        get_availability_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self.book('101', stay_date(0), stay_date(2), 'BK-TEST01')
+        self.assertEqual(self.available(self.standard, 1, 2), self.room_ids('102'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = 'CANCELLED'
+            booking.save()
+        self.assertEqual(self.available(self.standard, 1, 2), self.room_ids('101', '102'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            override = RoomAvailabilityOverride.objects.create(room=self.rooms['201'], start_date=stay_date(0), end_date=stay_date(1), reason='BLOCKED')
+        self.assertEqual(self.available(self.family, 0, 1), self.room_ids('202'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            override.delete()
+            hold = self.hold('202', stay_date(0), stay_date(1))
+        self.assertEqual(self.available(self.family, 0, 1), self.room_ids('201'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_room_hold(hold.token)
+        self.assertEqual(self.available(self.family, 0, 1), self.room_ids('201', '202'))
+
+    def test_check_command_accepts_a_held_room(self):
+        self.book('101', stay_date(0), stay_date(2), 'BK-TEST01')
+        self.hold('102', stay_date(0), stay_date(3))
+        self.hold('201', stay_date(-5), stay_date(70))
+
+        output = StringIO()
+        call_command('check_availability_index', samples=100, seed=1, stdout=output)
+        self.assertIn('Availability index matches the database!', output.getvalue())
+
+    def test_matches_the_database_on_random_stays(self):
+        rng = random.Random(3)
+        for number in self.rooms:
+            for _ in range(4):
+                check_in_days = rng.randrange(-5, 40)
+                check_out_days = check_in_days + rng.randint(1, 6)
+                kind = rng.choice(['booking', 'override', 'hold'])
+                if kind == 'booking':
+                    self.book(number, stay_date(check_in_days), stay_date(check_out_days), f'BK-{number}{check_in_days:+03d}')
+                elif kind == 'override':
+                    RoomAvailabilityOverride.objects.create(room=self.rooms[number], start_date=stay_date(check_in_days), end_date=stay_date(check_out_days), reason='BLOCKED')
+                else:
+                    self.hold(number, stay_date(check_in_days), stay_date(check_out_days))
+        Room.objects.filter(id=self.rooms['202'].id).update(status='MAINTENANCE')
+
+        for _ in range(200):
+            room_type = rng.choice([self.standard, self.family])
+            check_in_days = rng.randrange(-8, 45)
+            check_out_days = check_in_days + rng.randint(1, 10)
+            expected = sorted(get_available_rooms([room_type.id], stay_date(check_in_days), stay_date(check_out_days)).values_list('id', flat=True))
+            self.assertEqual(sorted(self.available(room_type, check_in_days, check_out_days)), expected, (check_in_days, check_out_days))
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class SearchCacheTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.check_in_date, self.check_out_date = stay_date(0), stay_date(3)
+
+    def cache_the_search(self):
+        cache_search(search_cache_key(self.check_in_date, self.check_out_date, 2, 0), {'room_types': []})
+
+    def assert_cached(self, cached=True):
+        cached_data = get_cached_search(search_cache_key(self.check_in_date, self.check_out_date, 2, 0))
+        self.assertEqual(cached_data is not None, cached)
+
+    def test_overlapping_booking_retires_the_search(self):
+        self.cache_the_search()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book('101', stay_date(2), stay_date(4), 'BK-TEST01')
+        self.assert_cached(False)
+
+    def test_cancellation_retires_the_search(self):
+        booking = self.book('101', stay_date(1), stay_date(2), 'BK-TEST01')
+        self.cache_the_search()
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = 'CANCELLED'
+            booking.save()
+        self.assert_cached(False)
+
+    def test_override_retires_the_search(self):
+        self.cache_the_search()
+        with self.captureOnCommitCallbacks(execute=True):
+            RoomAvailabilityOverride.objects.create(
+                room=self.rooms['201'], start_date=stay_date(1), end_date=stay_date(2), reason='MAINTENANCE'
+            )
+        self.assert_cached(False)
+
+    def test_pricing_change_retires_the_search(self):
+        self.cache_the_search()
+        with self.captureOnCommitCallbacks(execute=True):
+            RoomPricing.objects.create(
+                room_type=self.standard, price_per_night=Decimal('150.00'), start_date=stay_date(1), end_date=stay_date(2)
+            )
+        self.assert_cached(False)
+
+    def test_changes_outside_the_stay_keep_the_search(self):
+        self.cache_the_search()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book('101', stay_date(3), stay_date(5), 'BK-TEST01')
+            # Pricing end dates are inclusive, so this covers the nights after the stay only
+            RoomPricing.objects.create(
+                room_type=self.standard, price_per_night=Decimal('150.00'), start_date=stay_date(3), end_date=stay_date(4)
+            )
+        self.assert_cached()
+
+
+class QueryBudgetTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for room_type in (self.standard, self.family):
+            RoomImage.objects.create(room_type=room_type, image_url=f'https://example.com/{room_type.slug}.jpg', is_primary=True)
+            RoomPricing.objects.create(room_type=room_type, price_per_night=room_type.base_price * 2, start_date=stay_date(1), end_date=stay_date(2))
+        self.book('101', stay_date(0), stay_date(2), 'BK-TEST01')
+        if index_enabled():
+            get_availability_index()
+
+    def test_search(self):
+        for adults in (2, 7):
+            response = self.client.get('/api/rooms/search/', {
+                'check_in': stay_date(0).isoformat(), 'check_out': stay_date(3).isoformat(), 'adults': adults
+            })
+            self.assertEqual(response.status_code, 200)
+            assert_within_query_budget(response)
+
+    def test_search_on_every_backend(self):
+        params = {'check_in': stay_date(0).isoformat(), 'check_out': stay_date(3).isoformat(), 'adults': 2}
+        for backend in ('sql', 'inventory', 'bitset', 'ledger'):
+            with self.subTest(backend=backend), override_settings(ROOM_AVAILABILITY_BACKEND=backend):
+                cache.clear()
+                if backend == 'inventory':
+                    rebuild_inventory()
+                elif backend == 'bitset':
+                    # The first request in a process loads the index, outside the budget
+                    get_availability_index()
+                response = self.client.get('/api/rooms/search/', params)
+                self.assertEqual(response.status_code, 200)
+                self.assertCountEqual([room_type['id'] for room_type in response.json()['room_types']], [self.standard.id, self.family.id])
+                assert_within_query_budget(response)
+
+    def test_detail(self):
+        for params in ({}, {'check_in': stay_date(0).isoformat(), 'check_out': stay_date(3).isoformat()}):
+            response = self.client.get(f'/api/rooms/{self.family.slug}/', params)
+            self.assertEqual(response.status_code, 200)
+            assert_within_query_budget(response)
+
+    def test_server_timing_shares_the_budget_counter(self):
+        with mock.patch('hotel.query_budget.count_queries') as budget_counter:
+            response = self.client.get(f'/api/rooms/{self.family.slug}/')
+
+        budget_counter.assert_not_called()
+        self.assertIn(f'desc="{response.query_counter.count} queries"', response['Server-Timing'])
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class AsyncEndpointTests(HotelTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for room_type in (self.standard, self.family):
+            RoomImage.objects.create(room_type=room_type, image_url=f'https://example.com/{room_type.slug}.jpg', is_primary=True)
+        RoomPricing.objects.create(room_type=self.family, price_per_night=Decimal('300.00'), start_date=stay_date(1), end_date=stay_date(2))
+        self.book('101', stay_date(0), stay_date(2), 'BK-TEST01')
+        if index_enabled():
+            get_availability_index()
+
+    async def assert_same_as_sync(self, async_path, sync_path, params):
+        response = await self.async_client.get(async_path, params)
+        self.assertEqual(response.status_code, 200)
+        assert_within_query_budget(response)
+
+        # The sync search would otherwise answer from the async one's cache entry
+        await sync_to_async(cache.clear)()
+        expected = await sync_to_async(self.client.get)(sync_path, params)
+        self.assertEqual(response.json(), expected.json())
+
+    async def test_search(self):
+        for adults in (2, 7):
+            params = {'check_in': stay_date(0).isoformat(), 'check_out': stay_date(3).isoformat(), 'adults': adults}
+            await self.assert_same_as_sync('/api/rooms/async/search/', '/api/rooms/search/', params)
+
+    async def test_detail(self):
+        for params in ({}, {'check_in': stay_date(0).isoformat(), 'check_out': stay_date(3).isoformat()}):
+            await self.assert_same_as_sync(f'/api/rooms/async/{self.family.slug}/', f'/api/rooms/{self.family.slug}/', params)
+
+
+class RoomTypeAvailabilityDataTests(HotelTestCase):
+    def test_matches_the_serializer(self):
+        # Standard has no images; Family's unflagged image comes after the primary one
+        RoomImage.objects.create(room_type=self.family, image_url='https://example.com/other.jpg', order=0)
+        RoomImage.objects.create(room_type=self.family, image_url='https://example.com/family.jpg', order=1, is_primary=True)
+        RoomPricing.objects.create(room_type=self.family, price_per_night=Decimal('312.50'), start_date=stay_date(1), end_date=stay_date(2))
+        check_in_date, check_out_date = stay_date(0), stay_date(3)
+
+        snapshot = take_lean_availability_snapshot(check_in_date, check_out_date)
+        room_types = RoomType.objects.filter(id__in=[row.id for row in snapshot.room_types]).prefetch_related('images')
+        serializer = RoomTypeAvailabilitySerializer(room_types, many=True, context={
+            'check_in_date': check_in_date, 'check_out_date': check_out_date, 'price_quotes': snapshot.quotes
+        })
+
+        data = room_type_availability_data(snapshot.room_types, snapshot.quotes)
+        self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(serializer.data))
+        self.assertEqual([item['primary_image'] for item in data], ['https://example.com/family.jpg', None])
+
+
+class RoomTypeDetailTests(HotelTestCase):
+    def test_stay_dates_are_parsed_once(self):
+        params = {'check_in': stay_date(0).isoformat(), 'check_out': stay_date(2).isoformat()}
+        with mock.patch('rooms.views.parse_stay_dates', wraps=parse_stay_dates) as parse:
+            response = self.client.get(f'/api/rooms/{self.standard.slug}/', params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(response.json()['stay']['total_price'], 200.0)
+
+
+def room_type_row(id, max_adults, max_children):
+    return RoomTypeRow(
+        id=id, name=f'Type {id}', slug=f'type-{id}', description='', max_adults=max_adults,
+        max_children=max_children, bed_type='DOUBLE', bed_count=1, size=200,
+        base_price=Decimal('100.00'), primary_image=None
+    )
+
+
+class PlanSearchTests(TestCase):
+    """_plan_top_k against brute-force enumeration of every plan."""
+
+    def setUp(self):
+        # (room type, available rooms) and the price of one room for the stay
+        self.catalog = [
+            (room_type_row(1, 2, 0), 3),
+            (room_type_row(2, 2, 2), 2),
+            (room_type_row(3, 4, 1), 2),
+            (room_type_row(4, 1, 1), 4),
+            (room_type_row(5, 6, 4), 1),
+        ]
+        self.stay_prices = {1: Decimal('180.00'), 2: Decimal('260.00'), 3: Decimal('390.00'), 4: Decimal('120.00'), 5: Decimal('900.00')}
+
+    def every_plan(self, adults, children, max_rooms):
+        for counts in product(*(range(min(available, max_rooms) + 1) for _, available in self.catalog)):
+            rooms = Counter({room_type: count for (room_type, _), count in zip(self.catalog, counts) if count})
+            total_rooms = sum(counts)
+            total_adults = sum(room_type.max_adults * count for room_type, count in rooms.items())
+            total_children = sum(room_type.max_children * count for room_type, count in rooms.items())
+            if (total_rooms > max_rooms or total_adults < adults or total_children < children
+                    or not _every_room_needed(rooms, adults, children)):
+                continue
+            yield {
+                'rooms': rooms,
+                'total_rooms': total_rooms,
+                'total_price': sum(self.stay_prices[room_type.id] * count for room_type, count in rooms.items()),
+                'wasted_beds': total_adults - adults + total_children - children,
+            }
+
+    def assert_matches_brute_force(self, adults, children, limit=5, max_rooms=MAX_ROOMS_PER_PLAN):
+        plans = _plan_top_k(adults, children, self.catalog, self.stay_prices, list(PLAN_OBJECTIVES), limit, max_rooms)
+        every_plan = list(self.every_plan(adults, children, max_rooms))
+        self.assertTrue(every_plan)
+        for objective, ranking_key in PLAN_OBJECTIVES.items():
+            with self.subTest(adults=adults, children=children, objective=objective):
+                # Plans tied on the key may come in either order, so compare the keys
+                self.assertEqual(
+                    [ranking_key(plan) for plan in plans[objective]],
+                    sorted(ranking_key(plan) for plan in every_plan)[:limit]
+                )
+                for plan in plans[objective]:
+                    self.assertIn(plan, every_plan)
+
+    def test_small_parties(self):
+        for adults, children in ((1, 0), (3, 0), (4, 2), (5, 3), (7, 1), (2, 6)):
+            self.assert_matches_brute_force(adults, children)
+
+    def test_large_party(self):
+        self.assert_matches_brute_force(24, 9, limit=10)
+
+    def test_party_too_large_for_the_rooms_left(self):
+        self.assertEqual(_plan_top_k(40, 0, self.catalog, self.stay_prices, list(PLAN_OBJECTIVES), 5), {
+            objective: [] for objective in PLAN_OBJECTIVES
+        })
@@ -1,9 +1,14 @@
 from django.urls import path
-from .views import RoomTypeCreateView, RoomCreateView, RoomTypeSearchView, RoomTypeDetailView
+from .views import (
+    RoomTypeCreateView, RoomCreateView, RoomTypeSearchView, RoomTypeDetailView,
+    RoomTypeSearchAsyncView, RoomTypeDetailAsyncView
+)
 
 urlpatterns = [
     path('create-room-type/', RoomTypeCreateView.as_view(), name='create-room-type'),
     path('create/', RoomCreateView.as_view(), name='create-room'),
     path('search/', RoomTypeSearchView.as_view(), name='room-type-search'),
+    path('async/search/', RoomTypeSearchAsyncView.as_view(), name='room-type-search-async'),
+    path('async/<slug:slug>/', RoomTypeDetailAsyncView.as_view(), name='room-type-detail-async'),
     path('<slug:slug>/', RoomTypeDetailView.as_view(), name='room-type-detail'),
 ]
\ No newline at end of file
@@ -1,12 +1,199 @@
 from rest_framework import generics
 from .models import RoomType, Room
-from .serializers import RoomTypeSerializer, RoomSerializer, RoomTypeAvailabilitySerializer, RoomTypeDetailSerializer
+from django.db.models import Count, Q
+from .serializers import RoomTypeSerializer, RoomSerializer, RoomTypeDetailSerializer
 from rest_framework.exceptions import ValidationError
 from datetime import datetime, date
 from rest_framework.response import Response
 from rest_framework import status
-from .services import get_available_rooms_for_type, generate_booking_plans
+from .services import (
+    generate_booking_plans,
+    annotate_available_room_counts,
+    price_room_types,
+    aprice_room_types,
+    PLAN_OBJECTIVES,
+    DEFAULT_PLAN_OBJECTIVES,
+)
+from .read_models import (
+    take_lean_availability_snapshot,
+    atake_lean_availability_snapshot,
+    room_type_availability_data,
+)
+from .search_cache import search_cache_key, get_cached_search, cache_search
 from rest_framework.views import APIView
+from asgiref.sync import sync_to_async
+from django.views import View
+from hotel.async_api import json_response
+from hotel.request_timing import timed
+
+def parse_search_params(query_params):
+    """Parse and validate the search query parameters; returns (check_in, check_out, adults, children)"""
+    # 1. Get query parameters
+    check_in_str = query_params.get('check_in')
+    check_out_str = query_params.get('check_out')
+    adults_str = query_params.get('adults')
+    children_str = query_params.get('children', '0')
+    
+    # 2. Validate required parameters
+    if not check_in_str or not check_out_str or not adults_str:
+        raise ValidationError({
+            "error": "check_in, check_out, and adults are required parameters"
+        })
+    
+    # 3. Parse dates
+    try:
+        check_in = datetime.strptime(check_in_str, '%Y-%m-%d').date()
+        check_out = datetime.strptime(check_out_str, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError({
+            "error": "Invalid date format. Use YYYY-MM-DD"
+        })
+    
+    # 4. Parse guest counts
+    try:
+        adults = int(adults_str)
+        children = int(children_str)
+    except ValueError:
+        raise ValidationError({
+            "error": "adults and children must be valid integers"
+        })
+    
+    # 5. Validate dates and guest counts
+    if check_in < date.today():
+        raise ValidationError({"check_in": "Check-in date cannot be in the past"})
+    
+    if check_out <= check_in:
+        raise ValidationError({"check_out": "Check-out must be after check-in"})
+    
+    if adults < 1:
+        raise ValidationError({"adults": "At least one adult is required"})
+    
+    if children < 0:
+        raise ValidationError({"children": "Number of children cannot be negative"})
+    
+    return check_in, check_out, adults, children
+
+
+def parse_plan_objectives(query_params):
+    """Booking plan rankings to return: the defaults plus any requested extras"""
+    requested = query_params.get('plan_objectives', '')
+    extra = [objective for objective in requested.split(',') if objective]
+    
+    unknown = [objective for objective in extra if objective not in PLAN_OBJECTIVES]
+    if unknown:
+        raise ValidationError({
+            "plan_objectives": f"Unknown objectives: {', '.join(unknown)}. Choose from {', '.join(PLAN_OBJECTIVES)}"
+        })
+    
+    return list(DEFAULT_PLAN_OBJECTIVES) + [
+        objective for objective in PLAN_OBJECTIVES
+        if objective in extra and objective not in DEFAULT_PLAN_OBJECTIVES
+    ]
+
+
+def parse_stay_dates(query_params):
+    """Parse the optional check_in/check_out parameters; returns None without them"""
+    check_in_str = query_params.get('check_in')
+    check_out_str = query_params.get('check_out')
+    
+    if not check_in_str and not check_out_str:
+        return None
+    if not check_in_str or not check_out_str:
+        raise ValidationError({
+            "error": "check_in and check_out must be given together"
+        })
+    
+    try:
+        check_in = datetime.strptime(check_in_str, '%Y-%m-%d').date()
+        check_out = datetime.strptime(check_out_str, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError({
+            "error": "Invalid date format. Use YYYY-MM-DD"
+        })
+    
+    if check_in < date.today():
+        raise ValidationError({"check_in": "Check-in date cannot be in the past"})
+    
+    if check_out <= check_in:
+        raise ValidationError({"check_out": "Check-out must be after check-in"})
+    
+    return check_in, check_out
+
+
+def format_booking_plans(plans):
+    """Format plans for JSON response"""
+    formatted = []
+    for plan in plans:
+        rooms_list = []
+        for room_type, count in plan['rooms'].items():
+            rooms_list.append({
+                'room_type_id': room_type.id,
+                'room_type_name': room_type.name,
+                'room_type_slug': room_type.slug,
+                'count': count,
+                'capacity': f"{room_type.max_adults} adults, {room_type.max_children} children"
+            })
+        
+        formatted.append({
+            'rooms': rooms_list,
+            'total_rooms': plan['total_rooms'],
+            'total_price': str(plan['total_price']),
+            'price_per_night': str(plan['price_per_night']),
+            'wasted_beds': plan['wasted_beds']
+        })
+    
+    return formatted
+
+
+def build_search_response(snapshot, adults, children, objectives):
+    """
+    The search response for ``snapshot``: room types where one room fits the
+    party, or booking plans per objective when none does. The snapshot holds
+    RoomTypeRows, written out in RoomTypeAvailabilitySerializer's shape.
+    """
+    room_types = snapshot.fitting(adults, children)
+    
+    # Serialize normal results
+    with timed('serialize'):
+        room_types_data = room_type_availability_data(room_types, snapshot.quotes)
+    
+    # Build response
+    response_data = {
+        'room_types': room_types_data,
+        'booking_plans': None
+    }
+    
+    # Check if any single room can fit everyone
+    can_fit_in_one = bool(room_types)
+    
+    # If no single room fits, generate booking plans
+    if not can_fit_in_one:
+        plans = generate_booking_plans(
+            snapshot.check_in_date, snapshot.check_out_date, adults, children, objectives, snapshot=snapshot
+        )
+        
+        # Format plans for response
+        response_data['booking_plans'] = {
+            objective: format_booking_plans(plans[objective])
+            for objective in objectives
+        }
+    
+    return response_data
+
+
+def room_type_detail_queryset(stay):
+    """Room types with what RoomTypeDetailSerializer reads; ``stay`` is (check_in, check_out) or None"""
+    # The detail lists every image, and primary_image is the first of them
+    # (RoomImage orders primary first), so one prefetch of 'images' serves both
+    queryset = RoomType.objects.prefetch_related('amenities', 'images')
+    if stay is None:
+        return queryset.annotate(
+            available_room_count=Count('rooms', filter=Q(rooms__status='AVAILABLE'))
+        )
+    
+    # Rooms free for the whole stay, counted in the same query as the room type
+    return annotate_available_room_counts(queryset, *stay)
+
 
 class RoomTypeCreateView(generics.CreateAPIView):
     
@@ -32,156 +219,123 @@ class RoomCreateView(generics.CreateAPIView):
             status=status.HTTP_201_CREATED
         )
         
-class RoomTypeSearchView(generics.ListAPIView):
-    serializer_class = RoomTypeAvailabilitySerializer
+class RoomTypeSearchView(APIView):
+    # the 'inventory' calendar's counts, available room types with their
+    # primary images, then prices
+    query_budget = 3
     
-    def get_queryset(self):
-        # 1. Get query parameters
-        check_in_str = self.request.query_params.get('check_in')
-        check_out_str = self.request.query_params.get('check_out')
-        adults_str = self.request.query_params.get('adults')
-        children_str = self.request.query_params.get('children', '0')
-        
-        # 2. Validate required parameters
-        if not check_in_str or not check_out_str or not adults_str:
-            raise ValidationError({
-                "error": "check_in, check_out, and adults are required parameters"
-            })
-        
-        # 3. Parse dates
-        try:
-            check_in = datetime.strptime(check_in_str, '%Y-%m-%d').date()
-            check_out = datetime.strptime(check_out_str, '%Y-%m-%d').date()
-        except ValueError:
-            raise ValidationError({
-                "error": "Invalid date format. Use YYYY-MM-DD"
-            })
-        
-        # 4. Parse guest counts
-        try:
-            adults = int(adults_str)
-            children = int(children_str)
-        except ValueError:
-            raise ValidationError({
-                "error": "adults and children must be valid integers"
-            })
-        
-        # 5. Validate dates and guest counts
-        if check_in < date.today():
-            raise ValidationError({"check_in": "Check-in date cannot be in the past"})
-        
-        if check_out <= check_in:
-            raise ValidationError({"check_out": "Check-out must be after check-in"})
-        
-        if adults < 1:
-            raise ValidationError({"adults": "At least one adult is required"})
-        
-        if children < 0:
-            raise ValidationError({"children": "Number of children cannot be negative"})
+    def get_search_params(self):
+        """Parse and validate the search query parameters once per request"""
+        if not hasattr(self, '_search_params'):
+            self._search_params = parse_search_params(self.request.query_params)
+        return self._search_params
+    
+    def get_plan_objectives(self):
+        return parse_plan_objectives(self.request.query_params)
+    
+    def get(self, request, *args, **kwargs):
+        """Room types that fit the party, or booking plans when no single room fits"""
+        check_in, check_out, adults, children = self.get_search_params()
+        objectives = self.get_plan_objectives()
         
-        # 6. Filter room types by capacity
-        room_types = RoomType.objects.filter(
-            max_adults__gte=adults,
-            max_children__gte=children
-        )
+        # Serve repeated searches from the cache
+        cache_key = search_cache_key(check_in, check_out, adults, children, *objectives)
+        cached_data = get_cached_search(cache_key)
+        if cached_data is not None:
+            return Response(cached_data)
         
-        # 7. Check availability for each room type
-        available_room_types = []
-        for room_type in room_types:
-            available_rooms = get_available_rooms_for_type(
-                room_type=room_type,
-                check_in_date=check_in,
-                check_out_date=check_out
-            )
-            
-            if available_rooms.exists():
-                available_room_types.append(room_type.id)
+        # Read availability and prices for every room type once, as plain rows;
+        # both the single-room results and the booking plans are built from it
+        snapshot = take_lean_availability_snapshot(check_in, check_out)
+        response_data = build_search_response(snapshot, adults, children, objectives)
         
-        # 8. Return only available room types
-        return RoomType.objects.filter(id__in=available_room_types)
+        cache_search(cache_key, response_data)
+        return Response(response_data)
+
+class RoomTypeDetailView(generics.RetrieveAPIView):
+    """
+    Room type details. With optional check_in and check_out parameters the
+    available room count covers bookings, overrides and holds for that stay,
+    and ``stay`` carries the price breakdown.
+    """
+    serializer_class = RoomTypeDetailSerializer
+    lookup_field = 'slug'
+    # room type with its room count, amenities, images and, with dates, prices
+    query_budget = 4
     
-    def get_serializer_context(self):
-        """Pass dates to serializer for pricing calculation"""
-        context = super().get_serializer_context()
-        
-        # Get dates from query params
-        check_in_str = self.request.query_params.get('check_in')
-        check_out_str = self.request.query_params.get('check_out')
+    def get_stay_dates(self):
+        """Parse the optional stay dates once per request"""
+        if not hasattr(self, '_stay_dates'):
+            self._stay_dates = parse_stay_dates(self.request.query_params)
+        return self._stay_dates
+    
+    def get_queryset(self):
+        return room_type_detail_queryset(self.get_stay_dates())
+    
+    def retrieve(self, request, *args, **kwargs):
+        room_type = self.get_object()
+        context = self.get_serializer_context()
         
-        if check_in_str and check_out_str:
-            try:
-                check_in = datetime.strptime(check_in_str, '%Y-%m-%d').date()
-                check_out = datetime.strptime(check_out_str, '%Y-%m-%d').date()
-                
-                context['check_in_date'] = check_in
-                context['check_out_date'] = check_out
-            except ValueError:
-                pass
+        stay = self.get_stay_dates()
+        if stay is not None:
+            context['price_quotes'] = price_room_types([room_type], *stay)
         
-        return context
+        serializer = self.get_serializer(room_type, context=context)
+        with timed('serialize'):
+            data = serializer.data
+        return Response(data)
+
+
+class RoomTypeSearchAsyncView(View):
+    """
+    RoomTypeSearchView on the async ORM, for ASGI: the request waits on its
+    queries without holding a worker thread. Same parameters and response.
+    """
+    # the 'inventory' calendar's counts, available room types with their
+    # primary images, then prices
+    query_budget = 3
     
-    def list(self, request, *args, **kwargs):
-        """Override to add booking plans when no single room fits"""
-        # Get normal search results
-        queryset = self.get_queryset()
+    async def get(self, request, *args, **kwargs):
+        try:
+            check_in, check_out, adults, children = parse_search_params(request.GET)
+            objectives = parse_plan_objectives(request.GET)
+        except ValidationError as e:
+            return json_response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get query params
-        adults = int(request.query_params.get('adults', 0))
-        children = int(request.query_params.get('children', 0))
-        check_in_str = request.query_params.get('check_in')
-        check_out_str = request.query_params.get('check_out')
+        # Serve repeated searches from the cache
+        cache_key = search_cache_key(check_in, check_out, adults, children, *objectives)
+        cached_data = await sync_to_async(get_cached_search)(cache_key)
+        if cached_data is not None:
+            return json_response(cached_data)
         
-        # Serialize normal results
-        serializer = self.get_serializer(queryset, many=True)
+        snapshot = await atake_lean_availability_snapshot(check_in, check_out)
+        response_data = build_search_response(snapshot, adults, children, objectives)
         
-        # Build response
-        response_data = {
-            'room_types': serializer.data,
-            'booking_plans': None
-        }
-        
-        # Check if any single room can fit everyone
-        can_fit_in_one = queryset.exists()
+        await sync_to_async(cache_search)(cache_key, response_data)
+        return json_response(response_data)
+
+
+class RoomTypeDetailAsyncView(View):
+    """RoomTypeDetailView on the async ORM, for ASGI. Same parameters and response."""
+    # room type with its room count, amenities, images and, with dates, prices
+    query_budget = 4
+    
+    async def get(self, request, slug, *args, **kwargs):
+        try:
+            stay = parse_stay_dates(request.GET)
+        except ValidationError as e:
+            return json_response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         
-        # If no single room fits, generate booking plans
-        if not can_fit_in_one:
-            check_in = datetime.strptime(check_in_str, '%Y-%m-%d').date()
-            check_out = datetime.strptime(check_out_str, '%Y-%m-%d').date()
-            
-            plans = generate_booking_plans(check_in, check_out, adults, children)
-            
-            # Format plans for response
-            response_data['booking_plans'] = {
-                'budget_friendly': self._format_plans(plans['budget_friendly']),
-                'convenience': self._format_plans(plans['convenience'])
-            }
+        try:
+            room_type = await room_type_detail_queryset(stay).aget(slug=slug)
+        except RoomType.DoesNotExist:
+            return json_response({"detail": "No RoomType matches the given query."}, status=status.HTTP_404_NOT_FOUND)
         
-        return Response(response_data)
-    
-    def _format_plans(self, plans):
-        """Format plans for JSON response"""
-        formatted = []
-        for plan in plans:
-            rooms_list = []
-            for room_type, count in plan['rooms'].items():
-                rooms_list.append({
-                    'room_type_id': room_type.id,
-                    'room_type_name': room_type.name,
-                    'room_type_slug': room_type.slug,
-                    'count': count,
-                    'capacity': f"{room_type.max_adults} adults, {room_type.max_children} children"
-                })
-            
-            formatted.append({
-                'rooms': rooms_list,
-                'total_rooms': plan['total_rooms'],
-                'total_price': str(plan['total_price']),
-                'price_per_night': str(plan['price_per_night'])
-            })
+        context = {}
+        if stay is not None:
+            context['price_quotes'] = await aprice_room_types([room_type], *stay)
         
-        return formatted
-
-class RoomTypeDetailView(generics.RetrieveAPIView):
-    queryset = RoomType.objects.prefetch_related('amenities', 'images', 'rooms')
-    serializer_class = RoomTypeDetailSerializer
-    lookup_field = 'slug' 
+        serializer = RoomTypeDetailSerializer(room_type, context=context)
+        with timed('serialize'):
+            data = serializer.data
+        return json_response(data)